@@ -0,0 +1,218 @@
+"""
+Bulk ingestion of many locations (cities or zip codes) in one run:
+
+    python -m add_properties_and_poi.bulk_ingest --locations "Boston, MA" 02139 02144 --workers 4
+
+Each location is a shard scraped, filtered to new or changed listings,
+POI-enriched and cleaned by its own worker process; shard outputs are merged, de-duplicated on property_id and loaded
+into the warehouse with a single bulk upsert, then embedded.
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import toml
+
+from add_properties_and_poi.controller import build_runner, pipeline_params
+from add_properties_and_poi.pipeline import PipelineRunner
+from add_properties_and_poi.stage_io import as_frame, read_checkpoint
+
+# Load config
+config = toml.load("config.toml")
+bulk_config = config.get("bulk_ingest", {})
+MAX_WORKERS = bulk_config.get("max_workers", os.cpu_count())
+
+
+def bulk_run_id(locations: list, listing_type: str, past_days: int) -> str:
+    """
+    Identifies a bulk ingest by what it loads, whatever the location order.
+    Its shards checkpoint under run ids derived from it.
+    """
+    return PipelineRunner.run_id_for({
+        "locations": sorted(set(locations)), "listing_type": listing_type, "past_days": past_days,
+    })
+
+
+def ingest_shard(location: str, listing_type: str, past_days: int, shards: int = 1, bulk_id: str = None) -> dict:
+    """
+    Worker-process entry point: scrape, enrich and clean one location with
+    the ingest stages of the pipeline. Returns the run report plus the
+    location, wall time and path of the cleaned shard (None if empty).
+    """
+    params = pipeline_params(location, listing_type, past_days, start_row=0, end_row=None)
+    params["shards"] = shards
+    runner = build_runner(load=False)
+    # Shards of different bulk ingests (or a single-location run) never share checkpoints
+    run_id = PipelineRunner.run_id_for({"bulk_id": bulk_id, "location": location}) if bulk_id else None
+
+    start = time.perf_counter()
+    _, report = runner.run(params, run_id=run_id)
+    checkpoint = runner.checkpoint(report["run_id"], "clean") if report["status"] == "success" else None
+
+    report["location"] = location
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    report["path"] = str(checkpoint) if checkpoint else None
+    return report
+
+
+def merge_shards(paths: list) -> tuple:
+    """
+    Concatenate cleaned shards and keep one row per property_id (listings
+    near a shard boundary are scraped by both). Returns (merged, duplicates).
+    """
+    merged = pd.concat([as_frame(read_checkpoint(path)) for path in paths], ignore_index=True)
+    rows = len(merged)
+    merged = merged.drop_duplicates(subset="property_id", keep="last").reset_index(drop=True)
+    return merged, rows - len(merged)
+
+
+def _shard_entry(shard: dict) -> dict:
+    stages = shard["stages"]
+    return {
+        "status": "done" if shard["path"] else shard["status"],
+        "seconds": shard["seconds"],
+        "scraped": stages.get("scrape", {}).get("rows"),
+        "rows": stages.get("clean", {}).get("rows"),
+        "stage_seconds": {name: stage["seconds"] for name, stage in stages.items() if "seconds" in stage},
+    }
+
+
+def bulk_ingest(locations: list, listing_type: str, past_days: int, max_workers: int = None,
+                on_progress=None, should_cancel=None) -> tuple:
+    """
+    Ingest every location on a process pool and bulk-load the merged result.
+    Returns (counts, report): the upsert counts (None if nothing was loaded)
+    and a report in the PipelineRunner shape, with one "shard <location>"
+    entry per location followed by merge, upsert and embed.
+    """
+    locations = list(dict.fromkeys(locations))
+    if not locations:
+        raise ValueError("No locations to ingest")
+    workers = max(1, min(max_workers or MAX_WORKERS, len(locations)))
+    bulk_id = bulk_run_id(locations, listing_type, past_days)
+    progress = on_progress or (lambda report: None)
+
+    report = {
+        "status": "success", "bulk_id": bulk_id, "locations": len(locations), "workers": workers, "stages": {}, "failed_shards": [],
+    }
+    stages = report["stages"]
+    for location in locations:
+        stages[f"shard {location}"] = {"status": "queued"}
+    progress(report)
+
+    # ---- Fan out: one shard per location ----
+    print(f"▶ Ingesting {len(locations)} locations on {workers} worker processes")
+    start = time.perf_counter()
+    paths = []
+    # spawn: workers start clean rather than forking this process's threads and connections
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {
+            pool.submit(ingest_shard, location, listing_type, past_days, workers, bulk_id): location
+            for location in locations
+        }
+        for future in as_completed(futures):
+            location = futures[future]
+            name = f"shard {location}"
+            try:
+                shard = future.result()
+            except Exception as e:
+                print(f"❌ Shard {location} failed: {e}")
+                stages[name] = {"status": "failed", "error": str(e)}
+                report["failed_shards"].append(location)
+            else:
+                stages[name] = _shard_entry(shard)
+                if shard["path"]:
+                    paths.append(shard["path"])
+                timings = ", ".join(f"{stage} {s:.1f}s" for stage, s in stages[name]["stage_seconds"].items())
+                print(f"✅ Shard {location}: {stages[name]['rows'] or 0} rows in {shard['seconds']:.1f}s ({timings})")
+            progress(report)
+
+            if should_cancel is not None and should_cancel():
+                print("⚠️ Bulk ingest cancelled; waiting for running shards.")
+                report["status"] = "cancelled"
+                for pending in futures:
+                    if pending.cancel():
+                        stages[f"shard {futures[pending]}"] = {"status": "skipped"}
+                break
+
+    fan_out_seconds = time.perf_counter() - start
+    shard_seconds = sum(stage.get("seconds", 0) for stage in stages.values())
+    report["fan_out_seconds"] = round(fan_out_seconds, 3)
+    # Total shard time over wall time: how much the pool parallelised
+    report["speedup"] = round(shard_seconds / fan_out_seconds, 2) if fan_out_seconds else None
+    print(f"Shards finished in {fan_out_seconds:.1f}s ({report['speedup']}x over running them one by one)")
+
+    if report["status"] == "cancelled":
+        progress(report)
+        return None, report
+    if len(report["failed_shards"]) == len(locations):
+        raise RuntimeError(f"All {len(locations)} shards failed")
+    if not paths:
+        print("⚠️ No new or changed properties in any shard.")
+        report["status"] = "empty"
+        progress(report)
+        return None, report
+
+    # ---- Merge ----
+    start = time.perf_counter()
+    merged, duplicates = merge_shards(paths)
+    stages["merge"] = {
+        "status": "done", "seconds": round(time.perf_counter() - start, 3), "rows": len(merged),
+        "duplicates": duplicates,
+    }
+    print(f"Merged {len(paths)} shards: {len(merged)} properties, {duplicates} duplicates dropped")
+    progress(report)
+
+    # ---- Single bulk load, then embeddings ----
+    from add_properties_and_poi.embed_properties import embed_stale_properties
+    from add_properties_and_poi.upsert_snowflake import upsert_to_snowflake
+
+    start = time.perf_counter()
+    counts = upsert_to_snowflake(merged, update_existing=True)
+    stages["upsert"] = {"status": "done", "seconds": round(time.perf_counter() - start, 3), "rows": len(merged)}
+    progress(report)
+
+    start = time.perf_counter()
+    embedded = embed_stale_properties()
+    stages["embed"] = {
+        "status": "done", "seconds": round(time.perf_counter() - start, 3), "rows": embedded["embedded"],
+    }
+    counts["embedded"] = embedded["embedded"]
+    progress(report)
+    return counts, report
+
+
+def run_bulk_ingest(locations: list, listing_type: str, past_days: int, max_workers: int = None,
+                    on_progress=None, should_cancel=None) -> str:
+    """
+    bulk_ingest with a user-facing summary message.
+    """
+    counts, report = bulk_ingest(
+        locations, listing_type, past_days, max_workers=max_workers,
+        on_progress=on_progress, should_cancel=should_cancel
+    )
+    failed = f"; failed shards: {', '.join(report['failed_shards'])}" if report["failed_shards"] else ""
+    if report["status"] == "cancelled":
+        return f"⚠️ Bulk ingest cancelled before loading{failed}."
+    if report["status"] == "empty":
+        return f"⚠️ No new or changed properties in {report['locations']} locations{failed}."
+    return (
+        f"✅ Bulk ingest of {report['locations']} locations on {report['workers']} workers "
+        f"({report['speedup']}x): {counts['inserted']} inserted, {counts['updated']} updated, "
+        f"{counts['skipped']} skipped, {counts['embedded']} embedded, "
+        f"{report['stages']['merge']['duplicates']} duplicates merged{failed}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--locations", nargs="+", required=True, help="cities or zip codes")
+    parser.add_argument("--listing_type", default="for_rent")
+    parser.add_argument("--past_days", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    print(run_bulk_ingest(args.locations, args.listing_type, args.past_days, max_workers=args.workers))
@@ -1,38 +1,128 @@
 # controller.py
-import subprocess
 import os
+import toml
 
-def run_pipeline(location: str, listing_type: str, past_days: int, start_row: int, end_row: int):
+from add_properties_and_poi.data_cleaning import columns_to_keep
+from add_properties_and_poi.pipeline import PipelineRunner, Stage
+from smartlease_api.property_schema import FINGERPRINT_COLUMN
+
+# Load config
+config = toml.load("config.toml")
+pipeline_config = config.get("pipeline", {})
+
+base_dir = os.path.dirname(__file__)  # Directory where this script lives
+CHECKPOINT_DIR = pipeline_config.get("checkpoint_dir", os.path.join(base_dir, "output", "checkpoints"))
+STAGE_NAMES = ["scrape", "changes", "poi", "clean", "upsert", "embed"]
+CLEAN_INPUT_COLUMNS = columns_to_keep + [FINGERPRINT_COLUMN]
+
+# Rows per chunk for the row-wise stages (changes, poi, clean, upsert); unset
+# processes each stage's whole input at once
+CHUNK_SIZE = pipeline_config.get("chunk_size")
+
+# Re-scraped listings whose fingerprint is unchanged skip enrichment and loading;
+# [pipeline] skip_unchanged = false processes every scraped listing
+SKIP_UNCHANGED = pipeline_config.get("skip_unchanged", True)
+
+# ---- Stages ----
+def scrape_stage(params):
+    from add_properties_and_poi.scrape_properties import scrape_properties
+    return scrape_properties(params["location"], params["listing_type"], params["past_days"])
+
+def changes_stage(params, properties):
+    from add_properties_and_poi.listing_fingerprint import changed_listings
+    # stored={} treats every listing as new; it still gets its fingerprint
+    return changed_listings(properties, stored=None if SKIP_UNCHANGED else {})[0]
+
+def poi_stage(params, properties):
+    from add_properties_and_poi.get_poi import enrich_properties, rows_in_range
+    # start_row/end_row index the whole input; a chunk starts at chunk_offset
+    rows = rows_in_range(properties, params.get("chunk_offset", 0), params["start_row"], params["end_row"])
+    if rows.empty:
+        return rows
+    return enrich_properties(rows, shards=params.get("shards", 1))
+
+def clean_stage(params, properties):
+    from add_properties_and_poi.data_cleaning import clean_properties
+    return clean_properties(properties)
+
+def upsert_stage(params, properties):
+    # Changed listings reach this stage with a new fingerprint; update them in place
+    from add_properties_and_poi.upsert_snowflake import upsert_to_snowflake
+    return upsert_to_snowflake(properties, update_existing=True)
+
+def embed_stage(params, upsert_counts):
+    # Picks up every row without an up-to-date embedding, not just this batch
+    from add_properties_and_poi.embed_properties import embed_stale_properties
+    return embed_stale_properties()
+
+def ingest_stages():
+    # Everything before the warehouse load; bulk ingestion runs these per shard
+    return [
+        Stage("scrape", scrape_stage),
+        Stage("changes", changes_stage, depends_on=["scrape"], chunked=True),
+        Stage("poi", poi_stage, depends_on=["changes"], chunked=True),
+        Stage("clean", clean_stage, depends_on=["poi"], columns=CLEAN_INPUT_COLUMNS, chunked=True),
+    ]
+
+def build_runner(load: bool = True):
+    """
+    The full pipeline, or with load=False only the ingest stages.
+    """
+    stages = ingest_stages()
+    if load:
+        stages += [
+            Stage("upsert", upsert_stage, depends_on=["clean"], chunked=True),
+            Stage("embed", embed_stage, depends_on=["upsert"]),
+        ]
+    return PipelineRunner(
+        stages=stages,
+        checkpoint_dir=CHECKPOINT_DIR,
+        retries=pipeline_config.get("retries", 2),
+        retry_backoff=pipeline_config.get("retry_backoff", 2.0),
+        chunk_size=CHUNK_SIZE,
+    )
+
+def pipeline_params(location: str, listing_type: str, past_days: int, start_row: int, end_row: int) -> dict:
+    return {
+        "location": location,
+        "listing_type": listing_type,
+        "past_days": past_days,
+        "start_row": start_row,
+        "end_row": end_row,
+    }
+
+def summarize_run(outputs: dict, report: dict) -> str:
+    """
+    User-facing message for a finished run, with per-stage timings.
+    """
+    timings = ", ".join(
+        f"{name} {stage['seconds']:.1f}s" for name, stage in report["stages"].items() if "seconds" in stage
+    )
+    print(f"Pipeline {report['run_id']} stage timings: {timings}")
+
+    if report["status"] == "empty":
+        if report["stages"].get("changes", {}).get("status") == "done":
+            return "✅ No new or changed listings. Nothing to ingest."
+        return "⚠️ No properties found. Pipeline stopped early."
+    if report["status"] == "cancelled":
+        done = [name for name, stage in report["stages"].items() if stage["status"] in ("done", "resumed")]
+        return f"⚠️ Pipeline cancelled after stages: {', '.join(done) or 'none'}."
+    counts = outputs["upsert"]
+    return (
+        f"✅ Pipeline executed successfully ({counts['inserted']} inserted, {counts['updated']} updated, "
+        f"{counts['skipped']} skipped, {outputs['embed']['embedded']} embedded; {timings})"
+    )
+
+def run_pipeline(location: str, listing_type: str, past_days: int, start_row: int, end_row: int,
+                 resume_from: str = None, on_progress=None, should_cancel=None):
     """
-    Orchestrates the full property pipeline with inputs.
+    Orchestrates the full property pipeline with inputs. All stages run in this
+    process; resume_from skips the stages before it using the last run's
+    checkpoints for the same inputs. on_progress and should_cancel are passed
+    to PipelineRunner.run.
     """
-    base_dir = os.path.dirname(__file__)  # Directory where this script lives
-
-    # Paths to each script
-    scrape_script = os.path.join(base_dir, "scrape_properties.py")
-    poi_script = os.path.join(base_dir, "get_poi.py")
-    clean_script = os.path.join(base_dir, "data_cleaning.py")
-    upsert_script = os.path.join(base_dir, "upsert_snowflake.py")
-
-    # Step 1: Scraping
-    subprocess.run([
-        "python", scrape_script,
-        "--location", location,
-        "--listing_type", listing_type,
-        "--past_days", str(past_days)
-    ], check=True)
-
-    # Step 2: POI fetching
-    subprocess.run([
-        "python", poi_script,
-        "--start_row", str(start_row),
-        "--end_row", str(end_row)
-    ], check=True)
-
-    # Step 3: Cleaning
-    subprocess.run(["python", clean_script], check=True)
-
-    # Step 4: Upsert
-    subprocess.run(["python", upsert_script], check=True)
-
-    return "✅ Pipeline executed successfully"
+    params = pipeline_params(location, listing_type, past_days, start_row, end_row)
+    outputs, report = build_runner().run(
+        params, resume_from=resume_from, on_progress=on_progress, should_cancel=should_cancel
+    )
+    return summarize_run(outputs, report)
@@ -1,15 +1,11 @@
-import pandas as pd
-import toml
-
-# Load the .toml config file
-config = toml.load("config.toml")
+import argparse
+from pathlib import Path
 
-# Load the dataset
-input_csv = config["paths_step_3"]['input_csv_with_poi']  # Path from the TOML file
-output_csv = config["paths_step_3"]['output_csv_with_poi_clean']  # Path for the cleaned output CSV
+import toml
 
-# Load the dataset
-properties = pd.read_csv(input_csv)
+from add_properties_and_poi.property_text import build_property_details
+from add_properties_and_poi.stage_io import read_stage, run_in_chunks, write_stage
+from smartlease_api.property_schema import FINGERPRINT_COLUMN
 
 # Columns to keep
 columns_to_keep = [
@@ -20,12 +16,43 @@ columns_to_keep = [
     'atm_name', 'atm_rating', 'atm_address', 'bank_name', 'bank_rating', 'bank_address'
 ]
 
-# Retain only necessary columns
-properties_cleaned = properties[columns_to_keep]
+def clean_properties(properties):
+    """
+    Keeps columns_to_keep (and the listing fingerprint, if present) and adds
+    'complete_property_details'.
+    """
+    # Retain only necessary columns
+    keep = columns_to_keep + ([FINGERPRINT_COLUMN] if FINGERPRINT_COLUMN in properties.columns else [])
+    properties_cleaned = properties[keep].copy()
+
+    # Labelled text of the meaningful, non-null columns; this is what gets embedded
+    properties_cleaned['complete_property_details'] = build_property_details(properties_cleaned)
+    return properties_cleaned
+
+if __name__ == "__main__":
+    # Load the .toml config file
+    config = toml.load("config.toml")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunk_size", type=int, default=config.get("pipeline", {}).get("chunk_size"))
+    parser.add_argument("--resume", action="store_true", help="continue after the last completed chunk")
+    args = parser.parse_args()
+
+    input_csv = config["paths_step_3"]['input_csv_with_poi']  # Path from the TOML file
+    output_csv = config["paths_step_3"]['output_csv_with_poi_clean']  # Path for the cleaned output CSV
 
-# Create the 'complete_property_details' column by concatenating all other columns
-properties_cleaned['complete_property_details'] = properties_cleaned.apply(lambda row: ', '.join(row.astype(str)), axis=1)
+    if args.chunk_size:
+        # Stream the input; each cleaned chunk is saved as soon as it is done
+        output = run_in_chunks(
+            lambda chunk, offset: clean_properties(chunk), input_csv, Path(output_csv).with_suffix(""),
+            args.chunk_size, columns=columns_to_keep, resume=args.resume
+        )
+        print(f"Data cleaned and saved to {output.directory}")
+    else:
+        # Load only the columns that are kept (.parquet or .csv, by extension)
+        properties = read_stage(input_csv, columns=columns_to_keep)
+        properties_cleaned = clean_properties(properties)
 
-# Save the cleaned data to the new CSV file
-properties_cleaned.to_csv(output_csv, index=False)
-print(f"Data cleaned and saved to {output_csv}")
+        # Save the cleaned data
+        write_stage(properties_cleaned, output_csv)
+        print(f"Data cleaned and saved to {output_csv}")
@@ -0,0 +1,131 @@
+import hashlib
+import importlib
+import json
+
+import pandas as pd
+import toml
+from snowflake.connector.pandas_tools import write_pandas
+
+from add_properties_and_poi.upsert_snowflake import SNOWFLAKE_TABLE, snowflake_pool
+from smartlease_api.property_schema import DETAILS_HASH_COLUMN
+
+# Load config
+config = toml.load("config.toml")
+embedding_config = config.get("embedding", {})
+
+# Must match the model hybrid search embeds queries with
+EMBEDDING_MODEL = embedding_config.get("model", "snowflake-arctic-embed-l-v2.0")
+EMBEDDING_DIM = 1024
+EMBEDDING_COLUMN = "complete_property_details_embedding"
+HASH_COLUMN = DETAILS_HASH_COLUMN
+BATCH_SIZE = embedding_config.get("batch_size", 500)
+STAGING_TABLE = "PROPERTIES_EMBEDDING_STAGING"
+
+def details_hash(text: str) -> str:
+    """
+    Same value as Snowflake's SHA2(text, 256).
+    """
+    return hashlib.sha256(str(text).encode("utf-8")).hexdigest()
+
+def load_embedder(path: str):
+    """
+    "package.module:function" -> function(list of texts) -> list of vectors.
+    """
+    module_name, _, attr = path.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+def _ensure_columns(cursor):
+    cursor.execute(
+        f'ALTER TABLE "{SNOWFLAKE_TABLE}" ADD COLUMN IF NOT EXISTS {EMBEDDING_COLUMN} VECTOR(FLOAT, {EMBEDDING_DIM})'
+    )
+    cursor.execute(f'ALTER TABLE "{SNOWFLAKE_TABLE}" ADD COLUMN IF NOT EXISTS "{HASH_COLUMN}" STRING')
+
+def _stale_rows(cursor, property_ids=None, with_text=False):
+    """
+    Rows with no embedding, or whose details changed since they were embedded.
+    """
+    sql = f'''
+        SELECT "property_id"{', "complete_property_details"' if with_text else ''}
+        FROM "{SNOWFLAKE_TABLE}"
+        WHERE "complete_property_details" IS NOT NULL
+          AND ({EMBEDDING_COLUMN} IS NULL
+               OR "{HASH_COLUMN}" IS NULL
+               OR "{HASH_COLUMN}" <> SHA2("complete_property_details", 256))
+    '''
+    params = ()
+    if property_ids is not None:
+        sql += ' AND "property_id" IN (SELECT value::STRING FROM TABLE(FLATTEN(input => PARSE_JSON(%s))))'
+        params = (json.dumps([str(pid) for pid in property_ids]),)
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+def _embed_in_warehouse(cursor, property_ids):
+    # One set-based UPDATE per batch; EMBED_TEXT_1024 runs inside Snowflake
+    cursor.execute(f'''
+        UPDATE "{SNOWFLAKE_TABLE}"
+        SET {EMBEDDING_COLUMN} = SNOWFLAKE.CORTEX.EMBED_TEXT_1024(%s, "complete_property_details"),
+            "{HASH_COLUMN}" = SHA2("complete_property_details", 256)
+        WHERE "property_id" IN (SELECT value::STRING FROM TABLE(FLATTEN(input => PARSE_JSON(%s))))
+    ''', (EMBEDDING_MODEL, json.dumps(property_ids)))
+
+def _embed_locally(conn, cursor, rows, embedder):
+    property_ids = [row[0] for row in rows]
+    texts = [row[1] for row in rows]
+    vectors = embedder(texts)
+    staged = pd.DataFrame({
+        "property_id": property_ids,
+        "embedding": [json.dumps([float(x) for x in vector]) for vector in vectors],
+        HASH_COLUMN: [details_hash(text) for text in texts],
+    })
+    cursor.execute(
+        f'CREATE OR REPLACE TEMPORARY TABLE "{STAGING_TABLE}" '
+        f'("property_id" STRING, "embedding" STRING, "{HASH_COLUMN}" STRING)'
+    )
+    write_pandas(conn, staged, STAGING_TABLE, quote_identifiers=True, compression="snappy")
+    cursor.execute(f'''
+        UPDATE "{SNOWFLAKE_TABLE}" t
+        SET {EMBEDDING_COLUMN} = PARSE_JSON(s."embedding")::ARRAY::VECTOR(FLOAT, {EMBEDDING_DIM}),
+            "{HASH_COLUMN}" = s."{HASH_COLUMN}"
+        FROM "{STAGING_TABLE}" s
+        WHERE t."property_id" = s."property_id"
+    ''')
+
+def embed_stale_properties(property_ids=None, embedder=None, batch_size=BATCH_SIZE):
+    """
+    Computes complete_property_details_embedding for rows that are missing one
+    or whose details hash changed, batch_size rows at a time. By default the
+    vectors are computed in Snowflake with EMBED_TEXT_1024; pass `embedder`
+    (or set [embedding] embedder = "module:function") to compute them locally
+    and bulk-load them instead. Queries must be embedded with the same model.
+    Returns {"stale", "embedded", "batches"}.
+    """
+    if embedder is None and embedding_config.get("embedder"):
+        embedder = load_embedder(embedding_config["embedder"])
+
+    embedded = batches = 0
+    with snowflake_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            _ensure_columns(cursor)
+            rows = _stale_rows(cursor, property_ids, with_text=embedder is not None)
+            print(f"▶ {len(rows)} properties need embeddings")
+
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                if embedder is None:
+                    _embed_in_warehouse(cursor, [row[0] for row in batch])
+                else:
+                    _embed_locally(conn, cursor, batch, embedder)
+                embedded += len(batch)
+                batches += 1
+                print(f"Embedded {embedded}/{len(rows)}")
+
+            if embedder is not None:
+                cursor.execute(f'DROP TABLE IF EXISTS "{STAGING_TABLE}"')
+        finally:
+            cursor.close()
+
+    return {"stale": len(rows), "embedded": embedded, "batches": batches}
+
+if __name__ == "__main__":
+    print(embed_stale_properties())
@@ -1,94 +1,86 @@
-import os
-import pandas as pd
-import requests
-import time
-import random
 import toml
 import argparse
+from pathlib import Path
+
+from add_properties_and_poi.poi_cache import PoiCache
+from add_properties_and_poi.poi_enrichment import DEFAULT_POI_TYPES, PLACES_BASE_URL, enrich_properties_concurrently
+from add_properties_and_poi.stage_io import read_stage, run_in_chunks, write_stage
 
 # Load config
 config = toml.load("config.toml")
-API_KEYS = config['google_places']['api_keys']
-DEFAULT_POI_TYPES = ['restaurant', 'cafe', 'hospital', 'pharmacy', 'atm', 'bank']
+places_config = config['google_places']
+API_KEYS = places_config['api_keys']
 
-def get_poi_details(poi_id, api_key):
-    endpoint = "https://maps.googleapis.com/maps/api/place/details/json"
-    url = f"{endpoint}?place_id={poi_id}&key={api_key}"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        result = response.json()
-        if 'result' in result:
-            place = result['result']
-            return {
-                'name': place.get('name', 'N/A'),
-                'address': place.get('formatted_address', 'N/A'),
-                'rating': place.get('rating', 'N/A'),
-                'user_ratings_total': place.get('user_ratings_total', 'N/A'),
-                'types': place.get('types', []),
-                'vicinity': place.get('vicinity', 'N/A')
-            }
-        return None
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching details for POI {poi_id}: {e}")
-        return None
+# Places responses cached across runs; [poi_cache] enabled = false turns it off
+poi_cache_config = config.get("poi_cache", {})
+POI_CACHE_PATH = Path(poi_cache_config.get("path", Path(__file__).parent / "cache" / "poi_cache.sqlite"))
 
-def get_poi_for_address(address, api_key, lat=None, lng=None):
-    endpoint = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-    query = f"location={lat},{lng}&radius=2400" if lat and lng else f"query=near {address}"
-    url = f"{endpoint}?{query}&key={api_key}"
+def open_poi_cache():
+    if not poi_cache_config.get("enabled", True):
+        return None
+    POI_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    return PoiCache(
+        POI_CACHE_PATH,
+        ttl_seconds=poi_cache_config.get("ttl_days", 30) * 24 * 3600,
+        cell_precision=poi_cache_config.get("cell_precision", 3),
+    )
 
+def rows_in_range(chunk, offset, start_row=0, end_row=None):
+    """
+    The rows of `chunk` (whose first row is row `offset` of the whole input)
+    that fall within start_row:end_row of the whole input.
+    """
+    start = max(start_row - offset, 0)
+    end = len(chunk) if not end_row else min(max(end_row - offset, 0), len(chunk))
+    return chunk.iloc[start:max(start, end)]
+
+def enrich_properties(properties, start_row=0, end_row=None, shards=1):
+    """
+    Adds the nearest POI name/rating/address for each DEFAULT_POI_TYPES to
+    rows start_row:end_row of the DataFrame and returns those rows. Lookups
+    (one typed search per POI type by default, see [google_places] mode) run
+    concurrently, rate limited per API key, and go through the POI cache first.
+    With shards > 1 the rate limit and concurrency are split evenly, so that
+    many processes enriching at once stay within the configured quota.
+    """
+    properties_to_process = rows_in_range(properties, 0, start_row, end_row)
+    cache = open_poi_cache()
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        results = response.json()
-        poi_details = []
-        if 'results' in results:
-            for result in results['results']:
-                poi_id = result['place_id']
-                details = get_poi_details(poi_id, api_key)
-                if details:
-                    poi_details.append(details)
-        return poi_details
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching POIs for address {address}: {e}")
-        return []
-
-def add_poi_to_properties(input_csv, output_csv, start_row=0, end_row=None):
-    properties = pd.read_csv(input_csv)
-    properties_to_process = properties.iloc[start_row:end_row] if end_row else properties.iloc[start_row:]
-
-    for poi_type in DEFAULT_POI_TYPES:
-        properties_to_process[f'{poi_type}_name'] = ''
-        properties_to_process[f'{poi_type}_rating'] = ''
-        properties_to_process[f'{poi_type}_address'] = ''
-
-    def get_poi_with_retry(address, lat=None, lng=None):
-        for _ in range(3):
-            api_key = random.choice(API_KEYS)
-            pois = get_poi_for_address(address, api_key, lat, lng)
-            if pois:
-                return pois
-            time.sleep(random.uniform(1, 2))
-        return []
-
-    for idx, row in properties_to_process.iterrows():
-        address = row.get('address', '')
-        lat = row.get('latitude', None)
-        lng = row.get('longitude', None)
-        property_id = row.get('property_id', 'unknown')
-        print(f"Processing: {address} (ID: {property_id})")
-
-        if address:
-            pois = get_poi_with_retry(address, lat, lng)
-            for poi in pois:
-                for poi_type in DEFAULT_POI_TYPES:
-                    if poi_type in poi['types']:
-                        properties_to_process.at[idx, f'{poi_type}_name'] = poi['name']
-                        properties_to_process.at[idx, f'{poi_type}_rating'] = poi['rating']
-                        properties_to_process.at[idx, f'{poi_type}_address'] = poi['address']
-
-    properties_to_process.to_csv(output_csv, index=False)
+        return enrich_properties_concurrently(
+            properties_to_process,
+            API_KEYS,
+            DEFAULT_POI_TYPES,
+            mode=places_config.get('mode', 'typed'),
+            rank_by=places_config.get('rank_by', 'distance'),
+            base_url=places_config.get('base_url', PLACES_BASE_URL),
+            requests_per_second=places_config.get('requests_per_second', 10) / shards,
+            max_concurrency=max(1, places_config.get('max_concurrency', 20) // shards),
+            max_retries=places_config.get('max_retries', 3),
+            cache=cache,
+        )
+    finally:
+        if cache:
+            cache.close()
+
+def add_poi_to_properties(input_csv, output_csv, start_row=0, end_row=None, chunk_size=None, resume=False):
+    """
+    Enriches rows start_row:end_row of a .parquet/.csv (or chunk directory).
+    With chunk_size the input is streamed and every enriched chunk is saved
+    as soon as it is done, to a directory named like output_csv without its
+    suffix; resume skips the chunks an interrupted run already finished.
+    """
+    if chunk_size:
+        def enrich_chunk(chunk, offset):
+            rows = rows_in_range(chunk, offset, start_row, end_row)
+            return enrich_properties(rows) if len(rows) else rows
+
+        output = run_in_chunks(enrich_chunk, input_csv, Path(output_csv).with_suffix(""), chunk_size, resume=resume)
+        print(f"POIs added. Data saved to {output.directory}")
+        return len(output), output.directory
+
+    properties = read_stage(input_csv)
+    properties_to_process = enrich_properties(properties, start_row, end_row)
+    write_stage(properties_to_process, output_csv)
     print(f"POIs added. Data saved to {output_csv}")
     return len(properties_to_process), output_csv
 
@@ -97,6 +89,8 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--start_row", type=int, default=0)
     parser.add_argument("--end_row", type=int, default=None)
+    parser.add_argument("--chunk_size", type=int, default=config.get("pipeline", {}).get("chunk_size"))
+    parser.add_argument("--resume", action="store_true", help="continue after the last completed chunk")
 
     args = parser.parse_args()
 
@@ -109,7 +103,9 @@ if __name__ == "__main__":
         input_csv=input_csv,
         output_csv=output_csv,
         start_row=args.start_row,
-        end_row=args.end_row
+        end_row=args.end_row,
+        chunk_size=args.chunk_size,
+        resume=args.resume
     )
 
 
@@ -0,0 +1,266 @@
+import json
+import multiprocessing
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import toml
+
+from add_properties_and_poi.pipeline import PipelineRunner
+
+# Load config
+config = toml.load("config.toml")
+jobs_config = config.get("jobs", {})
+
+JOBS_DB_PATH = Path(jobs_config.get("db_path", Path(__file__).parent / "output" / "jobs.sqlite"))
+MAX_WORKERS = jobs_config.get("max_workers", 2)
+
+TERMINAL_STATUSES = ("succeeded", "empty", "cancelled", "failed")
+ACTIVE_STATUSES = ("queued", "running")
+# PipelineRunner report status -> job status
+RUN_STATUSES = {"success": "succeeded", "empty": "empty", "cancelled": "cancelled"}
+
+
+class JobStore:
+    """
+    Pipeline jobs in a local SQLite file, shared by the API process and the
+    worker processes. Each call opens its own short-lived connection, so the
+    store is safe to use from any thread or process.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, params TEXT, resume_from TEXT, status TEXT, progress TEXT, "
+                "message TEXT, error TEXT, cancel_requested INTEGER DEFAULT 0, "
+                "created_at REAL, started_at REAL, finished_at REAL, run_key TEXT)"
+            )
+            columns = {row[1] for row in db.execute("PRAGMA table_info(jobs)")}
+            if "run_key" not in columns:
+                # Stores created before jobs were keyed by checkpoint namespace
+                db.execute("ALTER TABLE jobs ADD COLUMN run_key TEXT")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def _as_dict(row) -> dict:
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["progress"] = json.loads(job["progress"]) if job["progress"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def create(self, params: dict, resume_from: str = None, run_key: str = None):
+        """
+        Queue a job. Returns (job_id, created): with a run_key, a job already
+        queued or running under the same key is returned instead of a new one.
+        """
+        db = self._connect()
+        db.isolation_level = None
+        try:
+            # IMMEDIATE: the lookup and the insert happen under one write lock
+            db.execute("BEGIN IMMEDIATE")
+            if run_key is not None:
+                row = db.execute(
+                    f"SELECT job_id FROM jobs WHERE run_key = ? AND status IN {ACTIVE_STATUSES} "
+                    "ORDER BY created_at LIMIT 1",
+                    (run_key,)
+                ).fetchone()
+                if row is not None:
+                    db.execute("COMMIT")
+                    return row[0], False
+            job_id = uuid.uuid4().hex[:12]
+            db.execute(
+                "INSERT INTO jobs (job_id, params, resume_from, status, created_at, run_key) "
+                "VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, json.dumps(params), resume_from, time.time(), run_key)
+            )
+            db.execute("COMMIT")
+            return job_id, True
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    def get(self, job_id: str):
+        with self._connect() as db:
+            db.row_factory = sqlite3.Row
+            row = db.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._as_dict(row) if row else None
+
+    def list(self, limit: int = 20) -> list:
+        with self._connect() as db:
+            db.row_factory = sqlite3.Row
+            rows = db.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._as_dict(row) for row in rows]
+
+    def claim(self, job_id: str) -> bool:
+        """
+        Move a queued job to running. False if it was cancelled meanwhile.
+        """
+        with self._connect() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'running', started_at = ? WHERE job_id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+        return cursor.rowcount == 1
+
+    def set_progress(self, job_id: str, report: dict):
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET progress = ? WHERE job_id = ?", (json.dumps(report), job_id))
+
+    def finish(self, job_id: str, status: str, message: str = None, error: str = None):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, message = ?, error = ?, finished_at = ? WHERE job_id = ?",
+                (status, message, error, time.time(), job_id)
+            )
+
+    def cancel(self, job_id: str):
+        """
+        Cancel a job: a queued job never starts; a running one stops at the
+        next stage boundary. Returns the updated job, or None if unknown.
+        """
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE job_id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+            db.execute("UPDATE jobs SET cancel_requested = 1 WHERE job_id = ? AND status = 'running'", (job_id,))
+        return self.get(job_id)
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._connect() as db:
+            row = db.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def interrupted(self):
+        """
+        Jobs left queued or running by a previous API process:
+        (queued job ids, running job ids).
+        """
+        with self._connect() as db:
+            rows = db.execute("SELECT job_id, status FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+        return [job_id for job_id, status in rows if status == "queued"], \
+               [job_id for job_id, status in rows if status == "running"]
+
+
+def run_key(params: dict) -> str:
+    """
+    Checkpoint namespace a job writes to. Two jobs running under the same
+    key would clear each other's checkpoints.
+    """
+    if "locations" in params:
+        from add_properties_and_poi.bulk_ingest import bulk_run_id
+
+        return bulk_run_id(params["locations"], params["listing_type"], params["past_days"])
+    return PipelineRunner.run_id_for(params)
+
+
+def run_job(db_path, job_id: str) -> str:
+    """
+    Worker-process entry point: runs one pipeline job (a bulk ingest when
+    its params list several locations) and records its progress and outcome
+    in the store. Returns the final job status.
+    """
+    from add_properties_and_poi.bulk_ingest import run_bulk_ingest
+    from add_properties_and_poi.controller import run_pipeline
+
+    store = JobStore(db_path)
+    if not store.claim(job_id):
+        return "cancelled"
+    job = store.get(job_id)
+    hooks = {
+        "on_progress": lambda report: store.set_progress(job_id, report),
+        "should_cancel": lambda: store.cancel_requested(job_id),
+    }
+    try:
+        if "locations" in job["params"]:
+            message = run_bulk_ingest(**job["params"], **hooks)
+        else:
+            message = run_pipeline(**job["params"], resume_from=job["resume_from"], **hooks)
+    except Exception as e:
+        print(f"❌ Pipeline job {job_id} failed: {e}")
+        store.finish(job_id, "failed", error=str(e))
+        return "failed"
+    status = RUN_STATUSES[store.get(job_id)["progress"]["status"]]
+    store.finish(job_id, status, message=message)
+    return status
+
+
+class JobQueue:
+    """
+    Runs pipeline jobs on a bounded pool of worker processes so API workers
+    never block on a scrape, and several locations ingest in parallel.
+    on_finished(job_id, status) is called in this process after each job.
+    """
+    def __init__(self, store: JobStore, max_workers: int = MAX_WORKERS, on_finished=None):
+        self.store = store
+        self.max_workers = max_workers
+        self.on_finished = on_finished
+        self._executor = None
+
+    def _pool(self):
+        if self._executor is None:
+            # spawn: workers must not inherit the API process's threads and open connections
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _dispatch(self, job_id: str):
+        future = self._pool().submit(run_job, str(self.store.path), job_id)
+        future.add_done_callback(lambda f: self._done(job_id, f))
+
+    def _done(self, job_id: str, future):
+        error = future.exception()
+        if error is None:
+            status = future.result()
+        else:
+            if isinstance(error, BrokenProcessPool):
+                # A worker died; start a fresh pool for later jobs
+                self._executor = None
+            status = self.store.get(job_id)["status"]
+            if status not in TERMINAL_STATUSES:
+                # The worker process died before it could record the outcome
+                self.store.finish(job_id, "failed", error=str(error))
+                status = "failed"
+        if self.on_finished is not None:
+            self.on_finished(job_id, status)
+
+    def submit(self, params: dict, resume_from: str = None) -> str:
+        """
+        Queue a job and return its id. A job with the same run key that is
+        still queued or running is returned instead of starting a second
+        one on the same checkpoints.
+        """
+        job_id, created = self.store.create(params, resume_from, run_key=run_key(params))
+        if created:
+            self._dispatch(job_id)
+        else:
+            print(f"Pipeline job {job_id} is already active for these parameters")
+        return job_id
+
+    def recover(self):
+        """
+        Re-dispatch jobs still queued from a previous process and fail the
+        ones it left running (rerun them with resume_from).
+        """
+        queued, running = self.store.interrupted()
+        for job_id in running:
+            self.store.finish(job_id, "failed", error="Interrupted by an API restart")
+        for job_id in queued:
+            self._dispatch(job_id)
+        return {"requeued": len(queued), "interrupted": len(running)}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
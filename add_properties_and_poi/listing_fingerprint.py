@@ -0,0 +1,81 @@
+import hashlib
+import json
+
+import pandas as pd
+
+from add_properties_and_poi.property_text import column_text
+from smartlease_api.property_schema import FINGERPRINT_COLUMN
+
+# Scraped fields that define a listing. POI columns are left out: they are
+# derived from the address, which is included.
+FINGERPRINT_FIELDS = [
+    'address', 'status', 'style', 'beds', 'full_baths', 'sqft', 'year_built', 'list_price',
+    'latitude', 'longitude', 'neighborhoods', 'county', 'nearby_schools', 'primary_photo', 'alt_photos'
+]
+FIELD_SEPARATOR = "\x1f"
+
+def listing_fingerprints(properties: pd.DataFrame) -> pd.Series:
+    """
+    sha256 per row over FINGERPRINT_FIELDS, formatted like the details text
+    (nulls as "", 2.0 as "2") so a re-scrape of the same listing hashes the
+    same. Missing fields count as empty.
+    """
+    columns = [
+        column_text(properties[field]) if field in properties.columns else pd.Series("", index=properties.index)
+        for field in FINGERPRINT_FIELDS
+    ]
+    return pd.Series(
+        [hashlib.sha256(FIELD_SEPARATOR.join(values).encode("utf-8")).hexdigest() for values in zip(*columns)],
+        index=properties.index, dtype=object
+    )
+
+def stored_fingerprints(property_ids) -> dict:
+    """
+    property_id -> stored fingerprint (None for rows loaded before
+    fingerprints existed) for the ids already in the warehouse.
+    """
+    from add_properties_and_poi.upsert_snowflake import SNOWFLAKE_TABLE, snowflake_pool
+
+    with snowflake_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = CURRENT_SCHEMA() AND table_name = %s",
+                (SNOWFLAKE_TABLE,)
+            )
+            existing_columns = {row[0] for row in cursor.fetchall()}
+            if not existing_columns:
+                # First load: the table does not exist yet
+                return {}
+            fingerprint = f'"{FINGERPRINT_COLUMN}"' if FINGERPRINT_COLUMN in existing_columns else "NULL"
+            cursor.execute(
+                f'SELECT "property_id", {fingerprint} FROM "{SNOWFLAKE_TABLE}" '
+                f'WHERE "property_id" IN (SELECT value::STRING FROM TABLE(FLATTEN(input => PARSE_JSON(%s))))',
+                (json.dumps([str(pid) for pid in property_ids]),)
+            )
+            return dict(cursor.fetchall())
+        finally:
+            cursor.close()
+
+def changed_listings(properties: pd.DataFrame, stored: dict = None):
+    """
+    Adds the listing_fingerprint column and keeps only new listings and
+    listings whose fingerprint differs from the stored one. Returns
+    (changed, counts) with counts {"new", "changed", "unchanged"}.
+    """
+    properties = properties.copy()
+    properties[FINGERPRINT_COLUMN] = listing_fingerprints(properties)
+    ids = properties["property_id"].astype(str)
+    if stored is None:
+        stored = stored_fingerprints(ids.unique().tolist())
+
+    known = ids.isin(stored.keys())
+    unchanged = known & (properties[FINGERPRINT_COLUMN] == ids.map(stored))
+    counts = {
+        "new": int((~known).sum()),
+        "changed": int((known & ~unchanged).sum()),
+        "unchanged": int(unchanged.sum()),
+    }
+    print(f"Listings: {counts['new']} new, {counts['changed']} changed, {counts['unchanged']} unchanged")
+    return properties[~unchanged].reset_index(drop=True), counts
@@ -0,0 +1,18 @@
+"""
+One-off migration of PROPERTIES_DATA_WITH_EMBEDDINGS from STRING to NUMBER
+numeric columns, plus its clustering key. Run once before deploying the
+search change that filters on the typed columns:
+
+    python -m add_properties_and_poi.migrate_numeric_columns
+"""
+from add_properties_and_poi.upsert_snowflake import SNOWFLAKE_TABLE, snowflake_pool
+from smartlease_api.property_schema import migrate_numeric_columns
+
+if __name__ == "__main__":
+    with snowflake_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            migrated = migrate_numeric_columns(cursor, SNOWFLAKE_TABLE)
+        finally:
+            cursor.close()
+    print(f"✅ Migrated columns: {migrated or 'none (already typed)'}")
@@ -0,0 +1,240 @@
+import hashlib
+import json
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from add_properties_and_poi.stage_io import (
+    ChunkedOutput, as_frame, clear_checkpoint, find_checkpoint, read_checkpoint, run_in_chunks, write_checkpoint
+)
+
+
+class Stage:
+    """
+    One step of a pipeline. `func(params, *inputs)` receives the run
+    parameters followed by the outputs of `depends_on`, in order. `columns`,
+    if set, are the only input columns the stage reads; checkpoints loaded
+    for it are pruned to them.
+
+    A `chunked` stage has a single dependency and works row-wise: when the
+    runner has a chunk_size it is called once per chunk of its input, with
+    params["chunk_offset"] set to the chunk's first row.
+    """
+    def __init__(self, name, func, depends_on=(), retries=None, columns=None, chunked=False):
+        self.name = name
+        self.func = func
+        self.depends_on = list(depends_on)
+        self.retries = retries
+        self.columns = columns
+        self.chunked = chunked
+        if chunked and len(self.depends_on) != 1:
+            raise ValueError(f"Chunked stage '{name}' must depend on exactly one stage")
+
+
+def _is_empty(output) -> bool:
+    return output is None or (isinstance(output, (pd.DataFrame, ChunkedOutput)) and len(output) == 0)
+
+
+def _rows(output):
+    return len(output) if isinstance(output, (pd.DataFrame, ChunkedOutput)) else None
+
+
+class PipelineRunner:
+    """
+    Runs stages in dependency order inside this process, handing DataFrames
+    from one stage to the next in memory.
+
+    Every stage output is checkpointed under checkpoint_dir/<run_id>/ (typed
+    Parquet for DataFrames, JSON otherwise), so a failed run can be resumed
+    with resume_from=<stage>: earlier stages are loaded from their
+    checkpoints instead of being executed again, and only the columns the
+    remaining stages read. A stage that returns nothing or an empty
+    DataFrame ends the run early, as does should_cancel() returning True
+    before a stage starts.
+
+    With chunk_size, chunked stages stream their input chunk by chunk and
+    checkpoint every chunk, so memory stays bounded by the chunk size and a
+    failed stage (retried, or resumed with resume_from=<stage>) continues
+    after its last completed chunk. Outputs consumed only by chunked stages
+    are handed on as checkpoint paths rather than kept in memory.
+    """
+    def __init__(self, stages, checkpoint_dir, retries=2, retry_backoff=2.0, chunk_size=None):
+        self.stages = self._ordered(stages)
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def _ordered(stages):
+        by_name = {stage.name: stage for stage in stages}
+        ordered, visiting, done = [], set(), set()
+
+        def visit(stage):
+            if stage.name in done:
+                return
+            if stage.name in visiting:
+                raise ValueError(f"Pipeline has a dependency cycle at stage '{stage.name}'")
+            visiting.add(stage.name)
+            for dep in stage.depends_on:
+                if dep not in by_name:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+                visit(by_name[dep])
+            visiting.discard(stage.name)
+            done.add(stage.name)
+            ordered.append(stage)
+
+        for stage in stages:
+            visit(stage)
+        return ordered
+
+    @staticmethod
+    def run_id_for(params: dict) -> str:
+        # Same parameters -> same run directory, so a retry can find its checkpoints
+        return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+    def _checkpoint_base(self, run_id, stage_name):
+        return self.checkpoint_dir / run_id / stage_name
+
+    def checkpoint(self, run_id, stage_name):
+        """
+        Path of a stage's checkpoint in a run, or None if it has none.
+        """
+        return find_checkpoint(self._checkpoint_base(run_id, stage_name))
+
+    def _columns_needed(self, stage_name):
+        """
+        Union of the columns the stage's consumers read; None if any reads all.
+        """
+        needed = set()
+        for stage in self.stages:
+            if stage_name in stage.depends_on:
+                if stage.columns is None:
+                    return None
+                needed.update(stage.columns)
+        return sorted(needed) if needed else None
+
+    def _streamed(self, stage_name) -> bool:
+        """
+        True if every consumer of the stage reads it chunk by chunk.
+        """
+        consumers = [stage for stage in self.stages if stage_name in stage.depends_on]
+        return bool(self.chunk_size and consumers and all(stage.chunked for stage in consumers))
+
+    def _call(self, stage, params, inputs, checkpoint_base, resume):
+        """
+        Returns attempt -> output for one stage.
+        """
+        if not (stage.chunked and self.chunk_size):
+            frames = [as_frame(i, stage.columns) if isinstance(i, (ChunkedOutput, Path)) else i for i in inputs]
+            return lambda attempt: stage.func(params, *frames)
+
+        def func(chunk, offset):
+            return stage.func(dict(params, chunk_offset=offset), chunk)
+
+        # Retries pick up after the chunks the failed attempt completed
+        return lambda attempt: run_in_chunks(
+            func, inputs[0], checkpoint_base, self.chunk_size, columns=stage.columns,
+            resume=resume or attempt > 1
+        ).result()
+
+    def _execute(self, stage, call):
+        retries = self.retries if stage.retries is None else stage.retries
+        for attempt in range(1, retries + 2):
+            try:
+                return call(attempt), attempt
+            except Exception as e:
+                if attempt > retries:
+                    raise
+                delay = self.retry_backoff * 2 ** (attempt - 1)
+                print(f"⚠️ Stage '{stage.name}' failed (attempt {attempt}): {e}. Retrying in {delay:.0f}s")
+                time.sleep(delay)
+
+    def run(self, params: dict, resume_from: str = None, run_id: str = None, on_progress=None,
+            should_cancel=None):
+        """
+        Returns (outputs, report): outputs maps stage name to its result;
+        report holds the run_id, overall status (success, empty, cancelled
+        or failed) and per-stage timings and row counts. on_progress(report)
+        is called whenever a stage starts or finishes.
+        """
+        names = [stage.name for stage in self.stages]
+        if resume_from is not None and resume_from not in names:
+            raise ValueError(f"Unknown stage '{resume_from}'; expected one of {names}")
+
+        run_id = run_id or self.run_id_for(params)
+        (self.checkpoint_dir / run_id).mkdir(parents=True, exist_ok=True)
+        resume_index = names.index(resume_from) if resume_from else 0
+        # Checkpoints the stages still to run actually consume
+        to_load = {dep for stage in self.stages[resume_index:] for dep in stage.depends_on}
+
+        outputs = {}
+        report = {"run_id": run_id, "status": "success", "stages": {}}
+        progress = on_progress or (lambda report: None)
+        for index, stage in enumerate(self.stages):
+            checkpoint_base = self._checkpoint_base(run_id, stage.name)
+
+            if report["status"] == "success" and should_cancel is not None and should_cancel():
+                print(f"⚠️ Run cancelled before stage '{stage.name}'.")
+                report["status"] = "cancelled"
+
+            if report["status"] != "success":
+                report["stages"][stage.name] = {"status": "skipped"}
+                continue
+
+            if index < resume_index:
+                checkpoint = find_checkpoint(checkpoint_base)
+                if checkpoint is None:
+                    raise FileNotFoundError(
+                        f"Cannot resume from '{resume_from}': no checkpoint for stage '{stage.name}' in run {run_id}"
+                    )
+                report["stages"][stage.name] = {"status": "resumed"}
+                if stage.name in to_load:
+                    if self._streamed(stage.name):
+                        outputs[stage.name] = checkpoint
+                    else:
+                        outputs[stage.name] = read_checkpoint(checkpoint, columns=self._columns_needed(stage.name))
+                        report["stages"][stage.name]["rows"] = _rows(outputs[stage.name])
+                continue
+
+            print(f"▶ Stage '{stage.name}'")
+            report["stages"][stage.name] = {"status": "running"}
+            progress(report)
+            start = time.perf_counter()
+            resume_chunks = stage.name == resume_from
+            if not (resume_chunks and stage.chunked):
+                clear_checkpoint(checkpoint_base)
+            call = self._call(stage, params, [outputs[dep] for dep in stage.depends_on], checkpoint_base, resume_chunks)
+            try:
+                output, attempts = self._execute(stage, call)
+            except Exception:
+                report["status"] = "failed"
+                report["stages"][stage.name] = {"status": "failed", "seconds": round(time.perf_counter() - start, 3)}
+                progress(report)
+                raise
+            elapsed = time.perf_counter() - start
+
+            rows, empty = _rows(output), _is_empty(output)
+            # Chunked stages have checkpointed as they went
+            if not (stage.chunked and self.chunk_size):
+                checkpoint = write_checkpoint(output, checkpoint_base)
+                if self._streamed(stage.name):
+                    # Consumers stream it from disk; don't hold the whole frame
+                    output = checkpoint
+            outputs[stage.name] = output
+            report["stages"][stage.name] = {
+                "status": "done",
+                "seconds": round(elapsed, 3),
+                "attempts": attempts,
+                "rows": rows,
+            }
+            print(f"✅ Stage '{stage.name}' finished in {elapsed:.2f}s")
+
+            if empty:
+                print(f"⚠️ Stage '{stage.name}' produced no data. Stopping early.")
+                report["status"] = "empty"
+            progress(report)
+
+        progress(report)
+        return outputs, report
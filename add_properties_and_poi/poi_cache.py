@@ -0,0 +1,93 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+
+class PoiCache:
+    """
+    SQLite cache of Places responses that survives between pipeline runs:
+    nearby-search place_ids per geo cell (lat/lng rounded to
+    `cell_precision` decimals, ~110 m at 3), the chosen place per cell and
+    POI type for typed searches, and place details per place_id.
+    Entries older than ttl_seconds are treated as misses.
+    """
+    def __init__(self, path, ttl_seconds=30 * 24 * 3600, cell_precision=3):
+        self.ttl_seconds = ttl_seconds
+        self.cell_precision = cell_precision
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        # Bulk ingestion shares the file between processes; wait out their writes
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("CREATE TABLE IF NOT EXISTS nearby (cell TEXT PRIMARY KEY, place_ids TEXT, fetched_at REAL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS typed (key TEXT PRIMARY KEY, poi TEXT, fetched_at REAL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS details (place_id TEXT PRIMARY KEY, details TEXT, fetched_at REAL)")
+        self._db.commit()
+
+    def cell(self, lat, lng):
+        """
+        Rounded (lat, lng) of the cell containing the point; nearby searches
+        are issued from this point so the cached result fits the whole cell.
+        """
+        return round(float(lat), self.cell_precision), round(float(lng), self.cell_precision)
+
+    def cell_key(self, lat, lng, radius) -> str:
+        lat, lng = self.cell(lat, lng)
+        return f"{lat:.{self.cell_precision}f},{lng:.{self.cell_precision}f}@{radius}"
+
+    @staticmethod
+    def query_key(address: str) -> str:
+        return "query:" + " ".join(str(address).lower().split())
+
+    def _get(self, table, key_column, value_column, key, kind):
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {value_column}, fetched_at FROM {table} WHERE {key_column} = ?", (key,)
+            ).fetchone()
+        if row is None:
+            self.stats[f"{kind}_misses"] += 1
+            return None
+        if time.time() - row[1] > self.ttl_seconds:
+            self.stats[f"{kind}_expired"] += 1
+            return None
+        self.stats[f"{kind}_hits"] += 1
+        return json.loads(row[0])
+
+    def _put(self, table, key_column, value_column, key, value):
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {table} ({key_column}, {value_column}, fetched_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time())
+            )
+            self._db.commit()
+
+    def get_nearby(self, key: str):
+        return self._get("nearby", "cell", "place_ids", key, "nearby")
+
+    def put_nearby(self, key: str, place_ids: list):
+        self._put("nearby", "cell", "place_ids", key, place_ids)
+
+    def get_typed(self, key: str):
+        return self._get("typed", "key", "poi", key, "typed")
+
+    def put_typed(self, key: str, poi: dict):
+        self._put("typed", "key", "poi", key, poi)
+
+    def get_details(self, place_id: str):
+        return self._get("details", "place_id", "details", place_id, "details")
+
+    def put_details(self, place_id: str, details: dict):
+        self._put("details", "place_id", "details", place_id, details)
+
+    def summary(self) -> dict:
+        report = dict(self.stats)
+        for kind in ("nearby", "typed", "details"):
+            hits = self.stats[f"{kind}_hits"]
+            lookups = hits + self.stats[f"{kind}_misses"] + self.stats[f"{kind}_expired"]
+            report[f"{kind}_hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        return report
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,320 @@
+import asyncio
+import random
+import time
+
+import aiohttp
+import pandas as pd
+
+from add_properties_and_poi.poi_cache import PoiCache
+
+PLACES_BASE_URL = "https://maps.googleapis.com/maps/api/place"
+DEFAULT_POI_TYPES = ['restaurant', 'cafe', 'hospital', 'pharmacy', 'atm', 'bank']
+
+# Places statuses worth retrying; anything else (OK, ZERO_RESULTS, REQUEST_DENIED...) is final
+RETRY_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+# The only statuses that describe the place itself and may be cached; the rest
+# (REQUEST_DENIED, INVALID_REQUEST, NOT_FOUND...) say nothing about what is nearby
+RESULT_STATUSES = {"OK", "ZERO_RESULTS"}
+RETRY_HTTP_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` requests per second with bursts up to `capacity`.
+    """
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        # At least one token, so a fractional rate (a shard's share) still works
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class PlacesClient:
+    """
+    Google Places client sharing one aiohttp session (keep-alive connections)
+    across all requests. Requests rotate over the API keys, each limited by
+    its own token bucket, and failed calls are retried with exponential
+    backoff and jitter. With a PoiCache, nearby results and details are read
+    from it before any HTTP call, and identical lookups already in flight are
+    shared. Use as `async with PlacesClient(keys) as client:`.
+    """
+    def __init__(self, api_keys, base_url=PLACES_BASE_URL, requests_per_second=10, max_concurrency=20,
+                 max_retries=3, backoff=0.5, timeout=30, cache=None, radius=2400):
+        if not api_keys:
+            raise ValueError("PlacesClient needs at least one API key")
+        self.api_keys = list(api_keys)
+        self.base_url = base_url.rstrip("/")
+        self.buckets = {key: TokenBucket(requests_per_second) for key in self.api_keys}
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache
+        self.radius = radius
+        self._inflight = {}
+        self._next_key = 0
+        self._semaphore = None
+        self.session = None
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "errors": 0, "shared": 0}
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    def _pick_key(self) -> str:
+        # Round robin; each key's bucket then enforces its own rate
+        key = self.api_keys[self._next_key % len(self.api_keys)]
+        self._next_key += 1
+        return key
+
+    async def _get_json(self, path: str, params: dict):
+        """
+        GET base_url/path; returns the decoded JSON, or None once retries are
+        exhausted or the API answered with an error status (bad key, invalid
+        request), so callers never cache an error as "no results".
+        """
+        for attempt in range(self.max_retries + 1):
+            key = self._pick_key()
+            await self.buckets[key].acquire()
+            try:
+                async with self._semaphore:
+                    self.stats["requests"] += 1
+                    async with self.session.get(f"{self.base_url}/{path}", params={**params, "key": key}) as response:
+                        if response.status not in RETRY_HTTP_CODES:
+                            response.raise_for_status()
+                            payload = await response.json(content_type=None)
+                            status = payload.get("status")
+                            if status in RESULT_STATUSES:
+                                return payload
+                            if status not in RETRY_STATUSES:
+                                print(f"Places request {path} returned {status}: {payload.get('error_message', '')}")
+                                self.stats["errors"] += 1
+                                break
+            except (aiohttp.ContentTypeError, ValueError) as e:
+                # A truncated or non-JSON body (e.g. a proxy error page) is transient, like a 5xx;
+                # ContentTypeError subclasses ClientResponseError, so it must be caught first
+                print(f"Places request {path} returned an undecodable body (attempt {attempt + 1}): {e}")
+            except aiohttp.ClientResponseError as e:
+                print(f"Places request {path} failed: {e}")
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Places request {path} error (attempt {attempt + 1}): {e}")
+
+            if attempt < self.max_retries:
+                self.stats["retries"] += 1
+                await asyncio.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+        self.stats["failures"] += 1
+        return None
+
+    async def _shared(self, key, fetch):
+        """
+        Runs fetch() once per key at a time; concurrent callers await the same task.
+        """
+        if key in self._inflight:
+            self.stats["shared"] += 1
+        else:
+            self._inflight[key] = asyncio.ensure_future(fetch())
+            self._inflight[key].add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(self._inflight[key])
+
+    async def get_poi_details(self, poi_id: str):
+        if self.cache:
+            cached = self.cache.get_details(poi_id)
+            if cached is not None:
+                return cached
+        return await self._shared(("details", poi_id), lambda: self._fetch_details(poi_id))
+
+    async def _fetch_details(self, poi_id: str):
+        result = await self._get_json("details/json", {"place_id": poi_id})
+        if not result or 'result' not in result:
+            return None
+        place = result['result']
+        details = {
+            'name': place.get('name', 'N/A'),
+            'address': place.get('formatted_address', 'N/A'),
+            'rating': place.get('rating', 'N/A'),
+            'user_ratings_total': place.get('user_ratings_total', 'N/A'),
+            'types': place.get('types', []),
+            'vicinity': place.get('vicinity', 'N/A')
+        }
+        if self.cache:
+            self.cache.put_details(poi_id, details)
+        return details
+
+    def _origin(self, address, lat=None, lng=None):
+        """
+        (cache key, "lat,lng" or None) for a property; None means search by address text.
+        """
+        if pd.notna(lat) and pd.notna(lng) and lat and lng:
+            if self.cache:
+                # Search from the cell centre so one result serves every listing in the cell
+                lat, lng = self.cache.cell(lat, lng)
+                return self.cache.cell_key(lat, lng, self.radius), f"{lat},{lng}"
+            return f"{lat},{lng}", f"{lat},{lng}"
+        return PoiCache.query_key(address), None
+
+    async def _nearby_place_ids(self, address, lat=None, lng=None):
+        key, location = self._origin(address, lat, lng)
+        if location:
+            params = {"location": location, "radius": self.radius}
+        else:
+            params = {"query": f"near {address}"}
+
+        if self.cache:
+            cached = self.cache.get_nearby(key)
+            if cached is not None:
+                return cached
+        return await self._shared(("nearby", key), lambda: self._fetch_nearby(key, params))
+
+    async def _fetch_nearby(self, key, params):
+        results = await self._get_json("nearbysearch/json", params)
+        if results is None:
+            return []
+        place_ids = [result['place_id'] for result in results.get('results', [])]
+        if self.cache:
+            self.cache.put_nearby(key, place_ids)
+        return place_ids
+
+    async def get_poi_for_address(self, address, lat=None, lng=None):
+        place_ids = await self._nearby_place_ids(address, lat, lng)
+        details = await asyncio.gather(*(self.get_poi_details(place_id) for place_id in place_ids))
+        return [poi for poi in details if poi]
+
+
+    async def get_typed_poi(self, poi_type, address, lat=None, lng=None, rank_by="distance"):
+        """
+        Best place of one type straight from the search payload, with no
+        details call: the nearest (rank_by="distance") or the highest rated
+        within `radius` (rank_by="rating"; ties go to more reviews, then
+        place_id). Returns {'name', 'rating', 'address'} or None.
+        """
+        key, location = self._origin(address, lat, lng)
+        key = f"{key}|{poi_type}|{rank_by}"
+        if self.cache:
+            cached = self.cache.get_typed(key)
+            if cached is not None:
+                return cached or None
+        return await self._shared(
+            ("typed", key), lambda: self._fetch_typed(key, poi_type, address, location, rank_by)
+        )
+
+    async def _fetch_typed(self, key, poi_type, address, location, rank_by):
+        if location is None:
+            # Nearby search needs coordinates; text search accepts the address
+            path, params = "textsearch/json", {"query": f"{poi_type} near {address}", "type": poi_type}
+        elif rank_by == "distance":
+            path, params = "nearbysearch/json", {"location": location, "rankby": "distance", "type": poi_type}
+        else:
+            path, params = "nearbysearch/json", {"location": location, "radius": self.radius, "type": poi_type}
+
+        payload = await self._get_json(path, params)
+        if payload is None:
+            # An error says nothing about this cell; only real results may be cached as "none found"
+            return None
+        candidates = [r for r in payload.get('results', []) if poi_type in r.get('types', [poi_type])]
+        if rank_by == "rating" or location is None:
+            candidates.sort(key=lambda r: (
+                -(r.get('rating') or 0), -(r.get('user_ratings_total') or 0), r.get('place_id', '')
+            ))
+        poi = {}
+        if candidates:
+            best = candidates[0]
+            poi = {
+                'name': best.get('name', 'N/A'),
+                'rating': best.get('rating', 'N/A'),
+                'address': best.get('vicinity') or best.get('formatted_address', 'N/A'),
+            }
+        # An empty dict records "nothing of this type nearby" so it is not asked again
+        if self.cache:
+            self.cache.put_typed(key, poi)
+        return poi or None
+
+async def enrich_properties_async(properties, client: PlacesClient, poi_types=DEFAULT_POI_TYPES,
+                                  mode="typed", rank_by="distance"):
+    """
+    Adds {poi_type}_name/_rating/_address columns to a copy of `properties`,
+    looking up every property concurrently through `client`.
+
+    mode="typed" makes one typed search per POI type (<= 6 calls per property);
+    mode="details" is the original untyped search plus a details call per result.
+    """
+    if mode not in ("typed", "details"):
+        raise ValueError(f"Unknown enrichment mode '{mode}'")
+
+    async def enrich_row(row):
+        matched = {}
+        address = row.get('address', '')
+        if not address or pd.isna(address):
+            return matched
+        print(f"Processing: {address} (ID: {row.get('property_id', 'unknown')})")
+        lat, lng = row.get('latitude'), row.get('longitude')
+
+        if mode == "typed":
+            pois = await asyncio.gather(
+                *(client.get_typed_poi(poi_type, address, lat, lng, rank_by) for poi_type in poi_types)
+            )
+            for poi_type, poi in zip(poi_types, pois):
+                if poi:
+                    matched[f'{poi_type}_name'] = poi['name']
+                    matched[f'{poi_type}_rating'] = poi['rating']
+                    matched[f'{poi_type}_address'] = poi['address']
+            return matched
+
+        pois = await client.get_poi_for_address(address, lat, lng)
+        for poi in pois:
+            for poi_type in poi_types:
+                if poi_type in poi['types']:
+                    matched[f'{poi_type}_name'] = poi['name']
+                    matched[f'{poi_type}_rating'] = poi['rating']
+                    matched[f'{poi_type}_address'] = poi['address']
+        return matched
+
+    matches = await asyncio.gather(*(enrich_row(row) for _, row in properties.iterrows()))
+
+    # Typed columns: missing POIs are nulls and ratings are numbers ("N/A" -> NaN)
+    properties = properties.copy()
+    for poi_type in poi_types:
+        for field in ('name', 'rating', 'address'):
+            column = f'{poi_type}_{field}'
+            values = pd.Series([m.get(column) for m in matches], index=properties.index, dtype=object)
+            properties[column] = pd.to_numeric(values, errors='coerce') if field == 'rating' else values
+    return properties
+
+
+async def _enrich(properties, api_keys, poi_types, mode, rank_by, client_options):
+    async with PlacesClient(api_keys, **client_options) as client:
+        enriched = await enrich_properties_async(properties, client, poi_types, mode, rank_by)
+    print(f"Places requests: {client.stats}")
+    if client.cache:
+        print(f"POI cache: {client.cache.summary()}")
+    return enriched
+
+
+def enrich_properties_concurrently(properties, api_keys, poi_types=DEFAULT_POI_TYPES, mode="typed",
+                                   rank_by="distance", **client_options):
+    """
+    Blocking entry point for enrich_properties_async; client_options go to PlacesClient.
+    """
+    return asyncio.run(_enrich(properties, api_keys, poi_types, mode, rank_by, client_options))
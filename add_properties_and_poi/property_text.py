@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from smartlease_api.property_schema import FINGERPRINT_COLUMN
+
+DETAILS_COLUMN = "complete_property_details"
+
+# Identifiers, hashes, coordinates and photo URLs carry no meaning for the embedding
+NON_SEMANTIC_COLUMNS = [
+    "property_id", "latitude", "longitude", "primary_photo", "alt_photos", DETAILS_COLUMN, FINGERPRINT_COLUMN
+]
+
+NULL_VALUES = ["", "nan", "none", "null", "n/a", "na", "<na>"]
+SEPARATOR = "; "
+
+def _whole_number_text(value):
+    return str(int(value)) if isinstance(value, float) and value.is_integer() else value
+
+def column_text(values: pd.Series) -> pd.Series:
+    """
+    Column as stripped strings, "" for nulls; whole-number floats lose their
+    ".0" (2.0 -> "2"). Each value is formatted on its own, so a row's text
+    never depends on the other rows in its batch.
+    """
+    present = values.notna()
+    text = values.astype(object).where(present, "")
+    if pd.api.types.is_float_dtype(values):
+        # Below 2**53 every whole float is exactly an int64
+        whole = present & (values % 1 == 0) & (values.abs() < 2 ** 53)
+        text[whole] = values[whole].astype("int64").astype(str)
+    elif values.dtype == object:
+        text = text.map(_whole_number_text)
+    return text.astype(str).str.strip()
+
+def build_property_details(properties: pd.DataFrame, exclude=NON_SEMANTIC_COLUMNS) -> pd.Series:
+    """
+    Labelled "key: value; key: value" text per row. Each column is formatted
+    and filtered with column-wise string operations: null placeholders
+    ("nan", "N/A", "") and URLs are dropped, as are the `exclude` columns.
+    The per-row work is a single join of the surviving segments.
+    """
+    segments = []
+    for column in properties.columns:
+        if column in exclude or not properties[column].notna().any():
+            continue
+        text = column_text(properties[column])
+        keep = ~(text.str.lower().isin(NULL_VALUES) | text.str.startswith(("http://", "https://")))
+        if not keep.any():
+            continue
+        labelled = (column.replace("_", " ") + ": " + text).to_numpy(object)
+        segments.append(np.where(keep.to_numpy(bool), labelled, None))
+
+    if not segments:
+        return pd.Series("", index=properties.index, dtype=object)
+    return pd.Series(
+        [SEPARATOR.join(filter(None, parts)) for parts in zip(*segments)],
+        index=properties.index, dtype=object
+    )
@@ -1,22 +1,40 @@
 from homeharvest import scrape_property
 import os
-import pandas as pd
 
-def run_scraper(location="Boston, MA", listing_type="for_rent", past_days=20):
+from add_properties_and_poi.stage_io import write_stage
+
+def scrape_properties(location="Boston, MA", listing_type="for_rent", past_days=20):
+    """
+    Scrapes listings and returns them as a DataFrame with a combined 'address' column.
+    """
     print(f"▶ Scraping properties in {location} for '{listing_type}' (past {past_days} days)")
 
+    properties = scrape_property(
+        location=location,
+        listing_type=listing_type,
+        past_days=past_days
+    )
+
+    if properties.empty:
+        return properties
+
+    properties['address'] = (
+        properties['full_street_line'] + ', ' + 
+        properties['city'] + ', ' + 
+        properties['state'] + ' ' + 
+        properties['zip_code']
+    )
+    return properties
+
+def run_scraper(location="Boston, MA", listing_type="for_rent", past_days=20):
     output_dir = "/Users/shubhamagarwal/Documents/Northeastern/semester_4/GenAI_LLMs_DE/smartlease/add_properties_and_poi/output"
     os.makedirs(output_dir, exist_ok=True)
 
-    output_path = os.path.join(output_dir, "properties_raw.csv")
+    output_path = os.path.join(output_dir, "properties_raw.parquet")
     print(f"▶ Output path will be: {output_path}")
 
     try:
-        properties = scrape_property(
-            location=location,
-            listing_type=listing_type,
-            past_days=past_days
-        )
+        properties = scrape_properties(location, listing_type, past_days)
     except Exception as e:
         print(f"❌ Error during scraping: {e}")
         return 0, None
@@ -25,14 +43,7 @@ def run_scraper(location="Boston, MA", listing_type="for_rent", past_days=20):
         print("⚠️ No properties found. Exiting early.")
         return 0, None
 
-    properties['address'] = (
-        properties['full_street_line'] + ', ' + 
-        properties['city'] + ', ' + 
-        properties['state'] + ' ' + 
-        properties['zip_code']
-    )
-
-    properties.to_csv(output_path, index=False)
+    write_stage(properties, output_path)
     print(f"✅ Saved {len(properties)} properties to {output_path}")
     return len(properties), output_path
 
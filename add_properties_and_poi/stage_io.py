@@ -0,0 +1,260 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+PARQUET_COMPRESSION = "zstd"
+# Chunked readers decode one row group at a time; keep them small enough to stream
+PARQUET_ROW_GROUP_SIZE = 10000
+CHUNK_MANIFEST = "_chunks.json"
+
+def _parquet_safe(properties: pd.DataFrame) -> pd.DataFrame:
+    """
+    Parquet needs one type per column: object columns mixing e.g. strings and
+    floats are stored as strings (nulls kept).
+    """
+    mixed = [
+        col for col in properties.columns
+        if properties[col].dtype == object
+        and pd.api.types.infer_dtype(properties[col], skipna=True).startswith("mixed")
+    ]
+    if not mixed:
+        return properties
+    properties = properties.copy()
+    for col in mixed:
+        properties[col] = properties[col].where(properties[col].isna(), properties[col].astype(str))
+    return properties
+
+def write_stage(properties: pd.DataFrame, path):
+    """
+    Writes a stage output; .parquet (typed, zstd-compressed) or .csv by extension.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == ".parquet":
+        _parquet_safe(properties).to_parquet(
+            path, index=False, compression=PARQUET_COMPRESSION, row_group_size=PARQUET_ROW_GROUP_SIZE
+        )
+    else:
+        properties.to_csv(path, index=False)
+    return path
+
+def read_stage(path, columns=None) -> pd.DataFrame:
+    """
+    Reads a stage output. With Parquet only `columns` are read from disk;
+    a directory is a chunked output and is read whole.
+    """
+    path = Path(path)
+    if path.is_dir():
+        return ChunkedOutput(path).read(columns=columns)
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
+
+def write_checkpoint(output, path_without_suffix) -> Path:
+    """
+    DataFrames go to Parquet, anything else (e.g. upsert counts) to JSON.
+    """
+    base = Path(path_without_suffix)
+    if isinstance(output, pd.DataFrame):
+        return write_stage(output, base.with_suffix(".parquet"))
+    path = base.with_suffix(".json")
+    path.write_text(json.dumps(output, default=str))
+    return path
+
+def find_checkpoint(path_without_suffix):
+    base = Path(path_without_suffix)
+    if ChunkedOutput(base).manifest().get("finished"):
+        return base
+    for suffix in (".parquet", ".json"):
+        if base.with_suffix(suffix).exists():
+            return base.with_suffix(suffix)
+    return None
+
+def clear_checkpoint(path_without_suffix):
+    """
+    Remove a stage's checkpoint in any form (file or chunk directory).
+    """
+    base = Path(path_without_suffix)
+    if base.is_dir():
+        shutil.rmtree(base)
+    for suffix in (".parquet", ".json"):
+        base.with_suffix(suffix).unlink(missing_ok=True)
+
+def read_checkpoint(path, columns=None):
+    """
+    A chunked checkpoint is returned as its result(), unread.
+    """
+    path = Path(path)
+    if path.is_dir():
+        return ChunkedOutput(path).result()
+    if path.suffix == ".json":
+        return json.loads(path.read_text())
+    return read_stage(path, columns=columns)
+
+
+def combine_results(results) -> dict:
+    """
+    Sum per-chunk result dicts key by key, e.g. upsert counts.
+    """
+    combined = {}
+    for result in results:
+        for key, value in result.items():
+            combined[key] = combined.get(key, 0) + value
+    return combined
+
+class ChunkedOutput:
+    """
+    A stage output written one input chunk at a time: part-00000.parquet,
+    part-00001.parquet, ... in a directory, with a manifest recording the
+    chunk size and how many input chunks are done. Chunks that produce no
+    rows leave no part; chunk results that are not DataFrames (e.g. upsert
+    counts) are kept in the manifest.
+    """
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.directory / CHUNK_MANIFEST
+
+    def manifest(self) -> dict:
+        if not self.manifest_path.exists():
+            return {}
+        return json.loads(self.manifest_path.read_text())
+
+    def _save_manifest(self, manifest: dict):
+        # Replace atomically so a crash never leaves a half-written manifest
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(manifest, default=str))
+        os.replace(tmp, self.manifest_path)
+
+    def start(self, chunk_size: int, resume: bool = False) -> int:
+        """
+        Prepare for writing. Returns how many input chunks are already done:
+        when resuming with the same chunk size, the count from the last run;
+        otherwise 0, after clearing any earlier output.
+        """
+        manifest = self.manifest()
+        if resume and manifest.get("chunk_size") == chunk_size:
+            return manifest["completed"]
+        if self.directory.exists():
+            shutil.rmtree(self.directory)
+        self.directory.mkdir(parents=True)
+        self._save_manifest({"chunk_size": chunk_size, "completed": 0, "rows": 0, "finished": False, "results": {}})
+        return 0
+
+    def write_chunk(self, index: int, output):
+        """
+        Record the output of input chunk `index`; the part file is in place
+        before the manifest marks the chunk done.
+        """
+        manifest = self.manifest()
+        if isinstance(output, pd.DataFrame):
+            if len(output):
+                path = self.directory / f"part-{index:05d}.parquet"
+                tmp = path.with_suffix(".tmp")
+                _parquet_safe(output).to_parquet(
+                    tmp, index=False, compression=PARQUET_COMPRESSION, row_group_size=PARQUET_ROW_GROUP_SIZE
+                )
+                os.replace(tmp, path)
+                manifest["rows"] += len(output)
+        elif output is not None:
+            manifest["results"][str(index)] = output
+        manifest["completed"] = index + 1
+        self._save_manifest(manifest)
+
+    def finish(self):
+        manifest = self.manifest()
+        manifest["finished"] = True
+        self._save_manifest(manifest)
+
+    def parts(self) -> list:
+        return sorted(self.directory.glob("part-*.parquet"))
+
+    def __len__(self) -> int:
+        return self.manifest().get("rows", 0)
+
+    def result(self):
+        """
+        What the next stage receives: this output, or the per-chunk results
+        combined if the stage returned dicts.
+        """
+        results = self.manifest().get("results")
+        return combine_results(results.values()) if results else self
+
+    def read(self, columns=None) -> pd.DataFrame:
+        frames = [pd.read_parquet(part, columns=columns) for part in self.parts()]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+def as_frame(output, columns=None) -> pd.DataFrame:
+    """
+    A stage output as one DataFrame, reading chunked outputs and files.
+    """
+    if isinstance(output, pd.DataFrame):
+        return output[columns] if columns else output
+    if isinstance(output, ChunkedOutput):
+        return output.read(columns=columns)
+    return read_stage(output, columns=columns)
+
+def iter_chunks(source, chunk_size: int, columns=None, skip: int = 0):
+    """
+    Yields (index, offset, chunk) with chunks of at most chunk_size rows and
+    offset the position of the chunk's first row in the source. The source
+    is a DataFrame, a .parquet/.csv file (read incrementally) or a
+    ChunkedOutput / chunk directory, whose parts are yielded one by one.
+    Chunks before `skip` are not yielded (nor read, where avoidable).
+    """
+    if isinstance(source, (str, Path)) and Path(source).is_dir():
+        source = ChunkedOutput(source)
+
+    if isinstance(source, ChunkedOutput):
+        offset = 0
+        for part in source.parts():
+            index = int(part.stem.split("-")[1])
+            rows = pq.ParquetFile(part).metadata.num_rows
+            if index >= skip:
+                yield index, offset, pd.read_parquet(part, columns=columns)
+            offset += rows
+        return
+
+    if isinstance(source, pd.DataFrame):
+        frame = source[columns] if columns else source
+        for index, start in enumerate(range(0, len(frame), chunk_size)):
+            if index >= skip:
+                yield index, start, frame.iloc[start:start + chunk_size]
+        return
+
+    path = Path(source)
+    if path.suffix == ".parquet":
+        batches = (
+            batch.to_pandas()
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns)
+        )
+    else:
+        batches = pd.read_csv(path, usecols=columns, chunksize=chunk_size)
+    offset = 0
+    for index, chunk in enumerate(batches):
+        if index >= skip:
+            yield index, offset, chunk
+        offset += len(chunk)
+
+def run_in_chunks(func, source, directory, chunk_size: int, columns=None, resume: bool = False) -> ChunkedOutput:
+    """
+    Apply func(chunk, offset) to the source chunk by chunk, writing each
+    result to a ChunkedOutput in `directory` as soon as it is computed.
+    With resume, chunks completed by an earlier run are skipped. Only one
+    chunk is held in memory at a time.
+    """
+    output = ChunkedOutput(directory)
+    done = output.start(chunk_size, resume)
+    if done:
+        print(f"▶ Resuming after {done} completed chunks")
+    for index, offset, chunk in iter_chunks(source, chunk_size, columns=columns, skip=done):
+        output.write_chunk(index, func(chunk, offset) if len(chunk) else None)
+        print(f"Chunk {index}: {len(chunk)} rows (from row {offset})")
+    output.finish()
+    return output
@@ -1,66 +1,129 @@
+import argparse
+from pathlib import Path
+
 import pandas as pd
 import toml
-import snowflake.connector
+from snowflake.connector.pandas_tools import write_pandas
+
+from add_properties_and_poi.stage_io import read_stage, run_in_chunks
+from smartlease_api.property_schema import (
+    FINGERPRINT_COLUMN, NON_NUMERIC_PATTERN, NUMERIC_COLUMN_TYPES, PROPERTIES_TABLE, column_type
+)
+from smartlease_api.snowflake_pool import get_pool
 
 # Load config
 config = toml.load("config.toml")
 sf_creds = config['snowflake']
-input_csv = config['paths_step_4']['input_csv']
-
-# Snowflake credentials
-SNOWFLAKE_ACCOUNT = sf_creds["account"]
-SNOWFLAKE_USER = sf_creds["user"]
-SNOWFLAKE_PASSWORD = sf_creds["password"]
-SNOWFLAKE_ROLE = sf_creds["role"]
-SNOWFLAKE_DATABASE = sf_creds["database"]
-SNOWFLAKE_SCHEMA = sf_creds["schema"]
-SNOWFLAKE_WAREHOUSE = sf_creds["warehouse"]
-SNOWFLAKE_TABLE = "PROPERTIES_DATA_WITH_EMBEDDINGS"
-
-def upsert_to_snowflake(properties):
-    try:
-        # Connect to Snowflake
-        conn = snowflake.connector.connect(
-            user=SNOWFLAKE_USER,
-            password=SNOWFLAKE_PASSWORD,
-            account=SNOWFLAKE_ACCOUNT,
-            warehouse=SNOWFLAKE_WAREHOUSE,
-            database=SNOWFLAKE_DATABASE,
-            schema=SNOWFLAKE_SCHEMA,
-            role=SNOWFLAKE_ROLE
+snowflake_pool = get_pool(sf_creds, **config.get("snowflake_pool", {}))
+
+SNOWFLAKE_TABLE = PROPERTIES_TABLE
+STAGING_TABLE = "PROPERTIES_UPSERT_STAGING"
+
+def coerce_numeric_columns(properties):
+    """
+    Numeric columns (see NUMERIC_COLUMN_TYPES) as floats; text such as
+    "$2,500" is parsed like the legacy TRY_TO_NUMBER(REGEXP_REPLACE(...)),
+    anything unparseable becomes null.
+    """
+    properties = properties.copy()
+    for col in NUMERIC_COLUMN_TYPES:
+        if col in properties.columns and not pd.api.types.is_numeric_dtype(properties[col]):
+            text = properties[col].astype(str).str.replace(NON_NUMERIC_PATTERN, "", regex=True)
+            properties[col] = pd.to_numeric(text, errors="coerce")
+    return properties
+
+def column_definitions(columns):
+    # Quoted identifiers preserve the exact lower-case names
+    return ', '.join(f'"{col}" {column_type(col)}' for col in columns)
+
+def _merge_sql(columns, update_existing):
+    quoted = [f'"{col}"' for col in columns]
+    sql = (
+        f'MERGE INTO "{SNOWFLAKE_TABLE}" t USING "{STAGING_TABLE}" s '
+        f'ON t."property_id" = s."property_id" '
+    )
+    if update_existing:
+        updates = ', '.join(f't.{col} = s.{col}' for col in quoted if col != '"property_id"')
+        # With fingerprints, only listings whose scraped fields changed are rewritten
+        condition = (
+            f' AND t."{FINGERPRINT_COLUMN}" IS DISTINCT FROM s."{FINGERPRINT_COLUMN}"'
+            if FINGERPRINT_COLUMN in columns else ''
         )
-        cursor = conn.cursor()
-
-        # Create the table with quoted identifiers to preserve exact names
-        column_defs = ', '.join([f'"{col}" STRING' for col in properties.columns])
-        create_stmt = f'CREATE TABLE IF NOT EXISTS "{SNOWFLAKE_TABLE}" ({column_defs})'
-        cursor.execute(create_stmt)
-
-        # Fetch existing property_ids (quoted column name)
-        cursor.execute(f'SELECT "property_id" FROM "{SNOWFLAKE_TABLE}"')
-        existing_ids = {row[0] for row in cursor.fetchall()}
-
-        new_rows = 0
-        for _, row in properties.iterrows():
-            property_id = str(row["property_id"])
-            if property_id in existing_ids:
-                print(f"Skipping property_id {property_id} (already exists)")
-                continue
-
-            # Insert using quoted column names
-            columns = ', '.join([f'"{col}"' for col in properties.columns])
-            placeholders = ', '.join(['%s'] * len(properties.columns))
-            insert_sql = f'INSERT INTO "{SNOWFLAKE_TABLE}" ({columns}) VALUES ({placeholders})'
-            cursor.execute(insert_sql, tuple(str(row[col]) for col in properties.columns))
-            new_rows += 1
-
-        print(f"Inserted {new_rows} new properties.")
-        cursor.close()
-        conn.close()
+        sql += f'WHEN MATCHED{condition} THEN UPDATE SET {updates} '
+    sql += (
+        f'WHEN NOT MATCHED THEN INSERT ({", ".join(quoted)}) '
+        f'VALUES ({", ".join(f"s.{col}" for col in quoted)})'
+    )
+    return sql
+
+def upsert_to_snowflake(properties, update_existing=False):
+    """
+    Bulk upsert on property_id: the batch is loaded into a temporary table with
+    write_pandas (compressed Parquet, PUT + COPY) and applied with one MERGE in
+    a single transaction. Existing rows are skipped unless update_existing;
+    when the batch carries listing fingerprints, only rows whose fingerprint
+    changed are updated. Returns {"inserted", "updated", "skipped"} counts.
+    """
+    # NUMBER columns as numbers, the rest as text; nulls stay NULL; one row per property_id
+    properties = coerce_numeric_columns(properties)
+    text_columns = [col for col in properties.columns if col not in NUMERIC_COLUMN_TYPES]
+    batch = properties.astype(object)
+    batch[text_columns] = properties[text_columns].astype(str).where(properties[text_columns].notna(), None)
+    batch = batch.drop_duplicates(subset="property_id", keep="last").reset_index(drop=True)
+    column_defs = column_definitions(batch.columns)
+
+    try:
+        with snowflake_pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f'CREATE TABLE IF NOT EXISTS "{SNOWFLAKE_TABLE}" ({column_defs})')
+                if FINGERPRINT_COLUMN in batch.columns:
+                    # Tables created before fingerprints existed
+                    cursor.execute(
+                        f'ALTER TABLE "{SNOWFLAKE_TABLE}" ADD COLUMN IF NOT EXISTS "{FINGERPRINT_COLUMN}" STRING'
+                    )
+                cursor.execute(f'CREATE OR REPLACE TEMPORARY TABLE "{STAGING_TABLE}" ({column_defs})')
+
+                write_pandas(conn, batch, STAGING_TABLE, quote_identifiers=True, compression="snappy")
+
+                cursor.execute("BEGIN")
+                try:
+                    cursor.execute(_merge_sql(batch.columns, update_existing))
+                    counts = dict(zip([d[0].lower() for d in cursor.description], cursor.fetchone()))
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
+
+                cursor.execute(f'DROP TABLE IF EXISTS "{STAGING_TABLE}"')
+            finally:
+                cursor.close()
 
     except Exception as e:
         print(f"Error while upserting to Snowflake: {e}")
+        raise
+
+    inserted = counts.get("number of rows inserted", 0)
+    updated = counts.get("number of rows updated", 0)
+    result = {"inserted": inserted, "updated": updated, "skipped": len(properties) - inserted - updated}
+    print(f"Inserted {inserted}, updated {updated}, skipped {result['skipped']} properties.")
+    return result
 
 if __name__ == "__main__":
-    properties = pd.read_csv(input_csv)
-    upsert_to_snowflake(properties)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunk_size", type=int, default=config.get("pipeline", {}).get("chunk_size"))
+    parser.add_argument("--resume", action="store_true", help="continue after the last loaded chunk")
+    args = parser.parse_args()
+
+    input_csv = config['paths_step_4']['input_csv']
+    if args.chunk_size:
+        # One MERGE per chunk; loaded chunks are recorded next to the input
+        progress_dir = Path(input_csv).with_name(Path(input_csv).stem + "_upserted")
+        output = run_in_chunks(
+            lambda chunk, offset: upsert_to_snowflake(chunk), input_csv, progress_dir, args.chunk_size,
+            resume=args.resume
+        )
+        print(f"Upserted in chunks: {output.result()}")
+    else:
+        properties = read_stage(input_csv)
+        upsert_to_snowflake(properties)
@@ -1,21 +1,12 @@
 import os
 import pandas as pd
-import toml
-import snowflake.connector
 
-# Load config
-config = toml.load("config.toml")
-sf_creds = config['snowflake']
-
-# Snowflake credentials
-SNOWFLAKE_ACCOUNT = sf_creds["account"]
-SNOWFLAKE_USER = sf_creds["user"]
-SNOWFLAKE_PASSWORD = sf_creds["password"]
-SNOWFLAKE_ROLE = sf_creds["role"]
-SNOWFLAKE_DATABASE = sf_creds["database"]
-SNOWFLAKE_SCHEMA = sf_creds["schema"]
-SNOWFLAKE_WAREHOUSE = sf_creds["warehouse"]
-SNOWFLAKE_TABLE = "PROPERTY_DATA"
+from add_properties_and_poi.embed_properties import embed_stale_properties
+from add_properties_and_poi.property_text import build_property_details
+from add_properties_and_poi.upsert_snowflake import (
+    SNOWFLAKE_TABLE, coerce_numeric_columns, column_definitions, snowflake_pool
+)
+from smartlease_api.property_schema import NUMERIC_COLUMN_TYPES
 
 # Path to store uploaded images
 IMAGE_UPLOAD_DIR = "/Users/shubhamagarwal/Documents/Northeastern/semester_4/GenAI_LLMs_DE/smartlease/add_properties_form/images"
@@ -35,7 +26,9 @@ def save_image(file, property_id, index):
 
 def upsert_single_property(data: dict, image1: bytes = None, image2: bytes = None):
     """
-    Upserts a single property into Snowflake.
+    Upserts a single property into the searchable Snowflake table and embeds
+    it, so it shows up in hybrid search right away. If only the embedding
+    fails the insert still succeeds, with "embedding": "pending".
     """
     try:
         property_id = data.get("property_id")
@@ -58,42 +51,51 @@ def upsert_single_property(data: dict, image1: bytes = None, image2: bytes = Non
                 data[col] = ""
 
         df = pd.DataFrame([data])
-        df["complete_property_details"] = df.apply(lambda row: ', '.join(row.astype(str)), axis=1)
+        df["complete_property_details"] = build_property_details(df)
+
+        # Numbers for the NUMBER columns (blank -> NULL), text for the rest
+        row = coerce_numeric_columns(df).iloc[0]
+        row_values = {
+            col: (None if pd.isna(row[col]) else float(row[col])) if col in NUMERIC_COLUMN_TYPES else str(row[col])
+            for col in all_columns
+        }
 
-        # Connect to Snowflake
-        conn = snowflake.connector.connect(
-            user=SNOWFLAKE_USER,
-            password=SNOWFLAKE_PASSWORD,
-            account=SNOWFLAKE_ACCOUNT,
-            warehouse=SNOWFLAKE_WAREHOUSE,
-            database=SNOWFLAKE_DATABASE,
-            schema=SNOWFLAKE_SCHEMA,
-            role=SNOWFLAKE_ROLE
-        )
-        cursor = conn.cursor()
+        with snowflake_pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                # Create table if not exists
+                cursor.execute(f'CREATE TABLE IF NOT EXISTS "{SNOWFLAKE_TABLE}" ({column_definitions(all_columns)})')
 
-        # Create table if not exists
-        column_defs = ', '.join([f'"{col}" STRING' for col in all_columns])
-        cursor.execute(f'CREATE TABLE IF NOT EXISTS "{SNOWFLAKE_TABLE}" ({column_defs})')
+                # Check if property_id exists
+                cursor.execute(f'SELECT "property_id" FROM "{SNOWFLAKE_TABLE}" WHERE "property_id" = %s', (property_id,))
+                if cursor.fetchone():
+                    return {"status": "duplicate", "message": f"Property ID '{property_id}' already exists."}
 
-        # Check if property_id exists
-        cursor.execute(f'SELECT "property_id" FROM "{SNOWFLAKE_TABLE}" WHERE "property_id" = %s', (property_id,))
-        if cursor.fetchone():
-            return {"status": "duplicate", "message": f"Property ID '{property_id}' already exists."}
+                # Insert data
+                columns = ', '.join([f'"{col}"' for col in all_columns])
+                placeholders = ', '.join(['%s'] * len(all_columns))
+                cursor.execute(
+                    f'INSERT INTO "{SNOWFLAKE_TABLE}" ({columns}) VALUES ({placeholders})',
+                    tuple(row_values[col] for col in all_columns)
+                )
 
-        # Insert data
-        columns = ', '.join([f'"{col}"' for col in all_columns])
-        placeholders = ', '.join(['%s'] * len(all_columns))
-        cursor.execute(
-            f'INSERT INTO "{SNOWFLAKE_TABLE}" ({columns}) VALUES ({placeholders})',
-            tuple(str(df[col].iloc[0]) for col in all_columns)
-        )
+                conn.commit()
+            finally:
+                cursor.close()
 
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # The row is committed; an embedding failure must not read as a failed
+        # insert (users would resubmit). A row left without an embedding is
+        # picked up by the next embed_stale_properties run.
+        try:
+            embed_stale_properties(property_ids=[property_id])
+        except Exception as e:
+            print(f"⚠️ Embedding property {property_id} failed, left pending: {e}")
+            return {
+                "status": "success", "embedding": "pending",
+                "message": "Property added successfully; it will appear in search once its embedding is computed.",
+            }
 
-        return {"status": "success", "message": "Property added successfully."}
+        return {"status": "success", "embedding": "done", "message": "Property added successfully."}
 
     except Exception as e:
         return {"status": "error", "message": str(e)}
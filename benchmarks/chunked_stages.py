@@ -0,0 +1,67 @@
+"""
+Peak memory of the cleaning stage run over a whole scrape vs chunk by chunk.
+
+    python -m benchmarks.chunked_stages --rows 200000 --chunk_size 20000
+
+A synthetic scrape (see benchmarks.stage_io) is written to Parquet once;
+each mode then runs in a fresh subprocess so its peak RSS is its own.
+"""
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from add_properties_and_poi.data_cleaning import clean_properties, columns_to_keep
+from add_properties_and_poi.stage_io import read_stage, run_in_chunks, write_stage
+
+
+def peak_rss_mb() -> float:
+    # VmHWM starts afresh at exec; ru_maxrss would carry over the parent's peak
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode: str, input_path: Path, output_dir: Path, chunk_size: int):
+    start = time.perf_counter()
+    if mode == "whole":
+        write_stage(clean_properties(read_stage(input_path, columns=columns_to_keep)), output_dir / "clean.parquet")
+    else:
+        run_in_chunks(
+            lambda chunk, offset: clean_properties(chunk), input_path, output_dir / "clean", chunk_size,
+            columns=columns_to_keep
+        )
+    print(f"{mode:<8} seconds={time.perf_counter() - start:6.2f}  peak_rss={peak_rss_mb():8.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--chunk_size", type=int, default=20000)
+    parser.add_argument("--mode", choices=["whole", "chunked"], help=argparse.SUPPRESS)
+    parser.add_argument("--input", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--output", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.input, args.output, args.chunk_size)
+        sys.exit()
+
+    from benchmarks.stage_io import synthetic_scrape
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = Path(tmp) / "scrape.parquet"
+        write_stage(synthetic_scrape(args.rows), input_path)
+        print(f"{args.rows} rows, chunk_size={args.chunk_size}, input {input_path.stat().st_size / 1e6:.1f} MB")
+        for mode in ("whole", "chunked"):
+            subprocess.run(
+                [sys.executable, "-m", "benchmarks.chunked_stages", "--mode", mode, "--input", str(input_path),
+                 "--output", tmp, "--chunk_size", str(args.chunk_size)],
+                check=True
+            )
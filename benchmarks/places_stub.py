@@ -0,0 +1,119 @@
+"""
+Local stand-in for the Google Places nearbysearch/textsearch/details endpoints, so
+enrichment can be exercised without API keys or quota.
+
+    python -m benchmarks.places_stub --port 8765 --latency 0.05
+
+then point [google_places] base_url at http://127.0.0.1:8765.
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+POI_TYPES = ['restaurant', 'cafe', 'hospital', 'pharmacy', 'atm', 'bank']
+
+
+class PlacesStubHandler(BaseHTTPRequestHandler):
+    latency = 0.05
+    error_rate = 0.0
+    results_per_search = 20
+    denied_keys = ()
+    garbled_requests = 0
+    request_counter = itertools.count()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def _place(index):
+        return {
+            "name": f"Place {index}",
+            "formatted_address": f"{index} Stub St, Boston, MA",
+            "rating": round(3 + (index % 20) / 10, 1),
+            "user_ratings_total": index * 7,
+            "types": [POI_TYPES[index % len(POI_TYPES)], "point_of_interest"],
+        }
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if random.random() < self.error_rate:
+            self._send(429, {"status": "OVER_QUERY_LIMIT"})
+            return
+        if next(self.request_counter) < self.garbled_requests:
+            # An HTML error page from a proxy in front of the API
+            body = b"<html><body>502 Bad Gateway</body></html>"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if params.get("key") in self.denied_keys:
+            # Google answers a bad key with HTTP 200 and an error status
+            self._send(200, {"status": "REQUEST_DENIED", "error_message": "The provided API key is invalid."})
+            return
+        if url.path.endswith("/nearbysearch/json") or url.path.endswith("/textsearch/json"):
+            seed = params.get("location") or params.get("query", "")
+            poi_type = params.get("type")
+            results = []
+            for i in range(self.results_per_search):
+                place = self._place(i)
+                if poi_type:
+                    place["types"][0] = poi_type
+                place.update({"place_id": f"{seed}|{poi_type or ''}|{i}", "vicinity": place["formatted_address"]})
+                results.append(place)
+            self._send(200, {"status": "OK", "results": results})
+        elif url.path.endswith("/details/json"):
+            place_id = params.get("place_id", "")
+            index = int(place_id.rsplit("|", 1)[-1] or 0)
+            self._send(200, {"status": "OK", "result": {**self._place(index), "vicinity": "Boston"}})
+        else:
+            self._send(404, {"status": "NOT_FOUND"})
+
+
+def start_stub(port=0, latency=0.05, error_rate=0.0, results_per_search=20, denied_keys=(), garbled_requests=0):
+    """
+    Starts the stub on a background thread; returns (server, base_url).
+    Requests made with one of `denied_keys` get REQUEST_DENIED, and the first
+    `garbled_requests` requests get an HTML body instead of JSON.
+    """
+    handler = type("Handler", (PlacesStubHandler,), {
+        "latency": latency, "error_rate": error_rate, "results_per_search": results_per_search,
+        "denied_keys": tuple(denied_keys), "garbled_requests": garbled_requests,
+        "request_counter": itertools.count(),
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per response")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="fraction of 429 responses")
+    args = parser.parse_args()
+
+    server, base_url = start_stub(args.port, args.latency, args.error_rate)
+    print(f"Places stub listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,65 @@
+"""
+Concurrent load against a running /hybrid-search/ endpoint.
+
+Start one uvicorn worker, then run at increasing concurrency:
+
+    uvicorn smartlease_api.controller_api:app --workers 1
+    python -m benchmarks.search_load --concurrency 1 4 16 --requests 32
+
+Run it against the commit before and after a change to compare throughput.
+Disable [search_cache] while measuring, otherwise repeated queries are
+served from cache.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+DEFAULT_QUERIES = [
+    "2 bed 1 bath apartment under 3000",
+    "studio near Fenway with a cafe nearby",
+    "family home with good schools in Roslindale",
+    "condo in the North End close to restaurants",
+    "cheap apartment near a hospital and pharmacy",
+    "3 bedroom in Jamaica Plain with parking",
+    "sunny 1 bed in Back Bay",
+    "pet friendly place in South Boston",
+]
+
+
+def one_request(base_url: str, query: str, timeout: float):
+    start = time.perf_counter()
+    try:
+        ok = requests.post(f"{base_url}/hybrid-search/", json={"query": query}, timeout=timeout).status_code == 200
+    except requests.RequestException:
+        ok = False
+    return ok, time.perf_counter() - start
+
+
+def run_level(base_url: str, queries: list, concurrency: int, total: int, timeout: float):
+    jobs = [queries[i % len(queries)] for i in range(total)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda q: one_request(base_url, q, timeout), jobs))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([lat for _, lat in results]) * 1000
+    failures = sum(1 for ok, _ in results if not ok)
+    print(f"concurrency={concurrency:<3} requests={total:<4} failures={failures:<3} "
+          f"throughput={total / elapsed:6.2f} req/s  "
+          f"p50={np.percentile(latencies, 50):8.1f} ms  p95={np.percentile(latencies, 95):8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base_url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="requests per concurrency level")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--queries", nargs="*", default=DEFAULT_QUERIES)
+    args = parser.parse_args()
+
+    for level in args.concurrency:
+        run_level(args.base_url, args.queries, level, args.requests, args.timeout)
@@ -0,0 +1,62 @@
+"""
+CSV vs Parquet for pipeline stage outputs on a large synthetic scrape.
+
+    python -m benchmarks.stage_io --rows 200000
+
+Rows are resampled from add_properties_and_poi/output/properties_raw.csv
+with numeric columns jittered so compression does not see exact copies.
+Reports write time, file size, full read time and the time to read only
+the columns the cleaning stage keeps.
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from add_properties_and_poi.data_cleaning import columns_to_keep
+from add_properties_and_poi.stage_io import read_stage, write_stage
+
+SAMPLE_CSV = Path(__file__).resolve().parent.parent / "add_properties_and_poi" / "output" / "properties_raw.csv"
+
+
+def synthetic_scrape(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    sample = pd.read_csv(SAMPLE_CSV)
+    scrape = sample.sample(rows, replace=True, random_state=seed).reset_index(drop=True)
+    scrape["property_id"] = np.arange(rows)
+    for col in scrape.select_dtypes("number").columns:
+        if col != "property_id":
+            scrape[col] = scrape[col] * rng.uniform(0.9, 1.1, rows)
+    # The cleaning stage expects the POI columns the enrichment adds
+    for col in columns_to_keep:
+        if col not in scrape.columns:
+            scrape[col] = rng.uniform(3, 5, rows) if col.endswith("_rating") else "Place " + pd.Series(rng.integers(0, 500, rows)).astype(str)
+    return scrape
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+
+    scrape = synthetic_scrape(args.rows)
+    print(f"{args.rows} rows x {scrape.shape[1]} columns")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for suffix in (".csv", ".parquet"):
+            path = Path(tmp) / f"stage{suffix}"
+            _, write_s = timed(lambda: write_stage(scrape, path))
+            _, read_s = timed(lambda: read_stage(path))
+            _, pruned_s = timed(lambda: read_stage(path, columns=columns_to_keep))
+            size_mb = path.stat().st_size / 1e6
+            print(f"{suffix[1:]:<8} write={write_s:6.2f}s  size={size_mb:8.1f} MB  "
+                  f"read_all={read_s:6.2f}s  read_clean_columns={pruned_s:6.2f}s")
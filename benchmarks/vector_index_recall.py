@@ -0,0 +1,119 @@
+"""
+Recall@k and latency of the local IVF index against an exact scan.
+
+    # Against the warehouse: exact VECTOR_COSINE_SIMILARITY scan vs the local index
+    python -m benchmarks.vector_index_recall --queries "2 bed near Fenway" "quiet studio with parking"
+
+    # Offline, on synthetic clustered vectors (exact NumPy scan as ground truth)
+    python -m benchmarks.vector_index_recall --synthetic 50000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from smartlease_api.vector_index import IVFIndex
+
+DEFAULT_QUERIES = [
+    "2 bed 1 bath apartment under 3000",
+    "studio near Fenway with a cafe nearby",
+    "family home with good schools in Roslindale",
+    "condo in the North End close to restaurants",
+    "cheap apartment near a hospital and pharmacy",
+]
+
+
+def percentile_ms(samples: list, pct: float) -> float:
+    return float(np.percentile(np.array(samples) * 1000, pct)) if samples else 0.0
+
+
+def report(name: str, recalls: list, local_times: list, exact_times: list, k: int):
+    print(f"\n{name}")
+    print(f"  queries:          {len(recalls)}")
+    print(f"  recall@{k}:        {np.mean(recalls):.4f}")
+    print(f"  local p50 / p95:  {percentile_ms(local_times, 50):.2f} ms / {percentile_ms(local_times, 95):.2f} ms")
+    print(f"  exact p50 / p95:  {percentile_ms(exact_times, 50):.2f} ms / {percentile_ms(exact_times, 95):.2f} ms")
+
+
+def run_synthetic(n: int, dim: int, k: int, num_queries: int, nprobe: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(8, n // 500), dim)).astype(np.float32)
+    data = centers[rng.integers(len(centers), size=n)] + 0.5 * rng.normal(size=(n, dim)).astype(np.float32)
+    queries = data[rng.integers(n, size=num_queries)] + 0.1 * rng.normal(size=(num_queries, dim)).astype(np.float32)
+
+    index = IVFIndex(dim=dim, nprobe=nprobe, min_train_size=1)
+    start = time.perf_counter()
+    index.add(data)
+    print(f"Built IVF index over {n} x {dim} vectors in {time.perf_counter() - start:.2f}s "
+          f"({len(index.centroids)} lists, nprobe={nprobe})")
+
+    recalls, local_times, exact_times = [], [], []
+    for query in queries:
+        start = time.perf_counter()
+        exact, _ = index.search(query, k, exact=True)
+        exact_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        approx, _ = index.search(query, k)
+        local_times.append(time.perf_counter() - start)
+
+        recalls.append(len(set(exact) & set(approx)) / k)
+
+    report("Synthetic: IVF vs exact NumPy scan", recalls, local_times, exact_times, k)
+
+
+def run_warehouse(queries: list, k: int):
+    from smartlease_api.hybrid_search import embed_query, local_index, snowflake_pool, sync_local_index
+    from smartlease_api.vector_index import EMBEDDING_COLUMN
+
+    start = time.perf_counter()
+    sync_local_index()
+    print(f"Loaded {len(local_index)} properties into the local index in {time.perf_counter() - start:.2f}s")
+
+    recalls, local_times, exact_times = [], [], []
+    for query in queries:
+        vector = embed_query(query)
+
+        with snowflake_pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                start = time.perf_counter()
+                cursor.execute(f"""
+                    SELECT "property_id"
+                    FROM {local_index.table}
+                    WHERE {EMBEDDING_COLUMN} IS NOT NULL
+                    ORDER BY VECTOR_COSINE_SIMILARITY(
+                        {EMBEDDING_COLUMN}, PARSE_JSON(%s)::ARRAY::VECTOR(FLOAT, {local_index.index.dim})
+                    ) DESC
+                    LIMIT {k}
+                """, (json.dumps(vector),))
+                exact_ids = {row[0] for row in cursor.fetchall()}
+                exact_times.append(time.perf_counter() - start)
+            finally:
+                cursor.close()
+
+        start = time.perf_counter()
+        positions, _ = local_index.index.search(vector, k, mask=local_index.alive)
+        local_times.append(time.perf_counter() - start)
+        local_ids = {local_index.rows[pos]["property_id"] for pos in positions}
+
+        recalls.append(len(exact_ids & local_ids) / max(len(exact_ids), 1))
+
+    report("Warehouse: local index vs Snowflake exact scan", recalls, local_times, exact_times, k)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--queries", nargs="*", default=DEFAULT_QUERIES)
+    parser.add_argument("--synthetic", type=int, default=None, help="number of synthetic vectors")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--num_queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        run_synthetic(args.synthetic, args.dim, args.k, args.num_queries, args.nprobe)
+    else:
+        run_warehouse(args.queries, args.k)
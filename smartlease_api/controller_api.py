@@ -1,19 +1,66 @@
-from fastapi import FastAPI, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+import time
+import json
 
 # Import all pipeline logic
-from add_properties_and_poi.controller import run_pipeline
+from add_properties_and_poi.controller import pipeline_params, STAGE_NAMES
+from add_properties_and_poi.job_queue import JobQueue, JobStore, JOBS_DB_PATH, TERMINAL_STATUSES
 from add_properties_form.form_upsert import upsert_single_property
-from smartlease_api.metadata_extractor import extract_metadata
-from smartlease_api.hybrid_search import run_hybrid_search
-from smartlease_api.property_ranker import rerank_with_llm
-from smartlease_api.json_logger import save_step_data, clear_temp_logs
+from smartlease_api.metadata_extractor import extract_metadata_async, extraction_stats
+from smartlease_api.hybrid_search import (
+    run_hybrid_search_async, run_in_search_executor, embed_query, fetch_properties_by_id, search_pool,
+    search_sql_stats, refresh_local_index, DISPLAY_FIELDS, SEARCH_BACKEND
+)
+from smartlease_api.property_ranker import rerank_async, stream_rerank, token_stats, RERANK_FIELDS
+from smartlease_api.json_logger import save_step_data_async, clear_temp_logs
+from smartlease_api.snowflake_pool import pool_stats
+from smartlease_api.search_cache import search_cache
+from smartlease_api.property_cache import property_cache
 
 # ✅ Create ONE FastAPI app
 app = FastAPI()
 
+@app.on_event("startup")
+def warm_connections():
+    # Open the search pool's minimum connections before the first request
+    try:
+        search_pool.warm()
+    except Exception as e:
+        print(f"Could not pre-warm Snowflake pool: {e}")
+    # Never blocks startup: while the index is empty, searches use the warehouse path
+    if SEARCH_BACKEND == "local" and not refresh_local_index():
+        print("⚠️ Local vector index is empty; serving searches from the warehouse until it loads")
+
+@app.on_event("startup")
+def recover_pipeline_jobs():
+    print(f"Pipeline jobs: {pipeline_jobs.recover()}")
+
+@app.on_event("shutdown")
+def stop_pipeline_jobs():
+    pipeline_jobs.shutdown()
+
+def refresh_search_index():
+    # New properties make cached responses stale; the local vector index picks them up
+    search_cache.invalidate()
+    property_cache.invalidate()
+    if SEARCH_BACKEND == "local":
+        refresh_local_index()
+
+# --- Metrics ---
+@app.get("/metrics")
+def metrics():
+    return {
+        "snowflake_pools": pool_stats(),
+        "search_cache": search_cache.stats(),
+        "property_cache": property_cache.stats(),
+        "search_sql": search_sql_stats(),
+        "metadata_extraction": extraction_stats(),
+        "rerank_tokens": token_stats.as_dict(),
+    }
+
 # --- Pipeline 1: Run full property pipeline ---
 class PipelineRequest(BaseModel):
     location: str
@@ -21,17 +68,81 @@ class PipelineRequest(BaseModel):
     past_days: int
     start_row: int
     end_row: int
+    resume_from: Optional[str] = None  # one of scrape, changes, poi, clean, upsert, embed
+
+def pipeline_job_finished(job_id: str, status: str):
+    print(f"Pipeline job {job_id} finished: {status}")
+    if status == "succeeded":
+        refresh_search_index()
+
+# Runs are executed by worker processes; job state lives in a local SQLite file
+pipeline_jobs = JobQueue(JobStore(JOBS_DB_PATH), on_finished=pipeline_job_finished)
 
-@app.post("/run-property-pipeline")
+@app.post("/run-property-pipeline", status_code=202)
 def run_full_pipeline(request: PipelineRequest):
-    result = run_pipeline(
+    """
+    Queue a pipeline run and return its job_id at once; poll
+    /pipeline-jobs/{job_id} for progress. Resubmitting parameters whose run
+    is still active returns that run's job.
+    """
+    if request.resume_from is not None and request.resume_from not in STAGE_NAMES:
+        raise HTTPException(status_code=422, detail=f"resume_from must be one of {STAGE_NAMES}")
+    params = pipeline_params(
         location=request.location,
         listing_type=request.listing_type,
         past_days=request.past_days,
         start_row=request.start_row,
-        end_row=request.end_row
+        end_row=request.end_row,
     )
-    return {"message": result}
+    job_id = pipeline_jobs.submit(params, resume_from=request.resume_from)
+    # An identical run already queued or running is returned rather than started twice
+    return {"job_id": job_id, "status": pipeline_jobs.store.get(job_id)["status"]}
+
+class BulkIngestRequest(BaseModel):
+    locations: List[str]  # cities or zip codes, one shard each
+    listing_type: str
+    past_days: int
+    max_workers: Optional[int] = None
+
+@app.post("/run-bulk-ingest", status_code=202)
+def run_bulk_ingest(request: BulkIngestRequest):
+    """
+    Queue a multi-location ingest: shards run on a process pool and are
+    loaded with one bulk upsert. Poll /pipeline-jobs/{job_id}.
+    """
+    if not request.locations:
+        raise HTTPException(status_code=422, detail="locations must not be empty")
+    job_id = pipeline_jobs.submit({
+        "locations": request.locations,
+        "listing_type": request.listing_type,
+        "past_days": request.past_days,
+        "max_workers": request.max_workers,
+    })
+    return {"job_id": job_id, "status": pipeline_jobs.store.get(job_id)["status"]}
+
+@app.get("/pipeline-jobs")
+def list_pipeline_jobs(limit: int = 20):
+    return {"jobs": pipeline_jobs.store.list(limit)}
+
+@app.get("/pipeline-jobs/{job_id}")
+def get_pipeline_job(job_id: str):
+    """
+    Job status, message or error, and the run report: per-stage status,
+    seconds and row counts.
+    """
+    job = pipeline_jobs.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+@app.post("/pipeline-jobs/{job_id}/cancel")
+def cancel_pipeline_job(job_id: str):
+    job = pipeline_jobs.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    if job["status"] in TERMINAL_STATUSES:
+        return JSONResponse(content=job, status_code=409)
+    return pipeline_jobs.store.cancel(job_id)
 
 
 # --- Pipeline 2: Add property via form ---
@@ -88,7 +199,12 @@ async def add_property_form(
         image1_bytes = await primary_photo.read() if primary_photo else None
         image2_bytes = await alt_photo.read() if alt_photo else None
 
-        result = upsert_single_property(property_data, image1=image1_bytes, image2=image2_bytes)
+        # Embedding and the warehouse writes block; keep them off the event loop
+        result = await run_in_search_executor(
+            upsert_single_property, property_data, image1=image1_bytes, image2=image2_bytes
+        )
+        if result["status"] == "success":
+            await run_in_search_executor(refresh_search_index)
         return JSONResponse(content=result, status_code=200 if result["status"] == "success" else 409)
 
     except Exception as e:
@@ -98,29 +214,152 @@ async def add_property_form(
 
 
 # --- Pipeline 3: Hybrid Search ---
+# Only fetch the columns the reranker and the results page use
+SEARCH_COLUMNS = list(dict.fromkeys(RERANK_FIELDS + DISPLAY_FIELDS))
+
 class SearchRequest(BaseModel):
     query: str
+
+async def lookup_search_cache(user_query: str):
+    # Read before anything is computed, so a refresh during the search keeps its result out of the cache
+    generation = search_cache.generation
+    cached, layer, query_embedding = await run_in_search_executor(
+        search_cache.lookup, user_query, embed=embed_query
+    )
+    if cached is not None:
+        print(f"Search cache {layer} hit for: {user_query}")
+    return cached, query_embedding, generation
+
+async def retrieve_candidates(user_query: str) -> list:
+    metadata = await extract_metadata_async(user_query)
+    await save_step_data_async("metadata.json", {"user_query": user_query, "metadata": metadata})
+
+    results = await run_hybrid_search_async(user_query, metadata, columns=SEARCH_COLUMNS)
+    await save_step_data_async("search_results.json", results)
+    return results
+
+def display_row(prop: dict) -> dict:
+    return {field: prop.get(field) for field in DISPLAY_FIELDS}
+
+async def attach_result_fields(ranked_properties: list, candidates: list = (), generation: int = None) -> list:
+    """
+    Add each ranked property's DISPLAY_FIELDS under "property" (None if it
+    no longer exists) so the results page needs no further lookups, and its
+    1-based "retrieval_rank" among the search candidates (None if it was not
+    one). The candidates already carry the fields; any other id is fetched,
+    in one batch, through the property cache. The candidates are cached
+    only if the property cache is still at the `generation` read before
+    they were fetched.
+    """
+    ranks = {str(c["property_id"]): rank for rank, c in enumerate(candidates, 1) if c.get("property_id") is not None}
+    details = {str(c["property_id"]): display_row(c) for c in candidates if c.get("property_id") is not None}
+    property_cache.put_many(list(details.values()), generation)
+    ids = [str(r["property_id"]) for r in ranked_properties if r.get("property_id") is not None]
+    missing = [pid for pid in ids if pid not in details]
+    if missing:
+        details.update(await run_in_search_executor(property_cache.get_many, missing, fetch_properties_by_id))
+    for ranked in ranked_properties:
+        ranked["property"] = details.get(str(ranked.get("property_id")))
+        ranked["retrieval_rank"] = ranks.get(str(ranked.get("property_id")))
+    return ranked_properties
+
+def cacheable(final_results: dict) -> bool:
+    # Don't cache failed reranks or ones where a property fell back to its search score
+    return "error" not in final_results and not any(
+        r.get("score_source") == "retrieval" for r in final_results.get("ranked_properties", [])
+    )
+
 @app.post("/hybrid-search/")
 async def hybrid_search(request: SearchRequest):
+    # Every remote call is awaited (OpenAI) or runs on the search executor
+    # (Snowflake, file writes), so one slow search never stalls the worker
     user_query = request.query
+    start = time.perf_counter()
 
-    metadata = extract_metadata(user_query)
-    save_step_data("metadata.json", {"user_query": user_query, "metadata": metadata})
-
-    results = run_hybrid_search(user_query, metadata)
+    cached, query_embedding, generation = await lookup_search_cache(user_query)
+    if cached is not None:
+        return cached
 
-    # ✅ Case-insensitive embedding key removal
-    clean_results = [
-        {k: v for k, v in row.items() if k.lower() != "complete_property_details_embedding"}
-        for row in results
-    ]
+    property_generation = property_cache.generation
+    results = await retrieve_candidates(user_query)
 
-    save_step_data("search_results.json", clean_results)
+    final_results = await rerank_async(user_query, results)
+    await attach_result_fields(final_results.get("ranked_properties", []), results, property_generation)
+    await save_step_data_async("final_results.json", final_results)
 
-    final_results = rerank_with_llm(user_query, clean_results)
-    save_step_data("final_results.json", final_results)
+    if cacheable(final_results):
+        search_cache.put(user_query, final_results, time.perf_counter() - start, query_embedding, generation)
 
     # clear_temp_logs()
 
     return final_results
 
+def ndjson(event: str, **payload) -> str:
+    return json.dumps({"event": event, **payload}, default=str) + "\n"
+
+@app.post("/hybrid-search/stream")
+async def hybrid_search_stream(request: SearchRequest):
+    """
+    NDJSON stream: a "candidates" event with the score-ordered search results
+    as soon as the database answers, one "ranked_property" event per property
+    as the LLM finishes it (completion order, not rank), then "done" with the
+    full ranked_properties in rank order. Ranked properties carry their
+    display fields under "property" and their search position in
+    "retrieval_rank".
+    """
+    user_query = request.query
+
+    async def events():
+        start = time.perf_counter()
+        cached, query_embedding, generation = await lookup_search_cache(user_query)
+        if cached is not None:
+            for idx, ranked_property in enumerate(cached.get("ranked_properties", [])):
+                yield ndjson("ranked_property", index=idx, property=ranked_property)
+            yield ndjson("done", **cached)
+            return
+
+        try:
+            property_generation = property_cache.generation
+            results = await retrieve_candidates(user_query)
+            yield ndjson("candidates", properties=results)
+
+            idx = 0
+            async for kind, payload in stream_rerank(user_query, results):
+                if kind == "property":
+                    await attach_result_fields([payload], results, property_generation)
+                    yield ndjson("ranked_property", index=idx, property=payload)
+                    idx += 1
+                    continue
+                final_results = payload
+        except Exception as e:
+            yield ndjson("error", message=str(e))
+            return
+
+        await attach_result_fields(final_results.get("ranked_properties", []), results, property_generation)
+        await save_step_data_async("final_results.json", final_results)
+        if cacheable(final_results):
+            search_cache.put(user_query, final_results, time.perf_counter() - start, query_embedding, generation)
+        yield ndjson("done", **final_results)
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+# --- Property details ---
+MAX_PROPERTY_IDS = 100
+
+@app.get("/properties")
+async def get_properties(ids: str):
+    """
+    Display fields for a comma-separated list of property ids, in the order
+    given. Served from the in-process property cache; ids not cached are
+    fetched with a single query.
+    """
+    property_ids = list(dict.fromkeys(pid.strip() for pid in ids.split(",") if pid.strip()))
+    if not property_ids:
+        raise HTTPException(status_code=422, detail="ids must not be empty")
+    if len(property_ids) > MAX_PROPERTY_IDS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_PROPERTY_IDS} ids per request")
+    details = await run_in_search_executor(property_cache.get_many, property_ids, fetch_properties_by_id)
+    return {
+        "properties": [details[pid] for pid in property_ids if pid in details],
+        "missing": [pid for pid in property_ids if pid not in details],
+    }
@@ -1,20 +1,59 @@
-import snowflake.connector
 import toml
 from pathlib import Path
 import re
+import json
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+
+from decimal import Decimal
+
+from smartlease_api.property_schema import NUMERIC_COLUMN_TYPES, plain_value
+from smartlease_api.result_cache_monitor import ResultCacheMonitor
+from smartlease_api.snowflake_pool import get_pool
+from smartlease_api.vector_index import LocalVectorIndex
 
 # Load config
 config = toml.load(Path(__file__).parent / "config.toml")
 sf_creds = config["snowflake"]
+search_config = config.get("search", {})
+
+# Shared, long-lived connections (sized by the optional [snowflake_pool] section)
+snowflake_pool = get_pool(sf_creds, **config.get("snowflake_pool", {}))
+
+# Search statements bind their values server-side ("?" placeholders), so the
+# statement text depends only on the filter shape and repeated searches can
+# be answered from the warehouse result cache
+search_pool = get_pool(sf_creds, paramstyle="qmark", **config.get("snowflake_pool", {}))
+result_cache_monitor = ResultCacheMonitor(log_every=search_config.get("result_cache_log_every", 50))
+
+EMBEDDING_MODEL = "snowflake-arctic-embed-l-v2.0"
+EMBEDDING_CALL = f"SNOWFLAKE.CORTEX.EMBED_TEXT_1024('{EMBEDDING_MODEL}', ?)"  # binds the query text
+CANDIDATES_PER_SEARCH = 20   # rows taken from each of the keyword and semantic searches
+TOP_K = 6                    # rows returned after merging
+KEYWORD_BOOST = 0.1          # added to the similarity of keyword matches
+
+# Fields the results page shows for each property
+DISPLAY_FIELDS = [
+    "property_id", "address", "status", "style", "beds", "full_baths", "sqft", "year_built",
+    "list_price", "primary_photo", "alt_photos"
+]
 
-# Extract creds
-SNOWFLAKE_ACCOUNT = sf_creds["account"]
-SNOWFLAKE_USER = sf_creds["user"]
-SNOWFLAKE_PASSWORD = sf_creds["password"]
-SNOWFLAKE_ROLE = sf_creds["role"]
-SNOWFLAKE_DATABASE = sf_creds["database"]
-SNOWFLAKE_SCHEMA = sf_creds["schema"]
-SNOWFLAKE_WAREHOUSE = sf_creds["warehouse"]
+# "fused" runs one statement that embeds the query once; "split" is the
+# original two-query search merged in Python
+SEARCH_MODE = search_config.get("mode", "fused")
+
+# "snowflake" ranks in the warehouse; "local" uses the in-process vector index
+SEARCH_BACKEND = search_config.get("backend", "snowflake")
+local_index = LocalVectorIndex(**config.get("vector_index", {}))
+
+# Blocking warehouse calls from async handlers run here; sized like the pool so
+# queued searches wait for a thread rather than for a connection
+search_executor = ThreadPoolExecutor(
+    max_workers=search_config.get("executor_workers", search_pool.max_size),
+    thread_name_prefix="snowflake-search"
+)
 
 def clean_numeric(value):
     try:
@@ -22,71 +61,151 @@ def clean_numeric(value):
     except (IndexError, ValueError):
         return None
 
-def run_hybrid_search(user_query: str, metadata: dict) -> list:
-    conn = snowflake.connector.connect(
-        user=SNOWFLAKE_USER,
-        password=SNOWFLAKE_PASSWORD,
-        account=SNOWFLAKE_ACCOUNT,
-        warehouse=SNOWFLAKE_WAREHOUSE,
-        database=SNOWFLAKE_DATABASE,
-        schema=SNOWFLAKE_SCHEMA,
-        role=SNOWFLAKE_ROLE
-    )
-    cursor = conn.cursor()
-
-    user_query_safe = user_query.replace("'", "''")
-    embedding_call = f"SNOWFLAKE.CORTEX.EMBED_TEXT_1024('snowflake-arctic-embed-l-v2.0', '{user_query_safe}')"
+# Metadata keys become column identifiers, so only plain names are accepted
+COLUMN_NAME = re.compile(r"^[a-z_][a-z0-9_]*$")
 
-    # ---- Semantic Search ----
-    semantic_sql = f"""
-    SELECT *, 
-        VECTOR_COSINE_SIMILARITY(complete_property_details_embedding, {embedding_call}) AS similarity,
-        0 AS keyword_score
-    FROM properties_data_with_embeddings
-    ORDER BY similarity DESC
-    LIMIT 20;
+def parse_filters(metadata: dict) -> list:
     """
-    cursor.execute(semantic_sql)
-    sem_rows = cursor.fetchall()
-    sem_cols = [col[0] for col in cursor.description]
-    semantic_results = [dict(zip(sem_cols, row)) for row in sem_rows]
-
-    # ---- Keyword Filtered Search ----
-    filter_clauses = []
+    Turn extracted metadata into (column, op, value) filters where op is one
+    of "<", ">", "=" (numeric) or "ilike" (substring match). Filters are
+    sorted by column and op so equivalent metadata gives the same statement.
+    """
+    filters = []
     for key, value in metadata.items():
         if not value:
             continue
 
-        column = f'"{key.lower()}"'
+        column = key.lower()
+        if not COLUMN_NAME.match(column):
+            print(f"⚠️ Ignoring filter on invalid column name: {key!r}")
+            continue
         num_val = clean_numeric(value)
 
         if isinstance(value, str) and value.strip().startswith(("<", ">")) and num_val is not None:
-            filter_clauses.append(
-                f"TRY_TO_NUMBER(REGEXP_REPLACE({column}, '[^0-9.]', '')) {'<' if value.startswith('<') else '>'} {num_val}"
-            )
+            filters.append((column, value.strip()[0], num_val))
         elif num_val is not None:
-            filter_clauses.append(
-                f"TRY_TO_NUMBER(REGEXP_REPLACE({column}, '[^0-9.]', '')) = {num_val}"
-            )
+            filters.append((column, "=", num_val))
         else:
-            filter_clauses.append(f"{column} ILIKE '%{value}%'")
+            filters.append((column, "ilike", str(value)))
+    return sorted(filters, key=lambda f: (f[0], f[1]))
 
-    where_clause = " AND ".join(filter_clauses)
-    where_sql = f"WHERE {where_clause}" if where_clause else ""
+def filter_shape(filters: list) -> tuple:
+    """
+    The (column, op) pairs of the filters: everything a statement template
+    depends on. Values are bound separately.
+    """
+    return tuple((column, op) for column, op, _ in filters)
 
-    keyword_sql = f"""
-    SELECT *, 
-        VECTOR_COSINE_SIMILARITY(complete_property_details_embedding, {embedding_call}) AS similarity,
-        1 AS keyword_score
-    FROM properties_data_with_embeddings
-    {where_sql}
-    ORDER BY similarity DESC
-    LIMIT 20;
+def filter_params(filters: list) -> list:
+    """
+    Bind values for the placeholders of build_filter_clauses, in order.
+    """
+    params = []
+    for _, op, value in filters:
+        if op == "ilike":
+            params.append(f"%{value}%")
+        else:
+            # Bound as FIXED rather than REAL so NUMBER columns compare exactly
+            params.append(int(value) if float(value).is_integer() else Decimal(str(value)))
+    return params
+
+def build_filter_clauses(shape: tuple) -> list:
+    """
+    SQL predicates with "?" placeholders for a filter shape.
+    """
+    filter_clauses = []
+    for column, op in shape:
+        quoted = f'"{column}"'
+        if op == "ilike":
+            filter_clauses.append(f"{quoted} ILIKE ?")
+        elif column in NUMERIC_COLUMN_TYPES:
+            # Typed NUMBER column: a plain predicate the clustering key can prune on
+            filter_clauses.append(f"{quoted} {op} ?")
+        else:
+            filter_clauses.append(f"TRY_TO_NUMBER(REGEXP_REPLACE({quoted}, '[^0-9.]', '')) {op} ?")
+    return filter_clauses
+
+def build_projection(columns: list = None, alias: str = None) -> str:
+    """
+    SELECT list for the property columns. property_id is always included and
+    the embedding vector is never returned.
+    """
+    prefix = f"{alias}." if alias else ""
+    if not columns:
+        return f"{prefix}* EXCLUDE (complete_property_details_embedding)"
+    columns = list(dict.fromkeys(["property_id"] + list(columns)))
+    return ", ".join(prefix + '"' + col.replace('"', '""') + '"' for col in columns)
+
+@lru_cache(maxsize=1024)
+def _embed_query_cached(user_query: str) -> tuple:
+    with search_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT {EMBEDDING_CALL}::ARRAY", (user_query,))
+            value = cursor.fetchone()[0]
+        finally:
+            cursor.close()
+    return tuple(json.loads(value) if isinstance(value, str) else value)
+
+def embed_query(user_query: str) -> list:
+    """
+    Embed a query with the same Cortex model used for the stored properties.
+    """
+    return list(_embed_query_cached(user_query))
+
+def sync_local_index() -> dict:
+    """
+    Incrementally load new property_ids into the local vector index.
+    """
+    stats = local_index.sync(snowflake_pool)
+    print(f"Local vector index synced: {stats}")
+    return stats
+
+def refresh_local_index() -> bool:
+    """
+    sync_local_index that logs instead of raising; a failed sync is retried
+    after refresh_interval. Returns whether the index has rows to serve.
+    """
+    try:
+        sync_local_index()
+    except Exception as e:
+        local_index.last_sync = time.monotonic()
+        print(f"⚠️ Local vector index sync failed: {e}")
+    return len(local_index) > 0
+
+def run_hybrid_search(user_query: str, metadata: dict, mode: str = None, columns: list = None,
+                      backend: str = None) -> list:
+    """
+    Return the top properties for the query. `columns` limits which property
+    columns are fetched; by default every column except the embedding. The
+    local backend falls back to the warehouse search while its index is empty.
     """
-    cursor.execute(keyword_sql)
-    kw_rows = cursor.fetchall()
-    kw_cols = [col[0] for col in cursor.description]
-    keyword_results = [dict(zip(kw_cols, row)) for row in kw_rows]
+    backend = backend or SEARCH_BACKEND
+    if backend == "local":
+        if local_index.is_stale():
+            refresh_local_index()
+        if len(local_index):
+            return local_index.hybrid_search(
+                embed_query(user_query), parse_filters(metadata), columns=columns,
+                candidates=CANDIDATES_PER_SEARCH, top_k=TOP_K, keyword_boost=KEYWORD_BOOST
+            )
+        # Nothing indexed (the vector table could not be loaded): rank in the warehouse
+        backend = "snowflake"
+    if backend != "snowflake":
+        raise ValueError(f"Unknown search backend: {backend}")
+
+    mode = mode or SEARCH_MODE
+    if mode not in ("fused", "split"):
+        raise ValueError(f"Unknown search mode: {mode}")
+
+    with search_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            if mode == "fused":
+                return _fused_search(cursor, user_query, metadata, columns)
+            semantic_results, keyword_results = _fetch_candidates(cursor, user_query, metadata, columns)
+        finally:
+            cursor.close()
 
     # ---- Merge, de-dupe, prioritize keyword matches ----
     seen = set()
@@ -101,12 +220,163 @@ def run_hybrid_search(user_query: str, metadata: dict) -> list:
     # Score boost if it came from keyword set (safe access)
     for row in combined:
         similarity = row.get("similarity", 0.0)
-        keyword_score = 0.1 if row.get("keyword_score") else 0.0
+        keyword_score = KEYWORD_BOOST if row.get("keyword_score") else 0.0
         row['final_score'] = similarity + keyword_score
 
     # Sort and take top 6
-    top_results = sorted(combined, key=lambda x: x.get('final_score', 0), reverse=True)[:6]
-
-    cursor.close()
-    conn.close()
+    top_results = sorted(combined, key=lambda x: x.get('final_score', 0), reverse=True)[:TOP_K]
     return top_results
+
+def _rows_as_dicts(cursor) -> list:
+    rows = cursor.fetchall()
+    cols = [col[0] for col in cursor.description]
+    return [{col: plain_value(value) for col, value in zip(cols, row)} for row in rows]
+
+def _execute_search(cursor, sql: str, params: list) -> list:
+    cursor.execute(sql, params)
+    if result_cache_monitor.record(cursor.sfqid):
+        search_executor.submit(result_cache_monitor.resolve, search_pool)
+    return _rows_as_dicts(cursor)
+
+@lru_cache(maxsize=256)
+def _fused_template(shape: tuple, columns: tuple = None) -> str:
+    """
+    Keyword and semantic search in one statement.
+
+    The query is embedded once in a CTE; each row gets its similarity and a
+    keyword-match flag, the top candidates of both searches are unioned and
+    de-duplicated on property_id, and final_score is computed server-side.
+    A row from the semantic top-N that matches the filters is always in the
+    keyword top-N too, so flagging by filter match reproduces the Python merge.
+    Binds the query text followed by filter_params.
+    """
+    where_clause = " AND ".join(build_filter_clauses(shape)) or "TRUE"
+
+    return f"""
+    WITH query_embedding AS (
+        SELECT {EMBEDDING_CALL} AS embedding
+    ),
+    scored AS (
+        SELECT {build_projection(columns, "p")},
+            VECTOR_COSINE_SIMILARITY(p.complete_property_details_embedding, q.embedding) AS "similarity",
+            IFF({where_clause}, 1, 0) AS "keyword_score"
+        FROM properties_data_with_embeddings p, query_embedding q
+    ),
+    keyword_ids AS (
+        SELECT "property_id" FROM scored
+        WHERE "keyword_score" = 1
+        ORDER BY "similarity" DESC
+        LIMIT {CANDIDATES_PER_SEARCH}
+    ),
+    semantic_ids AS (
+        SELECT "property_id" FROM scored
+        ORDER BY "similarity" DESC
+        LIMIT {CANDIDATES_PER_SEARCH}
+    ),
+    candidate_ids AS (
+        SELECT "property_id" FROM keyword_ids
+        UNION
+        SELECT "property_id" FROM semantic_ids
+    )
+    SELECT s.*,
+        s."similarity" + {KEYWORD_BOOST} * s."keyword_score" AS "final_score"
+    FROM scored s
+    JOIN candidate_ids c ON s."property_id" = c."property_id"
+    WHERE s."property_id" <> ''
+    QUALIFY ROW_NUMBER() OVER (
+        PARTITION BY s."property_id" ORDER BY s."keyword_score" DESC, s."similarity" DESC
+    ) = 1
+    ORDER BY "final_score" DESC, s."keyword_score" DESC, s."similarity" DESC
+    LIMIT {TOP_K};
+    """
+
+@lru_cache(maxsize=256)
+def _split_templates(shape: tuple, columns: tuple = None) -> tuple:
+    """
+    (semantic_sql, keyword_sql) for the two-query search. Both bind the
+    query text; keyword_sql then binds filter_params.
+    """
+    projection = build_projection(columns)
+
+    semantic_sql = f"""
+    SELECT {projection},
+        VECTOR_COSINE_SIMILARITY(complete_property_details_embedding, {EMBEDDING_CALL}) AS "similarity",
+        0 AS "keyword_score"
+    FROM properties_data_with_embeddings
+    ORDER BY "similarity" DESC
+    LIMIT {CANDIDATES_PER_SEARCH};
+    """
+
+    where_clause = " AND ".join(build_filter_clauses(shape))
+    where_sql = f"WHERE {where_clause}" if where_clause else ""
+
+    keyword_sql = f"""
+    SELECT {projection},
+        VECTOR_COSINE_SIMILARITY(complete_property_details_embedding, {EMBEDDING_CALL}) AS "similarity",
+        1 AS "keyword_score"
+    FROM properties_data_with_embeddings
+    {where_sql}
+    ORDER BY "similarity" DESC
+    LIMIT {CANDIDATES_PER_SEARCH};
+    """
+    return semantic_sql, keyword_sql
+
+def _template_columns(columns: list = None):
+    return tuple(columns) if columns else None
+
+def _fused_search(cursor, user_query: str, metadata: dict, columns: list = None) -> list:
+    filters = parse_filters(metadata)
+    sql = _fused_template(filter_shape(filters), _template_columns(columns))
+    return _execute_search(cursor, sql, [user_query] + filter_params(filters))
+
+def _fetch_candidates(cursor, user_query: str, metadata: dict, columns: list = None):
+    filters = parse_filters(metadata)
+    semantic_sql, keyword_sql = _split_templates(filter_shape(filters), _template_columns(columns))
+
+    # ---- Semantic Search ----
+    semantic_results = _execute_search(cursor, semantic_sql, [user_query])
+
+    # ---- Keyword Filtered Search ----
+    keyword_results = _execute_search(cursor, keyword_sql, [user_query] + filter_params(filters))
+
+    return semantic_results, keyword_results
+
+def fetch_properties_by_id(property_ids: list, columns: list = None) -> list:
+    """
+    Rows for the given ids in one statement (DISPLAY_FIELDS by default). The
+    ids are bound as a single JSON array, so the text is the same whatever
+    their number.
+    """
+    if not property_ids:
+        return []
+    sql = f"""
+        SELECT {build_projection(columns or DISPLAY_FIELDS)}
+        FROM properties_data_with_embeddings
+        WHERE "property_id" IN (SELECT value::STRING FROM TABLE(FLATTEN(input => PARSE_JSON(?))))
+    """
+    with search_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, [json.dumps([str(pid) for pid in property_ids])])
+            return _rows_as_dicts(cursor)
+        finally:
+            cursor.close()
+
+def search_sql_stats() -> dict:
+    """
+    Result-cache hit rate of search statements (resolving any pending query
+    ids first) and the number of distinct statement templates built so far.
+    """
+    stats = result_cache_monitor.resolve(search_pool)
+    stats["templates"] = _fused_template.cache_info().currsize + 2 * _split_templates.cache_info().currsize
+    return stats
+
+async def run_in_search_executor(func, *args, **kwargs):
+    """
+    Run a blocking Snowflake call on the bounded search executor.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(search_executor, partial(func, *args, **kwargs))
+
+async def run_hybrid_search_async(user_query: str, metadata: dict, **kwargs) -> list:
+    return await run_in_search_executor(run_hybrid_search, user_query, metadata, **kwargs)
@@ -1,10 +1,15 @@
 import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Define the temp_logs directory relative to this file
 log_dir = Path(__file__).parent / "temp_logs"
 log_dir.mkdir(exist_ok=True)  # Create it if it doesn't exist
 
+# One writer thread keeps step files in request order without touching the event loop
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="json-logger")
+
 def save_step_data(filename: str, data: dict):
     """
     Save a dictionary as a JSON file in the temp_logs folder.
@@ -13,6 +18,13 @@ def save_step_data(filename: str, data: dict):
     with open(filepath, "w") as f:
         json.dump(data, f, indent=2)
 
+async def save_step_data_async(filename: str, data: dict):
+    """
+    save_step_data for async handlers: the file write happens on a worker thread.
+    """
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_writer, save_step_data, filename, data)
+
 def clear_temp_logs():
     """
     Delete all JSON files in the temp_logs folder.
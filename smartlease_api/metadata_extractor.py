@@ -2,30 +2,143 @@ import openai
 import toml
 from pathlib import Path
 import json
+import sqlite3
+import threading
+import asyncio
+from collections import Counter, OrderedDict
+
+from smartlease_api.query_parser import parse_query, KNOWN_NEIGHBORHOODS
+from smartlease_api.search_cache import normalize_query
 
 config = toml.load(Path(__file__).parent / "config.toml")
 openai.api_key = config["openai"]["api_key"]
+metadata_config = config.get("metadata", {})
 
 ALLOWED_FIELDS = [
     "address", "beds", "full_baths", "sqft", "list_price", "neighborhoods", "nearby_schools"
 ]
 
+# The rule-based parser's answer is used when its confidence reaches this value
+CONFIDENCE_THRESHOLD = metadata_config.get("confidence_threshold", 1.0)
+NEIGHBORHOODS = KNOWN_NEIGHBORHOODS + [n.lower() for n in metadata_config.get("known_neighborhoods", [])]
+
+# Memo of normalized query -> metadata: an in-memory LRU in front of SQLite
+MEMO_SIZE = metadata_config.get("memo_size", 1024)
+MEMO_PATH = Path(metadata_config.get("cache_path", Path(__file__).parent / "cache" / "metadata_cache.sqlite"))
+MEMO_PATH.parent.mkdir(parents=True, exist_ok=True)
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+_disk = sqlite3.connect(MEMO_PATH, check_same_thread=False)
+_disk.execute("CREATE TABLE IF NOT EXISTS metadata_cache (query TEXT PRIMARY KEY, metadata TEXT, source TEXT)")
+_disk.commit()
+
+# How each extraction was answered: memory, disk, rule_parser or llm
+extraction_paths = Counter()
+
+def _remember(key: str, metadata: dict, source: str = None):
+    with _memo_lock:
+        _memo[key] = metadata
+        _memo.move_to_end(key)
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+        if source:
+            _disk.execute(
+                "INSERT OR REPLACE INTO metadata_cache (query, metadata, source) VALUES (?, ?, ?)",
+                (key, json.dumps(metadata), source)
+            )
+            _disk.commit()
+
+def _recall(key: str):
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key], "memory"
+        row = _disk.execute("SELECT metadata FROM metadata_cache WHERE query = ?", (key,)).fetchone()
+    if row:
+        metadata = json.loads(row[0])
+        _remember(key, metadata)
+        return metadata, "disk"
+    return None, None
+
+def _lookup(query: str):
+    """
+    Memo and rule-parser stages. Returns (key, metadata); metadata is None
+    when the LLM has to be asked.
+    """
+    key = normalize_query(query)
+    metadata, source = _recall(key)
+    if metadata is not None:
+        extraction_paths[source] += 1
+        return key, dict(metadata)
+
+    metadata, confidence = parse_query(query, NEIGHBORHOODS)
+    if confidence < CONFIDENCE_THRESHOLD:
+        return key, None
+    extraction_paths["rule_parser"] += 1
+    _remember(key, metadata, "rule_parser")
+    return key, dict(metadata)
+
+def _store_llm_result(key: str, metadata: dict) -> dict:
+    extraction_paths["llm"] += 1
+    if "error" not in metadata:
+        _remember(key, metadata, "llm")
+    return dict(metadata)
+
 def extract_metadata(query: str) -> dict:
-    prompt = f"""
-    Extract the following fields from the real estate search query below. 
-    Only return the fields that are mentioned, in JSON format.
+    """
+    Memoized metadata extraction. Simple queries are answered by the
+    rule-based parser; the LLM is only called when its confidence is low.
+    """
+    key, metadata = _lookup(query)
+    if metadata is not None:
+        return metadata
+    return _store_llm_result(key, extract_metadata_with_llm(query))
 
-    Fields: {ALLOWED_FIELDS}
-    Query: "{query}"
+async def extract_metadata_async(query: str) -> dict:
     """
-    response = openai.ChatCompletion.create(
+    Same as extract_metadata, without blocking the event loop on the LLM call
+    or on the SQLite memo.
+    """
+    key, metadata = await asyncio.to_thread(_lookup, query)
+    if metadata is not None:
+        return metadata
+    response = await openai.ChatCompletion.acreate(
         model="gpt-4",
-        messages=[{"role": "user", "content": prompt}],
+        messages=[{"role": "user", "content": _extraction_prompt(query)}],
         temperature=0
     )
-    content = response['choices'][0]['message']['content']
+    metadata = _parse_extraction(response['choices'][0]['message']['content'])
+    return await asyncio.to_thread(_store_llm_result, key, metadata)
+
+def extraction_stats() -> dict:
+    total = sum(extraction_paths.values())
+    return {
+        "total": total,
+        "paths": dict(extraction_paths),
+        "llm_rate": round(extraction_paths["llm"] / total, 4) if total else 0.0,
+    }
+
+def _extraction_prompt(query: str) -> str:
+    return f"""
+    Extract the following fields from the real estate search query below.
+    Only return the fields that are mentioned, in JSON format.
+
+    Fields: {ALLOWED_FIELDS}
+    Query: "{query}"
+    """
+
+def _parse_extraction(content: str) -> dict:
     try:
         raw = json.loads(content)
         return {k: v for k, v in raw.items() if k in ALLOWED_FIELDS}
     except:
         return {"error": "Could not parse response", "raw_content": content}
+
+def extract_metadata_with_llm(query: str) -> dict:
+    response = openai.ChatCompletion.create(
+        model="gpt-4",
+        messages=[{"role": "user", "content": _extraction_prompt(query)}],
+        temperature=0
+    )
+    return _parse_extraction(response['choices'][0]['message']['content'])
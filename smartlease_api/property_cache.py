@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import toml
+
+config = toml.load(Path(__file__).parent / "config.toml")
+
+
+class PropertyCache:
+    """
+    In-process cache of per-property display fields, keyed on property_id.
+
+    Search responses prime it with the rows they already fetched, so detail
+    lookups for properties that were just shown never reach the warehouse.
+    Entries expire after `ttl_seconds` and the least recently used entry is
+    evicted beyond `max_entries`. Rows read before the last invalidate()
+    (an older `generation`) are not stored.
+    """
+    def __init__(self, enabled: bool = True, max_entries: int = 2048, ttl_seconds: float = 3600):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._entries = OrderedDict()  # str(property_id) -> (created, details)
+        self._lock = threading.Lock()
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def put_many(self, properties: list, generation: int = None):
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            for details in properties:
+                key = str(details["property_id"])
+                self._entries[key] = (now, details)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_many(self, property_ids: list, fetch) -> dict:
+        """
+        str(property_id) -> details for the ids that exist. Ids not cached
+        are loaded with one `fetch(missing_ids)` call, which returns a list
+        of rows that each carry a property_id.
+        """
+        keys = list(dict.fromkeys(str(pid) for pid in property_ids))
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            generation = self.generation
+            for key in keys:
+                entry = self._entries.get(key) if self.enabled else None
+                if entry is not None and now - entry[0] <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[1]
+                else:
+                    missing.append(key)
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            fetched = fetch(missing)
+            self.put_many(fetched, generation)
+            found.update((str(details["property_id"]), details) for details in fetched)
+        return found
+
+    def invalidate(self):
+        """
+        Drop every entry, e.g. after properties are upserted.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+# Shared cache for /properties and search results, configured by the optional [property_cache] section
+property_cache = PropertyCache(**config.get("property_cache", {}))
@@ -2,25 +2,41 @@ import openai
 import toml
 from pathlib import Path
 import json
+import asyncio
+
+from smartlease_api.stream_parser import IncrementalArrayParser
+from smartlease_api.token_budget import TokenStats, compact_property, compact_json, count_tokens
 
 # Load API key
 config = toml.load(Path(__file__).parent / "config.toml")
 openai.api_key = config["openai"]["api_key"]
 
-def rerank_with_llm(user_query: str, properties: list) -> dict:
-    # Limit to top 6 properties
-    top_properties = properties[:6]
+# Number of search results that are ranked
+RERANK_TOP_K = 6
+
+# "batch" ranks all candidates in one completion; "parallel" annotates each
+# property in its own request, at most `concurrency` at a time. The default
+# runs all of them at once, so latency is that of the slowest single property
+rerank_config = config.get("rerank", {})
+RERANK_MODE = rerank_config.get("mode", "batch")
+RERANK_CONCURRENCY = rerank_config.get("concurrency", RERANK_TOP_K)
+RERANK_TIMEOUT = rerank_config.get("timeout_seconds", 60)
+# Upper bound on tokens spent describing each property in a prompt
+PER_PROPERTY_TOKEN_BUDGET = rerank_config.get("per_property_token_budget", 200)
+
+token_stats = TokenStats()
 
-    # Keep only relevant fields to reduce token usage
-    allowed_keys = [
-        "property_id", "address", "beds", "full_baths", "sqft", "list_price",
-        "nearby_schools", "neighborhoods", "complete_property_details"
-    ]
+# Property fields sent to the LLM; search only fetches what is needed
+RERANK_FIELDS = [
+    "property_id", "address", "beds", "full_baths", "sqft", "list_price",
+    "nearby_schools", "neighborhoods", "complete_property_details"
+]
 
-    stripped_properties = [
-        {k: v for k, v in prop.items() if k in allowed_keys}
-        for prop in top_properties
-    ]
+def build_rerank_prompt(user_query: str, properties: list) -> str:
+    # Limit to the top RERANK_TOP_K properties
+    top_properties = properties[:RERANK_TOP_K]
+
+    properties_text = serialize_properties(top_properties)
 
     # Construct the prompt
     prompt = f"""
@@ -36,7 +52,7 @@ You are given up to 6 candidate properties. For each:
   - A 1-line suggestion
 
 Here are the properties:
-{json.dumps(stripped_properties, indent=2)}
+{properties_text}
 
 Return a JSON object in this format:
 {{
@@ -51,16 +67,24 @@ Return a JSON object in this format:
   ]
 }}
     """
+    return prompt
 
-    # Send to OpenAI
-    response = openai.ChatCompletion.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7
-    )
+def serialize_properties(properties: list) -> str:
+    """
+    Compact JSON of per-property summaries within the token budget; logs the
+    token count next to what the full indent=2 serialisation would cost.
+    """
+    summaries = [compact_property(prop, RERANK_FIELDS, PER_PROPERTY_TOKEN_BUDGET) for prop in properties]
+    text = compact_json(summaries) if len(summaries) != 1 else compact_json(summaries[0])
 
-    content = response["choices"][0]["message"]["content"]
+    baseline = [{k: v for k, v in prop.items() if k in RERANK_FIELDS} for prop in properties]
+    baseline_tokens = count_tokens(json.dumps(baseline if len(baseline) != 1 else baseline[0], indent=2, default=str))
+    prompt_tokens = count_tokens(text)
+    token_stats.record(prompt_tokens, baseline_tokens)
+    print(f"Rerank prompt: {len(properties)} properties, {prompt_tokens} tokens (uncompacted: {baseline_tokens})")
+    return text
 
+def parse_rerank_response(content: str) -> dict:
     # Try parsing the JSON response
     try:
         return json.loads(content)
@@ -70,3 +94,161 @@ Return a JSON object in this format:
             "raw_response": content,
             "exception": str(e)
         }
+
+def rerank_with_llm(user_query: str, properties: list) -> dict:
+    # Send to OpenAI
+    response = openai.ChatCompletion.create(
+        model="gpt-4",
+        messages=[{"role": "user", "content": build_rerank_prompt(user_query, properties)}],
+        temperature=0.7
+    )
+    return parse_rerank_response(response["choices"][0]["message"]["content"])
+
+async def rerank_with_llm_async(user_query: str, properties: list) -> dict:
+    """
+    Same as rerank_with_llm, without blocking the event loop.
+    """
+    response = await openai.ChatCompletion.acreate(
+        model="gpt-4",
+        messages=[{"role": "user", "content": build_rerank_prompt(user_query, properties)}],
+        temperature=0.7
+    )
+    return parse_rerank_response(response["choices"][0]["message"]["content"])
+
+async def stream_rerank_with_llm(user_query: str, properties: list):
+    """
+    Stream the rerank completion. Yields ("property", ranked_property) as each
+    entry of ranked_properties is completed by the model's tokens, then
+    ("complete", result) with the same dict rerank_with_llm would return.
+    """
+    response = await openai.ChatCompletion.acreate(
+        model="gpt-4",
+        messages=[{"role": "user", "content": build_rerank_prompt(user_query, properties)}],
+        temperature=0.7,
+        stream=True
+    )
+
+    parser = IncrementalArrayParser("ranked_properties")
+    ranked = []
+    content = ""
+    async for chunk in response:
+        delta = chunk["choices"][0]["delta"].get("content", "")
+        if not delta:
+            continue
+        content += delta
+        for ranked_property in parser.feed(delta):
+            ranked.append(ranked_property)
+            yield "property", ranked_property
+
+    result = parse_rerank_response(content)
+    if "error" in result and ranked:
+        # Keep what was streamed even if the document as a whole is malformed
+        result = {"ranked_properties": ranked}
+    yield "complete", result
+
+# ---- Parallel per-property reranking ----
+def build_property_prompt(user_query: str, prop: dict) -> str:
+    return f"""
+You are a real estate assistant helping a user choose a rental property based on their search query.
+
+Query: "{user_query}"
+
+Here is one candidate property:
+{serialize_properties([prop])}
+
+Score how well it matches the user's intent from 0 (not at all) to 10 (perfect) and provide:
+  - 2 pros
+  - 2 cons
+  - A 1-line suggestion
+
+Return a JSON object in this format:
+{{
+  "score": 0,
+  "pros": ["...", "..."],
+  "cons": ["...", "..."],
+  "suggestion": "..."
+}}
+    """
+
+def _retrieval_fallback(prop: dict, reason: str) -> dict:
+    # Keep the property when its LLM call fails; _sort_ranked puts it after every LLM-scored one
+    return {
+        "property_id": prop.get("property_id"),
+        "pros": [],
+        "cons": [],
+        "suggestion": "",
+        "score": float(prop.get("final_score") or 0.0),
+        "score_source": "retrieval",
+        "error": reason,
+    }
+
+async def annotate_property(user_query: str, prop: dict, semaphore: asyncio.Semaphore) -> dict:
+    """
+    Score and annotate one property; never raises.
+    """
+    try:
+        async with semaphore:
+            response = await asyncio.wait_for(
+                openai.ChatCompletion.acreate(
+                    model="gpt-4",
+                    messages=[{"role": "user", "content": build_property_prompt(user_query, prop)}],
+                    temperature=0.7
+                ),
+                timeout=RERANK_TIMEOUT
+            )
+        annotation = json.loads(response["choices"][0]["message"]["content"])
+        return {
+            "property_id": prop.get("property_id"),
+            "pros": list(annotation.get("pros", [])),
+            "cons": list(annotation.get("cons", [])),
+            "suggestion": str(annotation.get("suggestion", "")),
+            "score": float(annotation["score"]) / 10,
+            "score_source": "llm",
+        }
+    except Exception as e:
+        print(f"Reranking failed for property {prop.get('property_id')}: {e}")
+        return _retrieval_fallback(prop, str(e) or type(e).__name__)
+
+def _sort_ranked(ranked: list) -> dict:
+    # Search scores (cosine similarity plus keyword boost) are not on the LLM's
+    # 0-1 scale, so fallbacks are ordered among themselves, below the LLM scores
+    return {"ranked_properties": sorted(
+        ranked, key=lambda r: (r.get("score_source") != "retrieval", r["score"]), reverse=True
+    )}
+
+async def stream_rerank_parallel(user_query: str, properties: list, concurrency: int = None):
+    """
+    Yields ("property", annotation) in completion order, then ("complete",
+    result) with ranked_properties sorted by score, retrieval fallbacks last.
+    """
+    semaphore = asyncio.Semaphore(concurrency or RERANK_CONCURRENCY)
+    tasks = [annotate_property(user_query, prop, semaphore) for prop in properties[:RERANK_TOP_K]]
+    ranked = []
+    for next_done in asyncio.as_completed(tasks):
+        annotation = await next_done
+        ranked.append(annotation)
+        yield "property", annotation
+    yield "complete", _sort_ranked(ranked)
+
+async def rerank_parallel(user_query: str, properties: list, concurrency: int = None) -> dict:
+    """
+    Annotate each property in its own request under a concurrency limit and
+    merge into the ranked_properties shape. Latency is bounded by the slowest
+    single property; a failed property falls back to its retrieval score.
+    """
+    semaphore = asyncio.Semaphore(concurrency or RERANK_CONCURRENCY)
+    ranked = await asyncio.gather(
+        *[annotate_property(user_query, prop, semaphore) for prop in properties[:RERANK_TOP_K]]
+    )
+    return _sort_ranked(list(ranked))
+
+# ---- Mode dispatch for the API ----
+async def rerank_async(user_query: str, properties: list) -> dict:
+    if RERANK_MODE == "parallel":
+        return await rerank_parallel(user_query, properties)
+    return await rerank_with_llm_async(user_query, properties)
+
+def stream_rerank(user_query: str, properties: list):
+    if RERANK_MODE == "parallel":
+        return stream_rerank_parallel(user_query, properties)
+    return stream_rerank_with_llm(user_query, properties)
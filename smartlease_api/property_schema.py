@@ -0,0 +1,90 @@
+from decimal import Decimal
+
+PROPERTIES_TABLE = "PROPERTIES_DATA_WITH_EMBEDDINGS"
+
+# Hash of a listing's scraped fields; re-ingestion skips rows whose hash is unchanged
+FINGERPRINT_COLUMN = "listing_fingerprint"
+
+# SHA2 of the complete_property_details text the stored embedding was computed from
+DETAILS_HASH_COLUMN = "details_hash"
+
+# Columns stored as NUMBER so filters are plain range predicates; every other
+# property column is STRING
+NUMERIC_COLUMN_TYPES = {
+    "beds": "NUMBER(4, 1)",
+    "full_baths": "NUMBER(4, 1)",
+    "sqft": "NUMBER(12, 2)",
+    "list_price": "NUMBER(12, 2)",
+    "year_built": "NUMBER(4, 0)",
+    "latitude": "NUMBER(9, 6)",
+    "longitude": "NUMBER(9, 6)",
+}
+
+# Searches filter on beds (few distinct values) and price ranges; Snowflake
+# recommends lower-cardinality clustering columns first
+CLUSTER_BY = ["beds", "list_price"]
+
+# Characters removed before casting legacy STRING values ("$2,500" -> 2500)
+NON_NUMERIC_PATTERN = "[^0-9.-]"
+
+
+def column_type(column: str) -> str:
+    return NUMERIC_COLUMN_TYPES.get(column, "STRING")
+
+
+def plain_value(value):
+    """
+    NUMBER columns come back from the connector as Decimal; use int/float so
+    rows stay JSON-serialisable.
+    """
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def _precision_scale(sql_type: str):
+    inner = sql_type[sql_type.index("(") + 1:sql_type.index(")")]
+    precision, scale = (int(part) for part in inner.split(","))
+    return precision, scale
+
+
+def migrate_numeric_columns(cursor, table: str = PROPERTIES_TABLE, cluster: bool = True) -> list:
+    """
+    Converts legacy STRING numeric columns to NUMBER in place and sets the
+    clustering key. Each column is backfilled into a new typed column with
+    TRY_TO_NUMBER (unparseable values become NULL), then swapped in.
+    Safe to re-run: columns that are already numeric are skipped.
+    Returns the migrated column names.
+    """
+    cursor.execute(
+        "SELECT column_name, data_type FROM information_schema.columns "
+        "WHERE table_schema = CURRENT_SCHEMA() AND table_name = %s",
+        (table,)
+    )
+    data_types = {name: data_type for name, data_type in cursor.fetchall()}
+
+    migrated = []
+    for column, sql_type in NUMERIC_COLUMN_TYPES.items():
+        typed = f"{column}__typed"
+        if column not in data_types and typed in data_types:
+            # An earlier run stopped between DROP and RENAME
+            cursor.execute(f'ALTER TABLE "{table}" RENAME COLUMN "{typed}" TO "{column}"')
+            migrated.append(column)
+            continue
+        if data_types.get(column) != "TEXT":
+            continue
+        precision, scale = _precision_scale(sql_type)
+        print(f"▶ Migrating {column} to {sql_type}")
+        cursor.execute(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "{typed}" {sql_type}')
+        cursor.execute(
+            f'UPDATE "{table}" SET "{typed}" = '
+            f"TRY_TO_NUMBER(REGEXP_REPLACE(\"{column}\", '{NON_NUMERIC_PATTERN}', ''), {precision}, {scale})"
+        )
+        cursor.execute(f'ALTER TABLE "{table}" DROP COLUMN "{column}"')
+        cursor.execute(f'ALTER TABLE "{table}" RENAME COLUMN "{typed}" TO "{column}"')
+        migrated.append(column)
+
+    if cluster:
+        keys = ", ".join(f'"{column}"' for column in CLUSTER_BY)
+        cursor.execute(f'ALTER TABLE "{table}" CLUSTER BY ({keys})')
+    return migrated
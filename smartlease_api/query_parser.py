@@ -0,0 +1,133 @@
+import re
+
+# Boston neighborhoods recognised without an LLM call (lower-case); extend via
+# the [metadata] known_neighborhoods config list
+KNOWN_NEIGHBORHOODS = [
+    "allston", "back bay", "bay village", "beacon hill", "brighton", "charlestown", "chinatown",
+    "dorchester", "downtown", "east boston", "fenway", "financial district", "hyde park",
+    "jamaica plain", "kenmore", "leather district", "longwood", "mattapan", "mission hill",
+    "north end", "roslindale", "roxbury", "seaport", "south boston", "south end", "west end",
+    "west roxbury", "audubon circle", "chestnut hill", "brookline", "cambridge", "somerville",
+    "medical center area",
+]
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+NUMBER = r"(\d+(?:\.\d+)?|" + "|".join(NUMBER_WORDS) + r")"
+
+LESS = r"(?:under|below|less than|cheaper than|max(?:imum)?|at most|up to|no more than|budget(?: of)?|<)"
+MORE = r"(?:over|above|more than|greater than|min(?:imum)?|at least|bigger than|larger than|>)"
+MIN_PRICE = 100
+AMOUNT = r"\$?\s*(\d[\d,]*(?:\.\d+)?)\s*(k\b)?"
+
+BEDS_RE = re.compile(NUMBER + r"[\s-]*(?:bed(?:room)?s?|br|bd)\b")
+BATHS_RE = re.compile(NUMBER + r"[\s-]*(?:full[\s-]+)?(?:bath(?:room)?s?|ba)\b")
+SQFT_RE = re.compile(
+    r"(?:(" + LESS + r"|" + MORE + r")\s*)?(\d[\d,]*)\s*(?:sq\.?\s*f(?:ee)?t\.?|sqft|square\s+f(?:ee|oo)t|sf)\b"
+)
+PRICE_RE = re.compile(r"(" + LESS + r"|" + MORE + r")\s*" + AMOUNT + r"(?:\s*(?:/\s*mo(?:nth)?|per month|a month|dollars))?")
+
+# Words that point at a field the parser may have missed
+FIELD_HINTS = re.compile(
+    r"\b(?:bed(?:room)?s?|bath(?:room)?s?|sq\.?\s*ft|sqft|square|price|rent|budget|cost|"
+    r"school|schools|university|college|academy|street|st|ave|avenue|road|rd|blvd|boulevard|"
+    r"neighbou?rhood|area|studio)\b|\$"
+)
+LEFTOVER_NUMBER = re.compile(r"\d+|\b(?:" + "|".join(NUMBER_WORDS) + r")\b")
+# Words that introduce a place ("near MIT", "on Comm Ave") the rules cannot resolve
+LOCATION_HINTS = re.compile(r"\b(?:near|nearby|close to|next to|walking distance|around|on|at|in)\b")
+# Capitalised words after the first one: names of places, schools or streets
+PROPER_NOUN = re.compile(r"(?<!^)(?<![.!?]\s)\b(?!I\b)[A-Z][A-Za-z]*")
+
+
+def _number(token: str) -> float:
+    return float(NUMBER_WORDS[token]) if token in NUMBER_WORDS else float(token.replace(",", ""))
+
+
+def _comparator(word: str) -> str:
+    return "<" if re.fullmatch(LESS, word) else ">"
+
+
+def _format(value: float):
+    return int(value) if value == int(value) else value
+
+
+def parse_query(query: str, known_neighborhoods: list = None):
+    """
+    Rule-based extraction of beds, full_baths, sqft, list_price and
+    neighborhoods. Returns (metadata, confidence); confidence drops when the
+    query still mentions numbers, field words, place words ("near", "on")
+    or proper nouns the rules did not consume, and is 0 when nothing was
+    extracted, so only parses that account for the whole query skip the LLM.
+    """
+    text = query.lower()
+    metadata = {}
+    consumed = []
+
+    def take(match):
+        consumed.append(match.span())
+
+    def overlaps(match):
+        return any(match.start() < end and start < match.end() for start, end in consumed)
+
+    match = BEDS_RE.search(text)
+    if match:
+        metadata["beds"] = _format(_number(match.group(1)))
+        take(match)
+
+    match = BATHS_RE.search(text)
+    if match:
+        metadata["full_baths"] = _format(_number(match.group(1)))
+        take(match)
+
+    match = SQFT_RE.search(text)
+    if match:
+        sqft = _format(_number(match.group(2)))
+        metadata["sqft"] = f"{_comparator(match.group(1))}{sqft}" if match.group(1) else sqft
+        take(match)
+
+    for match in PRICE_RE.finditer(text):
+        amount = _number(match.group(2)) * (1000 if match.group(3) else 1)
+        # Small numbers after "under"/"at least" are counts or distances, not rents
+        if overlaps(match) or amount < MIN_PRICE:
+            continue
+        metadata["list_price"] = f"{_comparator(match.group(1))}{_format(amount)}"
+        take(match)
+        break
+
+    neighborhoods = []
+    for name in sorted(known_neighborhoods or KNOWN_NEIGHBORHOODS, key=len, reverse=True):
+        for match in re.finditer(r"\b" + re.escape(name) + r"\b", text):
+            if not overlaps(match):
+                neighborhoods.append((match.start(), name.title()))
+                take(match)
+    if neighborhoods:
+        metadata["neighborhoods"] = min(neighborhoods)[1]
+
+    # Blank out what was understood and look for signals of missed fields
+    remaining = list(text)
+    for start, end in consumed:
+        remaining[start:end] = " " * (end - start)
+    remaining = "".join(remaining)
+    if not metadata:
+        return metadata, 0.0
+
+    unresolved = len(FIELD_HINTS.findall(remaining)) + len(LEFTOVER_NUMBER.findall(remaining))
+    # "in Back Bay": the place word is resolved by the neighborhood right after it
+    neighborhood_starts = {start for start, _ in neighborhoods}
+    for match in LOCATION_HINTS.finditer(remaining):
+        following = text[match.end():]
+        if match.end() + len(following) - len(following.lstrip()) not in neighborhood_starts:
+            unresolved += 1
+    # Case is only known in the original query; blank the same spans there
+    original = list(query) if len(query) == len(text) else None
+    if original is not None:
+        for start, end in consumed:
+            original[start:end] = " " * (end - start)
+        unresolved += len(PROPER_NOUN.findall("".join(original)))
+    # Several neighborhoods ("Allston or Brighton") need the LLM to interpret
+    unresolved += max(0, len(neighborhoods) - 1)
+    confidence = max(0.0, 1.0 - 0.5 * unresolved)
+    return metadata, confidence
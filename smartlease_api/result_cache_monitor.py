@@ -0,0 +1,98 @@
+import threading
+from collections import deque
+
+
+class ResultCacheMonitor:
+    """
+    Tracks how often search statements are answered from Snowflake's result
+    cache.
+
+    Query ids are recorded as searches run and resolved in batches against
+    INFORMATION_SCHEMA.QUERY_HISTORY_BY_USER. A search statement always reads
+    the properties table, so one that scanned zero bytes was served from the
+    result cache. Ids not yet visible in the history are retried on the next
+    batch and given up after `max_attempts`.
+    """
+    def __init__(self, log_every: int = 50, max_pending: int = 1000, max_attempts: int = 3):
+        self.log_every = log_every
+        self.max_attempts = max_attempts
+
+        self._pending = deque(maxlen=max_pending)  # [query_id, attempts]
+        self._lock = threading.Lock()
+        self._resolving = False
+
+        self.hits = 0
+        self.misses = 0
+        self.unresolved = 0
+
+    def record(self, query_id) -> bool:
+        """
+        Remember a search statement's query id. Returns True once enough ids
+        are pending that a batch should be resolved.
+        """
+        if not query_id:
+            return False
+        with self._lock:
+            self._pending.append([query_id, 0])
+            return len(self._pending) >= self.log_every and not self._resolving
+
+    def resolve(self, pool) -> dict:
+        """
+        Look up the pending query ids in the query history, update the
+        counters and log the running hit rate.
+        """
+        with self._lock:
+            if self._resolving or not self._pending:
+                return self.stats()
+            self._resolving = True
+            batch = list(self._pending)
+            self._pending.clear()
+
+        try:
+            ids = [query_id for query_id, _ in batch]
+            placeholders = ", ".join(["?"] * len(ids))
+            with pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(
+                        "SELECT query_id, bytes_scanned "
+                        "FROM TABLE(INFORMATION_SCHEMA.QUERY_HISTORY_BY_USER(RESULT_LIMIT => 10000)) "
+                        f"WHERE query_id IN ({placeholders})",
+                        ids
+                    )
+                    bytes_scanned = dict(cursor.fetchall())
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(f"⚠️ Could not read query history for result-cache stats: {e}")
+            bytes_scanned = {}
+
+        with self._lock:
+            for entry in batch:
+                query_id = entry[0]
+                if query_id in bytes_scanned:
+                    if bytes_scanned[query_id] == 0:
+                        self.hits += 1
+                    else:
+                        self.misses += 1
+                elif entry[1] + 1 < self.max_attempts:
+                    entry[1] += 1
+                    self._pending.appendleft(entry)
+                else:
+                    self.unresolved += 1
+            self._resolving = False
+            stats = self.stats()
+
+        print(f"Search result cache: {stats['hits']}/{stats['hits'] + stats['misses']} statements reused "
+              f"({stats['hit_rate']:.1%}), {stats['pending']} pending")
+        return stats
+
+    def stats(self) -> dict:
+        resolved = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / resolved, 4) if resolved else 0.0,
+            "pending": len(self._pending),
+            "unresolved": self.unresolved,
+        }
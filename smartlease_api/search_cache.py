@@ -0,0 +1,172 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import toml
+
+from smartlease_api.query_parser import KNOWN_NEIGHBORHOODS, LEFTOVER_NUMBER, parse_query
+
+config = toml.load(Path(__file__).parent / "config.toml")
+NEIGHBORHOODS = KNOWN_NEIGHBORHOODS + [
+    n.lower() for n in config.get("metadata", {}).get("known_neighborhoods", [])
+]
+
+
+def normalize_query(query: str) -> str:
+    """
+    Case-, whitespace- and trailing-punctuation-insensitive cache key.
+    """
+    return re.sub(r"\s+", " ", query.lower()).strip().rstrip(".?!").strip()
+
+
+def query_filters(query: str) -> tuple:
+    """
+    The structured part of a query: the filters the rule-based parser
+    extracts plus every number it mentions. "2 bed under $2000" and "3 bed
+    under $3000" embed almost identically, so a semantic hit also needs
+    these to match exactly.
+    """
+    metadata, _ = parse_query(query, NEIGHBORHOODS)
+    text = re.sub(r"(?<=\d),(?=\d)", "", query.lower())
+    return tuple(sorted((k, str(v)) for k, v in metadata.items())), tuple(sorted(LEFTOVER_NUMBER.findall(text)))
+
+
+class SearchCache:
+    """
+    Two-tier cache for full search responses.
+
+    The exact tier is keyed on the normalized query. On an exact miss the
+    semantic tier reuses a cached response whose query embedding is within
+    `similarity_threshold` cosine similarity of the new one and whose
+    query_filters are identical. Entries expire
+    after `ttl_seconds` and the least recently used entry is evicted beyond
+    `max_entries`.
+
+    Every invalidate() starts a new `generation`. Callers read it before
+    computing a response and pass it to put(), which drops responses
+    computed from data that was invalidated in the meantime.
+    """
+    def __init__(self, enabled: bool = True, max_entries: int = 256, ttl_seconds: float = 3600,
+                 similarity_threshold: float = 0.95, semantic: bool = True):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.semantic = semantic
+
+        self._entries = OrderedDict()  # normalized query -> entry dict
+        self._lock = threading.Lock()
+        self.generation = 0
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.latency_saved = 0.0
+
+    def _expired(self, entry: dict) -> bool:
+        return time.monotonic() - entry["created"] > self.ttl_seconds
+
+    def _hit(self, key: str, entry: dict):
+        self._entries.move_to_end(key)
+        self.latency_saved += entry["cost_seconds"]
+        return entry["value"]
+
+    def _semantic_match(self, embedding: np.ndarray, filters: tuple):
+        keys = [
+            k for k, e in self._entries.items()
+            if e["embedding"] is not None and e["filters"] == filters and not self._expired(e)
+        ]
+        if not keys:
+            return None, 0.0
+        matrix = np.stack([self._entries[k]["embedding"] for k in keys])
+        scores = matrix @ embedding
+        best = int(np.argmax(scores))
+        return keys[best], float(scores[best])
+
+    def lookup(self, query: str, embed=None):
+        """
+        Return (value, layer, embedding). `layer` is "exact", "semantic" or
+        None on a miss. `embed` is only called when the exact tier misses;
+        its result is returned so the caller can store it with the new entry.
+        """
+        if not self.enabled:
+            return None, None, None
+
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self.exact_hits += 1
+                return self._hit(key, entry), "exact", entry["embedding"]
+
+        embedding = None
+        if self.semantic and embed is not None:
+            embedding = np.asarray(embed(query), dtype=np.float32)
+            embedding /= np.linalg.norm(embedding) or 1.0
+            filters = query_filters(query)
+            with self._lock:
+                match, score = self._semantic_match(embedding, filters)
+                if match is not None and score >= self.similarity_threshold:
+                    self.semantic_hits += 1
+                    return self._hit(match, self._entries[match]), "semantic", embedding
+
+        with self._lock:
+            self.misses += 1
+        return None, None, embedding
+
+    def put(self, query: str, value, cost_seconds: float, embedding=None, generation: int = None):
+        """
+        Store a response along with how long it took to compute, which is
+        credited to latency_saved on every later hit. Responses computed in
+        an earlier `generation` are not stored.
+        """
+        if not self.enabled:
+            return
+        key = normalize_query(query)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = {
+                "value": value,
+                "created": time.monotonic(),
+                "cost_seconds": cost_seconds,
+                "embedding": embedding,
+                "filters": query_filters(query) if self.semantic else None,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """
+        Drop every entry, e.g. after new properties are upserted.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+                "latency_saved_seconds": round(self.latency_saved, 3),
+                "invalidations": self.invalidations,
+            }
+
+
+# Shared cache for /hybrid-search/, configured by the optional [search_cache] section
+search_cache = SearchCache(**config.get("search_cache", {}))
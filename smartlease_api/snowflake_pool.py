@@ -0,0 +1,275 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import snowflake.connector
+
+# Keys from the [snowflake] config section that are passed to connect()
+CONNECT_KEYS = ["user", "password", "account", "warehouse", "database", "schema", "role"]
+
+
+class LatencyStat:
+    """
+    Running count / total / max of a latency in milliseconds.
+    """
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, seconds: float):
+        ms = seconds * 1000
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "total_ms": round(self.total_ms, 3),
+        }
+
+
+class SnowflakePool:
+    """
+    Thread-safe pool of long-lived Snowflake connections.
+
+    Connections are opened lazily up to max_size, health-checked before being
+    handed out when they have not been verified recently, and closed once they
+    sit idle longer than idle_timeout (never dropping below min_size).
+    """
+    def __init__(self, creds: dict, min_size: int = 1, max_size: int = 5, idle_timeout: float = 600,
+                 health_check_interval: float = 60, checkout_timeout: float = 30, **connect_kwargs):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}")
+        self.creds = {k: creds[k] for k in CONNECT_KEYS if k in creds}
+        self.connect_kwargs = connect_kwargs
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+
+        self._cond = threading.Condition()
+        self._idle = []  # stack of [conn, last_used, last_checked]; most recently used on top
+        self._size = 0   # open connections, idle + checked out
+
+        self.wait_time = LatencyStat()
+        self.checkout_latency = LatencyStat()
+        self.created = 0
+        self.evicted = 0
+        self.health_check_failures = 0
+        self.timeouts = 0
+
+    # ---- Connection lifecycle ----
+    def _connect(self):
+        conn = snowflake.connector.connect(**self.creds, **self.connect_kwargs)
+        self.created += 1
+        return conn
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.is_closed():
+            return False
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _evict_idle_locked(self):
+        """
+        Close connections idle longer than idle_timeout. Caller holds the lock.
+        """
+        now = time.monotonic()
+        keep = []
+        # Oldest entries sit at the bottom of the stack
+        for entry in self._idle:
+            if now - entry[1] > self.idle_timeout and self._size > self.min_size:
+                self._close_quietly(entry[0])
+                self._size -= 1
+                self.evicted += 1
+            else:
+                keep.append(entry)
+        self._idle = keep
+
+    def warm(self):
+        """
+        Open connections until min_size are available.
+        """
+        with self._cond:
+            missing = self.min_size - self._size
+            self._size += max(missing, 0)
+        for _ in range(max(missing, 0)):
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            now = time.monotonic()
+            with self._cond:
+                self._idle.append([conn, now, now])
+                self._cond.notify()
+
+    def acquire(self):
+        """
+        Check a connection out of the pool, waiting up to checkout_timeout.
+        """
+        start = time.perf_counter()
+        deadline = start + self.checkout_timeout
+        waited = 0.0
+        while True:
+            entry = None
+            wait_start = time.perf_counter()
+            with self._cond:
+                while True:
+                    self._evict_idle_locked()
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise TimeoutError(
+                            f"Timed out after {self.checkout_timeout}s waiting for a Snowflake connection"
+                        )
+                    self._cond.wait(remaining)
+            waited += time.perf_counter() - wait_start
+
+            if entry is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                break
+
+            conn, _, last_checked = entry
+            if time.monotonic() - last_checked < self.health_check_interval or self._is_healthy(conn):
+                break
+
+            # Stale connection: drop it and try again
+            self.health_check_failures += 1
+            self._close_quietly(conn)
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+
+        self.wait_time.record(waited)
+        self.checkout_latency.record(time.perf_counter() - start)
+        return conn
+
+    def release(self, conn, verified: bool = True):
+        """
+        Return a connection to the pool. Unverified connections are
+        health-checked on their next checkout.
+        """
+        if conn.is_closed():
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            return
+        now = time.monotonic()
+        with self._cond:
+            self._idle.append([conn, now, now if verified else float("-inf")])
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Per-request checkout: `with pool.connection() as conn: ...`
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            self.release(conn, verified=False)
+            raise
+        self.release(conn)
+
+    def close(self):
+        """
+        Close every idle connection.
+        """
+        with self._cond:
+            for entry in self._idle:
+                self._close_quietly(entry[0])
+            self._size -= len(self._idle)
+            self._idle = []
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            idle = len(self._idle)
+            size = self._size
+        return {
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "open": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "connections_created": self.created,
+            "evicted_idle": self.evicted,
+            "health_check_failures": self.health_check_failures,
+            "checkout_timeouts": self.timeouts,
+            "wait_time": self.wait_time.as_dict(),
+            "checkout_latency": self.checkout_latency.as_dict(),
+        }
+
+
+# ---- Shared registry: one pool per distinct set of credentials/options ----
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(creds: dict, **options) -> SnowflakePool:
+    """
+    Return the process-wide pool for these credentials, creating it on first use.
+    Options (min_size, max_size, idle_timeout, ...) usually come from the
+    optional [snowflake_pool] config section.
+    """
+    key = (
+        tuple((k, creds.get(k)) for k in CONNECT_KEYS),
+        tuple(sorted(options.items())),
+    )
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = SnowflakePool(creds, **options)
+            _pools[key] = pool
+        return pool
+
+
+def pool_stats() -> dict:
+    """
+    Metrics for every pool in this process, keyed by account/database.schema.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    stats = {}
+    for pool in pools:
+        name = f"{pool.creds.get('account')}/{pool.creds.get('database')}.{pool.creds.get('schema')}"
+        if name in stats:
+            name = f"{name}#{len(stats)}"
+        stats[name] = pool.stats()
+    return stats
@@ -0,0 +1,74 @@
+import json
+
+
+class IncrementalArrayParser:
+    """
+    Pulls complete objects out of a JSON array while the document is still
+    arriving, e.g. each entry of "ranked_properties" as the LLM streams it.
+
+        parser = IncrementalArrayParser("ranked_properties")
+        for chunk in chunks:
+            for obj in parser.feed(chunk):
+                ...
+    """
+    def __init__(self, key: str):
+        self.key = key
+        self.buffer = ""
+        self.pos = 0            # next character to scan
+        self.array_found = False
+        self.done = False
+        self.depth = 0          # nesting inside the array; 1 = directly in it
+        self.in_string = False
+        self.escape = False
+        self.object_start = None
+
+    def _find_array(self) -> bool:
+        marker = self.buffer.find(f'"{self.key}"')
+        if marker == -1:
+            return False
+        bracket = self.buffer.find("[", marker + len(self.key) + 2)
+        if bracket == -1:
+            return False
+        self.pos = bracket + 1
+        self.depth = 1
+        self.array_found = True
+        return True
+
+    def feed(self, text: str) -> list:
+        """
+        Add streamed text; returns the objects completed by it.
+        """
+        self.buffer += text
+        if self.done or (not self.array_found and not self._find_array()):
+            return []
+
+        completed = []
+        while self.pos < len(self.buffer):
+            char = self.buffer[self.pos]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                if char == "{" and self.depth == 1:
+                    self.object_start = self.pos
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if char == "}" and self.depth == 1 and self.object_start is not None:
+                    try:
+                        completed.append(json.loads(self.buffer[self.object_start:self.pos + 1]))
+                    except json.JSONDecodeError:
+                        pass
+                    self.object_start = None
+                elif self.depth == 0:
+                    self.done = True
+                    self.pos += 1
+                    break
+            self.pos += 1
+        return completed
@@ -0,0 +1,157 @@
+import json
+import re
+import threading
+
+# tiktoken gives exact GPT-4 counts; without it fall back to ~4 characters per token
+try:
+    import tiktoken
+    _encoding = tiktoken.encoding_for_model("gpt-4")
+except Exception:
+    _encoding = None
+
+NULL_VALUES = {"", "nan", "none", "null", "n/a", "na"}
+URL_RE = re.compile(r"https?://\S+")
+COORDINATE_RE = re.compile(r"-?\d{1,3}\.\d{4,}")
+DETAILS_FIELD = "complete_property_details"
+
+# Dropped first when a property is still over budget after trimming its details
+DROP_ORDER = ["nearby_schools", "neighborhoods", "sqft", "full_baths"]
+
+
+def count_tokens(text: str) -> int:
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def compact_json(data) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _clean_value(value):
+    """
+    Normalised value, or None for null-ish placeholders and bare URLs.
+    """
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return None
+        return int(value) if value.is_integer() else value
+    text = URL_RE.sub("", str(value)).strip(" ,;")
+    if text.lower() in NULL_VALUES:
+        return None
+    # "2.0" -> "2"
+    if re.fullmatch(r"-?\d+\.0+", text):
+        text = text.split(".")[0]
+    return text
+
+
+def _details_segments(details: str) -> list:
+    # Supports both "a, b, c" and labelled "key: value; key: value" text
+    separator = "; " if ": " in details and "; " in details else ", "
+    return [seg.strip() for seg in details.split(separator)]
+
+
+def _unique_details(details: str, known_values: set) -> str:
+    """
+    Segments of complete_property_details that add information beyond the
+    structured fields: no placeholders, URLs or repeats of known values.
+    """
+    kept = []
+    seen = set()
+    # Whole values plus the comma-separated pieces of each (address parts),
+    # compared as whole segments: "4" must not match inside "14 main st"
+    known = set(known_values)
+    for known_value in known_values:
+        known.update(part.strip() for part in known_value.split(","))
+    for segment in _details_segments(details):
+        value = segment.split(": ", 1)[1] if ": " in segment else segment
+        value = _clean_value(value)
+        if value is None:
+            continue
+        value = str(value).lower()
+        # Raw latitude/longitude mean nothing to the LLM
+        if COORDINATE_RE.fullmatch(value):
+            continue
+        # Pieces of a comma-split address repeat parts of the known address
+        if value in seen or value in known:
+            continue
+        seen.add(value)
+        kept.append(segment if ": " in segment else str(_clean_value(segment)))
+    return "; ".join(kept)
+
+
+def compact_property(prop: dict, fields: list, budget: int) -> dict:
+    """
+    Compact, de-duplicated summary of a property in at most `budget` tokens:
+    null/"nan" fields and URLs are dropped, complete_property_details keeps
+    only what the other fields do not already say, then is truncated.
+    """
+    summary = {}
+    for key in fields:
+        if key == DETAILS_FIELD or key not in prop:
+            continue
+        value = _clean_value(prop[key])
+        if value is not None:
+            summary[key] = value
+
+    details = prop.get(DETAILS_FIELD)
+    if DETAILS_FIELD in fields and details:
+        known = {str(v).lower() for v in summary.values()}
+        extra = _unique_details(str(details), known)
+        if extra:
+            summary["details"] = extra
+
+    if count_tokens(compact_json(summary)) <= budget:
+        return summary
+
+    # Truncate the free-text details to whatever budget the fields leave
+    if "details" in summary:
+        words = summary["details"].split(" ")
+        low, high = 0, len(words)
+        while low < high:
+            mid = (low + high + 1) // 2
+            summary["details"] = " ".join(words[:mid])
+            if count_tokens(compact_json(summary)) <= budget:
+                low = mid
+            else:
+                high = mid - 1
+        summary["details"] = " ".join(words[:low])
+        if not summary["details"]:
+            del summary["details"]
+
+    for key in DROP_ORDER:
+        if count_tokens(compact_json(summary)) <= budget:
+            break
+        summary.pop(key, None)
+    return summary
+
+
+class TokenStats:
+    """
+    Running totals of prompt tokens actually sent vs. what the uncompacted
+    (indent=2, full-text) serialisation would have cost.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.baseline_tokens = 0
+
+    def record(self, prompt_tokens: int, baseline_tokens: int):
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.baseline_tokens += baseline_tokens
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "tokenizer": "tiktoken" if _encoding is not None else "approximate",
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "avg_prompt_tokens": round(self.prompt_tokens / self.requests, 1) if self.requests else 0.0,
+                "baseline_tokens": self.baseline_tokens,
+                "tokens_saved": self.baseline_tokens - self.prompt_tokens,
+            }
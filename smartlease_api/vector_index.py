@@ -0,0 +1,347 @@
+import json
+import re
+import threading
+import time
+from decimal import Decimal
+
+import numpy as np
+
+from smartlease_api.property_schema import DETAILS_HASH_COLUMN, FINGERPRINT_COLUMN, plain_value
+
+EMBEDDING_COLUMN = "complete_property_details_embedding"
+# Change when a listing is re-ingested (fingerprint) or re-embedded (details
+# hash); an indexed row whose values differ is fetched again on sync
+VERSION_COLUMNS = [FINGERPRINT_COLUMN, DETAILS_HASH_COLUMN]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _parse_vector(value) -> list:
+    # VECTOR::ARRAY comes back from the connector as a JSON string
+    return json.loads(value) if isinstance(value, str) else list(value)
+
+
+def _to_number(value) -> float:
+    # Typed NUMBER columns arrive as numbers; legacy STRING ones are parsed
+    # like TRY_TO_NUMBER(REGEXP_REPLACE(col, '[^0-9.]', ''))
+    if isinstance(value, (int, float, Decimal)):
+        return float(value)
+    try:
+        return float(re.sub(r"[^0-9.]", "", str(value)))
+    except ValueError:
+        return np.nan
+
+
+class IVFIndex:
+    """
+    Inverted-file ANN index over L2-normalised float32 vectors (cosine similarity).
+
+    Vectors are clustered with spherical k-means; a search only scores the rows
+    in the `nprobe` clusters closest to the query. Below `min_train_size` rows
+    the index stays exact (one matrix-vector product).
+    """
+    def __init__(self, dim: int = 1024, nlist: int = None, nprobe: int = 8, min_train_size: int = 5000,
+                 train_sample: int = 20000, kmeans_iterations: int = 10, seed: int = 0):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.train_sample = train_sample
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.centroids = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.lists = []
+        self.trained_size = 0
+
+    def __len__(self):
+        return len(self.vectors)
+
+    # ---- Building ----
+    def add(self, vectors) -> np.ndarray:
+        """
+        Append vectors; returns their row positions. New rows are assigned to
+        the existing clusters, and the clusters are retrained once the index
+        has doubled since the last training.
+        """
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+        start = len(self.vectors)
+        self.vectors = np.vstack([self.vectors, vectors])
+        positions = np.arange(start, len(self.vectors))
+
+        if len(self.vectors) >= self.min_train_size and (
+            self.centroids is None or len(self.vectors) >= 2 * self.trained_size
+        ):
+            self.train()
+        elif self.centroids is not None:
+            assign = np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+            self.assignments = np.concatenate([self.assignments, assign])
+            for cluster in np.unique(assign):
+                self.lists[cluster] = np.concatenate([self.lists[cluster], positions[assign == cluster]])
+        return positions
+
+    def train(self):
+        n = len(self.vectors)
+        rng = np.random.default_rng(self.seed)
+        sample = self.vectors[rng.choice(n, min(n, self.train_sample), replace=False)]
+        nlist = min(self.nlist or max(1, int(np.sqrt(n))), len(sample))
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+        for _ in range(self.kmeans_iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(assign, kind="stable")
+            clusters, starts = np.unique(assign[order], return_index=True)
+            centroids[clusters] = np.add.reduceat(sample[order], starts, axis=0)
+            centroids = _normalize(centroids)
+
+        self.centroids = centroids.astype(np.float32)
+        self.assignments = np.argmax(self.vectors @ self.centroids.T, axis=1).astype(np.int32)
+        self.lists = [np.flatnonzero(self.assignments == c) for c in range(nlist)]
+        self.trained_size = n
+
+    # ---- Searching ----
+    def search(self, query, k: int, mask: np.ndarray = None, exact: bool = False):
+        """
+        Top-k (positions, similarities) for the query. `mask` is a boolean
+        pre-filter over row positions; rows where it is False are never scored.
+        """
+        query = _normalize(np.asarray(query, dtype=np.float32).reshape(self.dim))
+
+        if exact or self.centroids is None:
+            candidates = np.flatnonzero(mask) if mask is not None else np.arange(len(self.vectors))
+        else:
+            nprobe = min(self.nprobe, len(self.centroids))
+            probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+            candidates = np.concatenate([self.lists[c] for c in probe])
+            if mask is not None:
+                candidates = candidates[mask[candidates]]
+                # Selective filters can leave the probed clusters short; the
+                # filtered set is small then, so score all of it exactly
+                if len(candidates) < k:
+                    candidates = np.flatnonzero(mask)
+
+        if len(candidates) == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+
+        scores = self.vectors[candidates] @ query
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return candidates[top], scores[top]
+
+
+class LocalVectorIndex:
+    """
+    In-process copy of properties_data_with_embeddings for warehouse-free
+    vector search: an IVFIndex over the embeddings plus the non-embedding
+    columns of every row, used for structured pre-filters and results.
+
+    Replaced and deleted rows are only marked dead; once they make up more
+    than `compact_threshold` of the index it is rebuilt from the live rows.
+    """
+    def __init__(self, table: str = "properties_data_with_embeddings", refresh_interval: float = 300,
+                 compact_threshold: float = 0.25, **index_options):
+        self.table = table
+        self.refresh_interval = refresh_interval
+        self.compact_threshold = compact_threshold
+        self.index_options = index_options
+        self.index = IVFIndex(**index_options)
+        self.rows = []          # row position -> column dict (without the embedding)
+        self.positions = {}     # property_id -> row position
+        self.versions = {}      # property_id -> VERSION_COLUMNS values when it was fetched
+        self.alive = np.empty(0, dtype=bool)
+        self._attributes = {}   # (column, numeric) -> array used for filter masks
+        self._lock = threading.RLock()
+        self.last_sync = float("-inf")
+
+    def __len__(self):
+        return int(self.alive.sum())
+
+    # ---- Loading and incremental sync ----
+    def add_rows(self, rows: list):
+        """
+        Add rows that carry a complete_property_details_embedding value.
+        Rows whose property_id is already indexed replace the old entry.
+        """
+        rows = [r for r in rows if r.get("property_id") and r.get(EMBEDDING_COLUMN) is not None]
+        if not rows:
+            return 0
+        vectors = np.array([_parse_vector(r[EMBEDDING_COLUMN]) for r in rows], dtype=np.float32)
+        with self._lock:
+            self.remove_ids([r["property_id"] for r in rows if r["property_id"] in self.positions])
+            positions = self.index.add(vectors)
+            for pos, row in zip(positions, rows):
+                row = {k: v for k, v in row.items() if k != EMBEDDING_COLUMN}
+                self.rows.append(row)
+                self.positions[row["property_id"]] = int(pos)
+            self.alive = np.concatenate([self.alive, np.ones(len(rows), dtype=bool)])
+            self._attributes = {}
+        return len(rows)
+
+    def remove_ids(self, property_ids):
+        with self._lock:
+            for pid in property_ids:
+                pos = self.positions.pop(pid, None)
+                self.versions.pop(pid, None)
+                if pos is not None:
+                    self.alive[pos] = False
+            dead = len(self.alive) - int(self.alive.sum())
+            if dead and dead > self.compact_threshold * len(self.alive):
+                self.compact()
+
+    def compact(self):
+        """
+        Drop dead rows and rebuild the IVF index (retraining its clusters)
+        over the live ones, renumbering their row positions.
+        """
+        with self._lock:
+            keep = np.flatnonzero(self.alive)
+            index = IVFIndex(**self.index_options)
+            if len(keep):
+                index.add(self.index.vectors[keep])
+            self.index = index
+            self.rows = [self.rows[pos] for pos in keep]
+            self.positions = {row["property_id"]: pos for pos, row in enumerate(self.rows)}
+            self.alive = np.ones(len(self.rows), dtype=bool)
+            self._attributes = {}
+
+    def _fetch(self, cursor, property_ids: list = None) -> list:
+        sql = f"""
+        SELECT * EXCLUDE ({EMBEDDING_COLUMN}), {EMBEDDING_COLUMN}::ARRAY AS "{EMBEDDING_COLUMN}"
+        FROM {self.table}
+        WHERE {EMBEDDING_COLUMN} IS NOT NULL
+        """
+        params = None
+        if property_ids is not None:
+            sql += ' AND "property_id" IN (' + ", ".join(["%s"] * len(property_ids)) + ")"
+            params = tuple(property_ids)
+        cursor.execute(sql, params)
+        cols = [col[0] for col in cursor.description]
+        return [{col: plain_value(value) for col, value in zip(cols, row)} for row in cursor.fetchall()]
+
+    def _version_columns(self, cursor) -> list:
+        # Tables loaded before fingerprints or incremental embedding lack the columns
+        cursor.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = CURRENT_SCHEMA() AND table_name = %s",
+            (self.table.upper(),)
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        return [column for column in VERSION_COLUMNS if column in existing]
+
+    def sync(self, pool, batch_size: int = 1000) -> dict:
+        """
+        Bring the index in line with the table: fetch property_ids that are
+        not indexed yet or whose fingerprint or details hash changed since
+        they were (replacing their vector and columns), and drop ones that
+        were deleted.
+        """
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                version_columns = self._version_columns(cursor)
+                selected = "".join(f', "{column}"' for column in version_columns)
+                cursor.execute(
+                    f'SELECT "property_id"{selected} FROM {self.table} WHERE {EMBEDDING_COLUMN} IS NOT NULL'
+                )
+                remote = {row[0]: tuple(row[1:]) for row in cursor.fetchall() if row[0]}
+                with self._lock:
+                    local = {pid: self.versions.get(pid) for pid in self.positions}
+                new_ids = sorted(pid for pid in remote if pid not in local)
+                changed_ids = sorted(pid for pid, version in remote.items() if pid in local and version != local[pid])
+                fetch_ids = new_ids + changed_ids
+                for i in range(0, len(fetch_ids), batch_size):
+                    rows = self._fetch(cursor, fetch_ids[i:i + batch_size])
+                    self.add_rows(rows)
+                    with self._lock:
+                        for row in rows:
+                            if row.get("property_id") in self.positions:
+                                self.versions[row["property_id"]] = tuple(row.get(c) for c in version_columns)
+            finally:
+                cursor.close()
+
+        removed = set(local) - set(remote)
+        self.remove_ids(removed)
+        self.last_sync = time.monotonic()
+        return {"added": len(new_ids), "updated": len(changed_ids), "removed": len(removed), "size": len(self)}
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.last_sync > self.refresh_interval
+
+    # ---- Pre-filter bitmasks ----
+    def _attribute(self, column: str, numeric: bool) -> np.ndarray:
+        key = (column, numeric)
+        if key not in self._attributes:
+            values = [row.get(column) for row in self.rows]
+            if numeric:
+                self._attributes[key] = np.array(
+                    [_to_number(v) if v is not None else np.nan for v in values], dtype=np.float64
+                )
+            else:
+                self._attributes[key] = np.array(
+                    [str(v).lower() if v is not None else None for v in values], dtype=object
+                )
+        return self._attributes[key]
+
+    def filter_mask(self, filters: list) -> np.ndarray:
+        """
+        Boolean mask of live rows matching every (column, op, value) filter.
+        """
+        mask = self.alive.copy()
+        for column, op, value in filters:
+            if not self.rows or column not in self.rows[0]:
+                # Unknown column: nothing can match, as the SQL would not either
+                return np.zeros_like(mask)
+            if op == "ilike":
+                needle = str(value).lower()
+                values = self._attribute(column, numeric=False)
+                mask &= np.array([v is not None and needle in v for v in values], dtype=bool)
+            else:
+                values = self._attribute(column, numeric=True)
+                with np.errstate(invalid="ignore"):
+                    if op == "<":
+                        mask &= values < value
+                    elif op == ">":
+                        mask &= values > value
+                    else:
+                        mask &= values == value
+        return mask
+
+    # ---- Hybrid search ----
+    def hybrid_search(self, query_vector, filters: list, columns: list = None, candidates: int = 20,
+                      top_k: int = 6, keyword_boost: float = 0.1, exact: bool = False) -> list:
+        """
+        Local equivalent of the warehouse hybrid search: top candidates of the
+        filtered (keyword) and unfiltered (semantic) vector searches, merged
+        with the keyword boost and cut to top_k.
+        """
+        with self._lock:
+            keyword_pos, keyword_sim = self.index.search(
+                query_vector, candidates, mask=self.filter_mask(filters), exact=exact
+            )
+            semantic_pos, semantic_sim = self.index.search(query_vector, candidates, mask=self.alive, exact=exact)
+
+            combined = {}
+            for positions, sims, keyword_score in ((keyword_pos, keyword_sim, 1), (semantic_pos, semantic_sim, 0)):
+                for pos, sim in zip(positions, sims):
+                    row = self.rows[pos]
+                    if row["property_id"] in combined:
+                        continue
+                    if columns:
+                        row = {k: row.get(k) for k in dict.fromkeys(["property_id"] + list(columns))}
+                    else:
+                        row = dict(row)
+                    row["similarity"] = float(sim)
+                    row["keyword_score"] = keyword_score
+                    row["final_score"] = float(sim) + (keyword_boost if keyword_score else 0.0)
+                    combined[row["property_id"]] = row
+
+        return sorted(combined.values(), key=lambda r: r["final_score"], reverse=True)[:top_k]
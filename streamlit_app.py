@@ -2,78 +2,58 @@ import streamlit as st
 import pandas as pd
 import requests
 import re
-import snowflake.connector
+import json
 import toml
 from pathlib import Path
 
+from smartlease_api.snowflake_pool import get_pool
+
 # ------------------ CONFIG ------------------
 config = toml.load(Path(__file__).parent / "smartlease_api" / "config.toml")
 sf_creds = config["snowflake"]
 base_url = "http://127.0.0.1:8000"
 
 # ------------------ Snowflake Helpers ------------------
-def get_snowflake_connection():
-    return snowflake.connector.connect(
-        user=sf_creds["user"],
-        password=sf_creds["password"],
-        account=sf_creds["account"],
-        warehouse=sf_creds["warehouse"],
-        database=sf_creds["database"],
-        schema=sf_creds["schema"],
-        role=sf_creds["role"]
-    )
-
-def fetch_property_details_by_id(property_id):
-    conn = get_snowflake_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT "property_id", "address", "status", "style", "beds", "full_baths", "sqft", "year_built", 
-               "list_price", "primary_photo", "alt_photos"
-        FROM properties_data_with_embeddings
-        WHERE "property_id" = %s
-    ''', (property_id,))
-    row = cursor.fetchone()
-    cols = [desc[0] for desc in cursor.description]
-    cursor.close()
-    conn.close()
-    return dict(zip(cols, row)) if row else {}
+# The pool lives in an imported module, so it survives Streamlit script reruns
+snowflake_pool = get_pool(sf_creds, **config.get("snowflake_pool", {}))
 
 # ------------------ Auth Helpers ------------------
 def email_valid(email):
     return re.match(r"[^@]+@[^@]+\.[^@]+", email)
 
 def create_user_table_if_needed():
-    conn = get_snowflake_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS USERS (
-            EMAIL STRING PRIMARY KEY,
-            PASSWORD STRING
-        )
-    """)
-    cursor.close()
-    conn.close()
+    with snowflake_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS USERS (
+                    EMAIL STRING PRIMARY KEY,
+                    PASSWORD STRING
+                )
+            """)
+        finally:
+            cursor.close()
 
 def signup_user(email, password):
     create_user_table_if_needed()
-    conn = get_snowflake_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("INSERT INTO USERS (EMAIL, PASSWORD) VALUES (%s, %s)", (email, password))
-        return True
-    except:
-        return False
-    finally:
-        cursor.close()
-        conn.close()
+    with snowflake_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("INSERT INTO USERS (EMAIL, PASSWORD) VALUES (%s, %s)", (email, password))
+            return True
+        except:
+            return False
+        finally:
+            cursor.close()
 
 def authenticate_user(email, password):
-    conn = get_snowflake_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM USERS WHERE EMAIL = %s AND PASSWORD = %s", (email, password))
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    with snowflake_pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT * FROM USERS WHERE EMAIL = %s AND PASSWORD = %s", (email, password))
+            result = cursor.fetchone()
+        finally:
+            cursor.close()
     return result is not None
 
 # ------------------ UI ------------------
@@ -115,6 +95,91 @@ def show_login_signup():
         else:
             st.error("Invalid credentials.")
 
+def render_ranked_property(title, prop):
+    # The API sends each ranked property's display fields with it
+    meta = prop.get("property")
+    st.markdown(f"## 🏠 {title}")
+    if meta:
+        left, right = st.columns([1.5, 1.5])
+
+        with left:
+            st.markdown("### 📍 Property Details")
+            st.markdown(f"- **Address:** {meta.get('address') or 'N/A'}")
+            st.markdown(f"- **Style:** {meta.get('style') or 'N/A'}")
+            st.markdown(f"- **Beds/Baths:** {meta.get('beds') or 'N/A'} / {meta.get('full_baths') or 'N/A'}")
+            st.markdown(f"- **Sqft:** {meta.get('sqft') or 'N/A'}")
+            st.markdown(f"- **Year Built:** {meta.get('year_built') or 'N/A'}")
+            st.markdown(f"- **Price:** ${meta.get('list_price') or 'N/A'}")
+            st.markdown(f"- **Status:** {meta.get('status') or 'N/A'}")
+
+        with right:
+            image_url = meta.get("primary_photo") or meta.get("alt_photos")
+            if image_url and isinstance(image_url, str) and image_url.strip().lower() != "nan":
+                st.image(image_url, width=400, caption="Property Image")
+            else:
+                st.info("No image available.")
+
+    st.markdown(f"💡 **Suggestion:** {prop.get('suggestion', '')}")
+
+    pros_col, cons_col = st.columns(2)
+    with pros_col:
+        st.markdown("✅ **Pros**")
+        for p in prop.get("pros", []):
+            st.markdown(f"- {p}")
+    with cons_col:
+        st.markdown("⚠️ **Cons**")
+        for c in prop.get("cons", []):
+            st.markdown(f"- {c}")
+
+    st.markdown("---")
+
+PIPELINE_POLL_SECONDS = 2
+
+def pipeline_job_panel(job_id):
+    """
+    One poll of a pipeline job: status, per-stage progress and a Cancel
+    button. Once the job is finished the app reruns so polling stops.
+    """
+    st.caption(f"Pipeline job {job_id}")
+    res = requests.get(f"{base_url}/pipeline-jobs/{job_id}")
+    if res.status_code != 200:
+        st.error("Could not fetch pipeline status.")
+        return
+    job = res.json()
+
+    stages = (job.get("progress") or {}).get("stages", {})
+    if stages:
+        st.dataframe(pd.DataFrame([
+            {"stage": name, "status": stage["status"], "rows": stage.get("rows"), "seconds": stage.get("seconds")}
+            for name, stage in stages.items()
+        ]), hide_index=True)
+
+    if job["status"] == "succeeded":
+        st.success(job["message"])
+    elif job["status"] in ("empty", "cancelled"):
+        st.warning(job["message"] or "⚠️ Pipeline cancelled.")
+    elif job["status"] == "failed":
+        st.error(f"Pipeline failed: {job['error']}")
+    else:
+        running = [name for name, stage in stages.items() if stage["status"] == "running"]
+        st.info(f"⏳ {job['status'].capitalize()}" + (f": {running[0]}" if running else ""))
+        if st.button("Cancel Pipeline"):
+            requests.post(f"{base_url}/pipeline-jobs/{job_id}/cancel")
+        return
+
+    if st.session_state.get("pipeline_job_finished") != job_id:
+        st.session_state.pipeline_job_finished = job_id
+        st.rerun()
+
+def show_pipeline_job(job_id):
+    """
+    Show a pipeline job's progress without blocking the script: the panel is
+    a fragment that reruns on its own every PIPELINE_POLL_SECONDS while the
+    job is active, so the other tabs stay usable meanwhile.
+    """
+    finished = st.session_state.get("pipeline_job_finished") == job_id
+    st.fragment(run_every=None if finished else PIPELINE_POLL_SECONDS)(pipeline_job_panel)(job_id)
+
 def show_main_ui():
     st.success(f"Welcome, {st.session_state.email} ")
     tab1, tab2, tab3 = st.tabs(["Add new properties and POI", "Add Property manually", "Search Property"])
@@ -137,11 +202,14 @@ def show_main_ui():
                 "end_row": end_row
             }
             res = requests.post(f"{base_url}/run-property-pipeline", json=payload)
-            if res.status_code == 200:
-                st.success(res.json()["message"])
+            if res.status_code == 202:
+                st.session_state.pipeline_job = res.json()["job_id"]
             else:
                 st.error("Error running pipeline.")
 
+        if st.session_state.get("pipeline_job"):
+            show_pipeline_job(st.session_state.pipeline_job)
+
     # ----------------- Add Property -----------------
     with tab2:
         st.header("Add Property using Form")
@@ -181,6 +249,8 @@ def show_main_ui():
                 res = requests.post(f"{base_url}/add-property-form", data=data, files=files)
                 if res.status_code == 200:
                     st.success("✅ Property added successfully!")
+                    if res.json().get("embedding") == "pending":
+                        st.info("It will show up in search once its embedding is computed.")
                 else:
                     st.error("❌ Failed to add property.")
 
@@ -190,49 +260,48 @@ def show_main_ui():
         query = st.text_area("Enter your search query")
 
         if st.button("Search"):
-            res = requests.post(f"{base_url}/hybrid-search/", json={"query": query})
+            # Candidates arrive as soon as the database answers; each property's
+            # pros/cons are shown as the LLM finishes it, in search order, and
+            # the list is re-sorted into the final ranking once all are scored
+            status_box = st.empty()
+            preview = st.empty()
+            results_box = st.empty()
+            status_box.info("Searching...")
+            res = requests.post(f"{base_url}/hybrid-search/stream", json={"query": query}, stream=True)
             if res.status_code != 200:
-                st.error("Search failed.")
+                status_box.error("Search failed.")
                 return
 
-            data = res.json()
-            for idx, prop in enumerate(data["ranked_properties"]):
-                st.markdown(f"## 🏠 Property #{idx+1}")
-                meta = fetch_property_details_by_id(prop["property_id"])
-
-                if meta:
-                    left, right = st.columns([1.5, 1.5])
-
-                    with left:
-                        st.markdown("### 📍 Property Details")
-                        st.markdown(f"- **Address:** {meta.get('address') or 'N/A'}")
-                        st.markdown(f"- **Style:** {meta.get('style') or 'N/A'}")
-                        st.markdown(f"- **Beds/Baths:** {meta.get('beds') or 'N/A'} / {meta.get('full_baths') or 'N/A'}")
-                        st.markdown(f"- **Sqft:** {meta.get('sqft') or 'N/A'}")
-                        st.markdown(f"- **Year Built:** {meta.get('year_built') or 'N/A'}")
-                        st.markdown(f"- **Price:** ${meta.get('list_price') or 'N/A'}")
-                        st.markdown(f"- **Status:** {meta.get('status') or 'N/A'}")
-
-                    with right:
-                        image_url = meta.get("primary_photo") or meta.get("alt_photos")
-                        if image_url and isinstance(image_url, str) and image_url.strip().lower() != "nan":
-                            st.image(image_url, width=400, caption="Property Image")
-                        else:
-                            st.info("No image available.")
-
-                st.markdown(f"💡 **Suggestion:** {prop['suggestion']}")
-
-                pros_col, cons_col = st.columns(2)
-                with pros_col:
-                    st.markdown("✅ **Pros**")
-                    for p in prop["pros"]:
-                        st.markdown(f"- {p}")
-                with cons_col:
-                    st.markdown("⚠️ **Cons**")
-                    for c in prop["cons"]:
-                        st.markdown(f"- {c}")
-
-                st.markdown("---")
+            streamed = []
+            for line in res.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+
+                if event["event"] == "candidates":
+                    status_box.info(f"Found {len(event['properties'])} matching properties. Ranking...")
+                    preview.markdown("\n".join(
+                        f"- {c.get('address') or 'N/A'} · ${c.get('list_price') or 'N/A'} · "
+                        f"{c.get('beds') or 'N/A'} bd / {c.get('full_baths') or 'N/A'} ba"
+                        for c in event["properties"]
+                    ))
+                elif event["event"] == "ranked_property":
+                    streamed.append(event["property"])
+                    status_box.info(f"Scored {len(streamed)} properties. Ranking...")
+                    with results_box.container():
+                        for prop in sorted(streamed, key=lambda p: p.get("retrieval_rank") or len(streamed) + 1):
+                            render_ranked_property(f"Search result #{prop.get('retrieval_rank') or '?'}", prop)
+                elif event["event"] == "done":
+                    status_box.empty()
+                    preview.empty()
+                    with results_box.container():
+                        for idx, prop in enumerate(event.get("ranked_properties", [])):
+                            render_ranked_property(f"Property #{idx+1}", prop)
+                        if "error" in event:
+                            st.error("Search failed.")
+                elif event["event"] == "error":
+                    status_box.error("Search failed.")
+                    preview.empty()
 
     # ----------------- Logout -----------------
     st.button("Logout", on_click=lambda: st.session_state.clear())
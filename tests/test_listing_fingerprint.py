@@ -0,0 +1,27 @@
+import pandas as pd
+
+from add_properties_and_poi.listing_fingerprint import listing_fingerprints
+from add_properties_and_poi.property_text import build_property_details
+
+LISTING = {
+    "property_id": "1001", "address": "12 Elm St, Boston, MA", "status": "for_rent", "beds": 2.0,
+    "full_baths": 1.0, "sqft": 850.0, "list_price": 2500.0, "latitude": 42.35, "longitude": -71.06,
+}
+
+
+def test_fingerprint_does_not_depend_on_neighbouring_rows():
+    # A neighbour with fractional values used to turn the listing's "2500" into "2500.0"
+    alone = pd.DataFrame([LISTING])
+    with_neighbour = pd.DataFrame([
+        {**LISTING, "property_id": "1002", "full_baths": 1.5, "list_price": 1999.99, "beds": None},
+        LISTING,
+    ])
+
+    assert listing_fingerprints(alone).iloc[0] == listing_fingerprints(with_neighbour).iloc[1]
+    assert build_property_details(alone).iloc[0] == build_property_details(with_neighbour).iloc[1]
+
+
+def test_whole_numbers_lose_trailing_zero():
+    details = build_property_details(pd.DataFrame([LISTING, {**LISTING, "list_price": 2500.5}]))
+    assert "list price: 2500" in details.iloc[0].split("; ")
+    assert "list price: 2500.5" in details.iloc[1].split("; ")
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from add_properties_and_poi.poi_cache import PoiCache
+from add_properties_and_poi.poi_enrichment import PlacesClient
+from benchmarks.places_stub import start_stub
+
+ADDRESS, LAT, LNG = "12 Elm St, Boston, MA", 42.3601, -71.0589
+
+
+@pytest.fixture
+def places():
+    server, base_url = start_stub(latency=0, results_per_search=3, denied_keys={"bad-key"})
+    yield base_url
+    server.shutdown()
+
+
+def run(coroutine_fn, base_url, key, cache):
+    async def main():
+        async with PlacesClient([key], base_url=base_url, cache=cache, backoff=0) as client:
+            return await coroutine_fn(client), client.stats
+    return asyncio.run(main())
+
+
+def test_denied_nearby_search_is_not_cached(places, tmp_path):
+    cache = PoiCache(tmp_path / "poi.sqlite")
+    key, _ = PlacesClient(["k"], cache=cache)._origin(ADDRESS, LAT, LNG)
+
+    pois, stats = run(lambda client: client.get_poi_for_address(ADDRESS, LAT, LNG), places, "bad-key", cache)
+    assert pois == []
+    assert stats["errors"] == 1
+    assert cache.get_nearby(key) is None
+
+    # A working key afterwards is not masked by a cached empty result
+    pois, _ = run(lambda client: client.get_poi_for_address(ADDRESS, LAT, LNG), places, "good-key", cache)
+    assert len(pois) == 3
+    assert len(cache.get_nearby(key)) == 3
+
+
+@pytest.mark.parametrize("lat, lng", [(LAT, LNG), (None, None)], ids=["nearbysearch", "textsearch"])
+def test_denied_typed_search_is_not_cached(places, tmp_path, lat, lng):
+    cache = PoiCache(tmp_path / "poi.sqlite")
+    key, _ = PlacesClient(["k"], cache=cache)._origin(ADDRESS, lat, lng)
+    key = f"{key}|cafe|distance"
+
+    poi, stats = run(lambda client: client.get_typed_poi("cafe", ADDRESS, lat, lng), places, "bad-key", cache)
+    assert poi is None
+    assert stats["errors"] == 1
+    assert cache.get_typed(key) is None
+
+    poi, _ = run(lambda client: client.get_typed_poi("cafe", ADDRESS, lat, lng), places, "good-key", cache)
+    assert poi["name"]
+    assert cache.get_typed(key) == poi
+
+
+def test_undecodable_body_is_retried(tmp_path):
+    server, base_url = start_stub(latency=0, results_per_search=3, garbled_requests=1)
+    try:
+        cache = PoiCache(tmp_path / "poi.sqlite")
+        poi, stats = run(lambda client: client.get_typed_poi("cafe", ADDRESS, LAT, LNG), base_url, "good-key", cache)
+    finally:
+        server.shutdown()
+    assert poi["name"]
+    assert stats["retries"] == 1
+    assert stats["failures"] == 0
@@ -0,0 +1,22 @@
+import pytest
+
+from smartlease_api.query_parser import parse_query
+
+
+@pytest.mark.parametrize("query", [
+    "apartment near MIT",
+    "studio",
+    "2 bed on Comm Ave",
+    "3 bedroom in Cambridge near Harvard",
+])
+def test_partial_parses_are_not_confident(query):
+    _, confidence = parse_query(query)
+    assert confidence < 1.0
+
+
+@pytest.mark.parametrize("query, metadata", [
+    ("2 bed under $2000 in Back Bay", {"beds": 2, "list_price": "<2000", "neighborhoods": "Back Bay"}),
+    ("Looking for a 2 bed under $3000", {"beds": 2, "list_price": "<3000"}),
+])
+def test_complete_parses_skip_the_llm(query, metadata):
+    assert parse_query(query) == (metadata, 1.0)
@@ -0,0 +1,28 @@
+from smartlease_api.token_budget import compact_property
+
+FIELDS = ["property_id", "address", "beds", "list_price", "complete_property_details"]
+
+
+def test_short_numeric_details_survive_address_collisions():
+    prop = {
+        "property_id": "1001",
+        "address": "14 Main St, Boston, MA 02114",
+        "beds": 2,
+        "list_price": 2500,
+        "complete_property_details": (
+            "address: 14 Main St, Boston, MA 02114; beds: 2; restaurant rating: 4; "
+            "cafe rating: 1; hospital rating: 4.5"
+        ),
+    }
+    details = compact_property(prop, FIELDS, budget=500)["details"].split("; ")
+    assert details == ["restaurant rating: 4", "cafe rating: 1", "hospital rating: 4.5"]
+
+
+def test_unlabelled_address_pieces_are_still_deduplicated():
+    prop = {
+        "address": "14 Main St, Boston, MA 02114",
+        "complete_property_details": "14 Main St, Boston, MA 02114, 2 beds, near the Charles",
+    }
+    assert compact_property(prop, ["address", "complete_property_details"], budget=500)["details"] == (
+        "2 beds; near the Charles"
+    )
@@ -0,0 +1,105 @@
+import re
+from contextlib import contextmanager
+
+import numpy as np
+
+from smartlease_api.vector_index import EMBEDDING_COLUMN, LocalVectorIndex
+
+
+class FakeTable:
+    """
+    Answers the three statements LocalVectorIndex.sync issues against an
+    in-memory list of rows.
+    """
+    def __init__(self, rows):
+        self.rows = rows
+        self.fetched = []
+
+    @contextmanager
+    def connection(self):
+        yield self
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, table):
+        self.table = table
+        self.description = None
+        self._result = []
+
+    def execute(self, sql, params=None):
+        rows = self.table.rows
+        if "information_schema.columns" in sql:
+            self._result = [(column,) for column in rows[0]]
+        elif "EXCLUDE" in sql:
+            wanted = set(params)
+            self.table.fetched.extend(sorted(wanted))
+            matching = [r for r in rows if r["property_id"] in wanted]
+            columns = list(rows[0])
+            self.description = [(column,) for column in columns]
+            self._result = [tuple(r[c] for c in columns) for r in matching]
+        else:
+            selected = re.findall(r'"([^"]+)"', sql.split("FROM")[0])
+            self._result = [tuple(r[c] for c in selected) for r in rows]
+
+    def fetchall(self):
+        return self._result
+
+    def close(self):
+        pass
+
+
+def listing(pid, price, fingerprint, details_hash, vector):
+    return {
+        "property_id": pid, "list_price": price, "listing_fingerprint": fingerprint,
+        "details_hash": details_hash, EMBEDDING_COLUMN: vector,
+    }
+
+
+def test_sync_refetches_changed_listings():
+    table = FakeTable([
+        listing("a", 2000, "fa", "ha", [1.0, 0.0]),
+        listing("b", 3000, "fb", "hb", [0.0, 1.0]),
+    ])
+    index = LocalVectorIndex(dim=2)
+    assert index.sync(table) == {"added": 2, "updated": 0, "removed": 0, "size": 2}
+
+    # Unchanged rows are not fetched again
+    table.fetched.clear()
+    assert index.sync(table)["updated"] == 0
+    assert table.fetched == []
+
+    # "a" was re-ingested and re-embedded
+    table.rows[0] = listing("a", 2500, "fa2", "ha2", [0.0, 1.0])
+    stats = index.sync(table)
+    assert stats == {"added": 0, "updated": 1, "removed": 0, "size": 2}
+    assert table.fetched == ["a"]
+
+    results = index.hybrid_search(np.array([0.0, 1.0]), [], top_k=2)
+    assert {r["property_id"]: r["list_price"] for r in results} == {"a": 2500, "b": 3000}
+    assert all(r["similarity"] > 0.99 for r in results)
+
+
+def test_dead_rows_are_compacted():
+    table = FakeTable([listing(str(i), 1000 + i, f"f{i}", f"h{i}", [1.0, float(i)]) for i in range(8)])
+    index = LocalVectorIndex(dim=2, compact_threshold=0.25, min_train_size=4)
+    index.sync(table)
+    assert index.index.centroids is not None
+
+    # Two dead rows out of eight stay below the threshold
+    del table.rows[:2]
+    index.sync(table)
+    assert len(index.alive) == 8 and len(index) == 6
+
+    # A third tips it over: only live rows remain, and the clusters are retrained
+    del table.rows[0]
+    index.sync(table)
+    assert len(index.alive) == len(index.index) == len(index.rows) == 5
+    assert index.index.trained_size == 5
+    assert sorted(index.positions) == ["3", "4", "5", "6", "7"]
+    assert all(index.rows[pos]["property_id"] == pid for pid, pos in index.positions.items())
+
+    results = index.hybrid_search(np.array([1.0, 7.0]), [("list_price", ">", 1005)], top_k=2)
+    assert [r["property_id"] for r in results] == ["7", "6"]